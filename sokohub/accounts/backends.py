@@ -1,8 +1,34 @@
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
-import sys
 from .models import User
 
+
+def find_login_user(request, identifier):
+    """
+    Return the user matching a login identifier (username or email), or None.
+
+    The result is remembered on the request so login_view and the backend
+    share a single query per login attempt.
+    """
+    identifier = (identifier or '').strip().lower()
+    if not identifier:
+        return None
+    found = getattr(request, '_login_users', None) if request is not None else None
+    if found is not None and identifier in found:
+        return found[identifier]
+
+    candidates = list(User.objects.for_login(identifier)[:2])
+    # Should a username and another account's email collide, the username wins
+    user = next((u for u in candidates if u.username.lower() == identifier), None)
+    if user is None and candidates:
+        user = candidates[0]
+
+    if request is not None:
+        if found is None:
+            found = request._login_users = {}
+        found[identifier] = user
+    return user
+
+
 class EmailOrUsernameModelBackend(ModelBackend):
     """
     Custom authentication backend that allows users to log in using either
@@ -11,26 +37,14 @@ class EmailOrUsernameModelBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         if username is None:
             username = kwargs.get(User.USERNAME_FIELD)
-        
-        sys.stderr.write(f"DEBUG: EmailOrUsernameModelBackend.authenticate called for: {username}\n")
-        try:
-            # Try to fetch the user by username or email
-            user = User.objects.get(Q(username__iexact=username) | Q(email__iexact=username))
-            sys.stderr.write(f"DEBUG: Found user: {user}\n")
-        except User.DoesNotExist:
-            sys.stderr.write(f"DEBUG: User not found for: {username}\n")
+
+        user = find_login_user(request, username)
+        if user is None:
             # Run the default password hasher once to reduce the vulnerability
             # to timing attacks.
             User().set_password(password)
             return None
-        except User.MultipleObjectsReturned:
-            sys.stderr.write(f"DEBUG: Multiple users found for: {username}\n")
-            # If multiple users match (shouldn't happen with unique constraints),
-            # pick the one that matches username exactly if possible, or just fail safely.
-            user = User.objects.filter(Q(username__iexact=username) | Q(email__iexact=username)).first()
 
         if user.check_password(password) and self.user_can_authenticate(user):
-            sys.stderr.write(f"DEBUG: Password match and user can authenticate\n")
             return user
-        sys.stderr.write(f"DEBUG: Password check failed or user cannot authenticate\n")
         return None
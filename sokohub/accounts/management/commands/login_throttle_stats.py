@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from accounts.throttle import get_counters
+
+
+class Command(BaseCommand):
+    help = "Show how many login, send_otp and verify_otp attempts were allowed or throttled."
+
+    def handle(self, *args, **options):
+        for scope, counts in get_counters().items():
+            self.stdout.write(f"{scope}: {counts['allowed']} allowed, {counts['rejected']} rejected")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from accounts.models import EmailOTP
+
+
+class Command(BaseCommand):
+    help = "Delete expired login codes. Run it periodically (e.g. hourly via cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = EmailOTP.purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired codes."))
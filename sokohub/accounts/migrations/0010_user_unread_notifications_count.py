@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_unread_notifications_count(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Notification = apps.get_model('notifications', 'Notification')
+    unread = Notification.objects.filter(
+        user=OuterRef('pk'), is_read=False
+    ).order_by().values('user').annotate(total=Count('id')).values('total')
+    User.objects.update(unread_notifications_count=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_sokohubcard_balance'),
+        ('notifications', '0002_notification_target_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_notifications_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_unread_notifications_count, migrations.RunPython.noop),
+    ]
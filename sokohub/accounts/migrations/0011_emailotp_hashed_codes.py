@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:51
+
+from django.db import migrations, models
+
+
+def delete_plaintext_codes(apps, schema_editor):
+    # Existing rows hold plaintext codes that expire within minutes anyway
+    apps.get_model('accounts', 'EmailOTP').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_user_unread_notifications_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_plaintext_codes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='emailotp',
+            name='otp',
+        ),
+        migrations.AddField(
+            model_name='emailotp',
+            name='code_hash',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='emailotp',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='emailotp',
+            index=models.Index(fields=['email', 'created_at'], name='emailotp_email_created'),
+        ),
+        migrations.AddIndex(
+            model_name='emailotp',
+            index=models.Index(fields=['created_at'], name='emailotp_created'),
+        ),
+    ]
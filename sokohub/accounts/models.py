@@ -1,10 +1,31 @@
-from django.contrib.auth.models import AbstractUser
+from django.conf import settings
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils import timezone
 import random
 import string
 
 
+class SokohubUserManager(UserManager):
+
+    def for_login(self, identifier):
+        """
+        Users whose username or email equals `identifier`, ignoring case.
+        Compares lower() expressions so the functional indexes are used.
+        """
+        identifier = (identifier or '').strip().lower()
+        return self.alias(
+            username_lower=Lower('username'), email_lower=Lower('email')
+        ).filter(Q(username_lower=identifier) | Q(email_lower=identifier))
+
+    def for_email(self, email):
+        """Users whose email equals `email`, ignoring case, found through the lower(email) index."""
+        email = (email or '').strip().lower()
+        return self.alias(email_lower=Lower('email')).filter(email_lower=email)
+
+
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
         ('vendor', 'Vendor'),
@@ -18,6 +39,8 @@ class User(AbstractUser):
 
     # Enhanced profile fields
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Resized copies of `profile_picture`, written by the generate_thumbnails worker
+    profile_picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
     address = models.TextField(blank=True, help_text="Full delivery address")
     date_of_birth = models.DateField(blank=True, null=True)
     city = models.CharField(max_length=100, blank=True)
@@ -27,11 +50,20 @@ class User(AbstractUser):
     email_notifications = models.BooleanField(default=True)
     sms_notifications = models.BooleanField(default=False)
 
+    # Denormalized unread notification count, maintained by notifications.signals
+    unread_notifications_count = models.PositiveIntegerField(default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SokohubUserManager()
+
     class Meta:
         db_table = 'auth_user'  # This ensures we replace the default User model
+        indexes = [
+            models.Index(Lower('username'), name='user_username_lower'),
+            models.Index(Lower('email'), name='user_email_lower'),
+        ]
 
     def __str__(self):
         return f"{self.username} ({self.get_user_type_display()})"
@@ -48,17 +80,31 @@ class User(AbstractUser):
 
 
 class EmailOTP(models.Model):
+    """A login code issued by accounts.otp.DatabaseOTPStore. Only the hash is stored."""
     email = models.EmailField()
-    otp = models.CharField(max_length=5)
+    code_hash = models.CharField(max_length=64)
+    attempts = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def is_valid(self):
-        # OTP is valid for 3 minutes
-        expiration_time = self.created_at + timezone.timedelta(minutes=3)
-        return timezone.now() <= expiration_time
+    class Meta:
+        indexes = [
+            models.Index(fields=['email', 'created_at'], name='emailotp_email_created'),
+            models.Index(fields=['created_at'], name='emailotp_created'),
+        ]
+
+    @classmethod
+    def purge_expired(cls, batch_size=1000):
+        """Delete expired codes in batches. Returns the number deleted."""
+        cutoff = timezone.now() - timezone.timedelta(minutes=settings.OTP_EXPIRY_MINUTES)
+        deleted = 0
+        while True:
+            batch = list(cls.objects.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += cls.objects.filter(pk__in=batch).delete()[0]
 
     def __str__(self):
-        return f"OTP for {self.email} - {self.otp}"
+        return f"OTP for {self.email}"
 
 class SokohubCard(models.Model):
     STATUS_CHOICES = (
@@ -0,0 +1,118 @@
+"""
+One-time login codes.
+
+Codes are never stored in clear: only an HMAC of (email, code) keyed with
+SECRET_KEY is kept. Two stores are available, selected by `OTP_STORE`:
+
+* 'db'    -> EmailOTP rows, looked up by the (email, created_at) index and
+             purged with `manage.py purge_expired_otps`
+* 'cache' -> Django cache entries that expire on their own
+
+Either way a code is single-use and allows OTP_MAX_ATTEMPTS guesses, counted
+with an atomic increment.
+"""
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from .models import EmailOTP
+
+OTP_LENGTH = 5
+OTP_STORE = getattr(settings, 'OTP_STORE', 'db')
+OTP_EXPIRY_MINUTES = getattr(settings, 'OTP_EXPIRY_MINUTES', 3)
+OTP_MAX_ATTEMPTS = getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+
+def _normalize(email):
+    return (email or '').strip().lower()
+
+
+def hash_code(email, code):
+    return salted_hmac('accounts.otp', f'{_normalize(email)}:{code}').hexdigest()
+
+
+def generate_code():
+    return ''.join(secrets.choice('0123456789') for _ in range(OTP_LENGTH))
+
+
+class DatabaseOTPStore:
+
+    def issue(self, email, code):
+        email = _normalize(email)
+        with transaction.atomic():
+            # Only the latest code counts, so older ones can go right away
+            EmailOTP.objects.filter(email=email).delete()
+            EmailOTP.objects.create(email=email, code_hash=hash_code(email, code))
+
+    def verify(self, email, code):
+        email = _normalize(email)
+        cutoff = timezone.now() - timezone.timedelta(minutes=OTP_EXPIRY_MINUTES)
+        otp = (
+            EmailOTP.objects.filter(email=email, created_at__gte=cutoff)
+            .order_by('-created_at', '-id').first()
+        )
+        if otp is None:
+            return False
+        # Count the attempt before comparing; the filter makes it race-free
+        allowed = EmailOTP.objects.filter(pk=otp.pk, attempts__lt=OTP_MAX_ATTEMPTS).update(
+            attempts=F('attempts') + 1
+        )
+        if not allowed or not constant_time_compare(otp.code_hash, hash_code(email, code)):
+            return False
+        EmailOTP.objects.filter(email=email).delete()
+        return True
+
+
+class CacheOTPStore:
+
+    def _key(self, email):
+        return 'otp:' + hashlib.sha256(_normalize(email).encode()).hexdigest()
+
+    def issue(self, email, code):
+        key = self._key(email)
+        timeout = OTP_EXPIRY_MINUTES * 60
+        cache.set_many({key: hash_code(email, code), f'{key}:attempts': 0}, timeout)
+
+    def verify(self, email, code):
+        key = self._key(email)
+        try:
+            attempts = cache.incr(f'{key}:attempts')
+        except ValueError:
+            # No code issued, or it has expired
+            return False
+        stored = cache.get(key)
+        if stored is None or attempts > OTP_MAX_ATTEMPTS:
+            return False
+        if not constant_time_compare(stored, hash_code(email, code)):
+            return False
+        cache.delete_many([key, f'{key}:attempts'])
+        return True
+
+
+STORES = {
+    'db': DatabaseOTPStore,
+    'cache': CacheOTPStore,
+}
+
+
+def get_store():
+    return STORES[OTP_STORE]()
+
+
+def issue_otp(email):
+    """Create a new code for `email`, replacing any previous one, and return it."""
+    code = generate_code()
+    get_store().issue(email, code)
+    return code
+
+
+def verify_otp_code(email, code):
+    """Return True if `code` is the current code for `email`. Consumes it on success."""
+    if not email or not code:
+        return False
+    return get_store().verify(email, code.strip())
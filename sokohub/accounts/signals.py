@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from products.thumbnails import queue_renditions
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def queue_profile_picture_renditions(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Have the thumbnail worker resize newly uploaded profile pictures."""
+    if raw:
+        return
+    queue_renditions(instance, 'profile_picture', update_fields)
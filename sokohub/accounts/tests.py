@@ -1,3 +1,192 @@
-from django.test import TestCase
+import time
+from unittest import mock
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from accounts import otp, throttle
+from accounts.models import EmailOTP, User
 
-# Create your tests here.
+
+# Allowed attempts use a cheap hasher so the suite stays fast
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginThrottleTests(TestCase):
+    """Over-limit login attempts must be turned away before any password hashing."""
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('alice', 'alice@example.com', 'correct-horse')
+        self.url = reverse('login')
+
+    def _post(self, username='alice', password='wrong', ip='10.0.0.1'):
+        return self.client.post(self.url, {'username': username, 'password': password}, REMOTE_ADDR=ip)
+
+    def test_identifier_limit(self):
+        for _ in range(throttle.THROTTLE_IDENTIFIER_LIMIT):
+            self.assertEqual(self._post().status_code, 200)
+        self.assertEqual(self._post().status_code, 429)
+        # The limit follows the account, not the address
+        self.assertEqual(self._post(ip='10.0.0.2').status_code, 429)
+        self.assertEqual(self._post(username='ALICE@example.com', ip='10.0.0.3').status_code, 200)
+
+    def test_ip_limit(self):
+        for i in range(throttle.THROTTLE_IP_LIMIT):
+            self._post(username=f'user{i}')
+        self.assertEqual(self._post(username='someone-new').status_code, 429)
+        self.assertEqual(self._post(username='someone-new', ip='10.0.0.9').status_code, 200)
+
+    def test_counters(self):
+        for _ in range(throttle.THROTTLE_IDENTIFIER_LIMIT + 3):
+            self._post()
+        counters = throttle.get_counters()['login']
+        self.assertEqual(counters['allowed'], throttle.THROTTLE_IDENTIFIER_LIMIT)
+        self.assertEqual(counters['rejected'], 3)
+
+    def test_window_slides(self):
+        limit = throttle.SlidingWindowLimit('test', limit=10, window=100)
+        for _ in range(10):
+            limit.hit('x', now=1000)
+        self.assertTrue(limit.exceeded('x', now=1050))
+        # Half way through the next window only half of the old attempts still count
+        self.assertEqual(limit.count('x', now=1150), 5)
+        self.assertFalse(limit.exceeded('x', now=1150))
+        self.assertEqual(limit.count('x', now=1200), 0)
+
+    def test_rejected_attempts_skip_hashing(self):
+        with mock.patch.object(MD5PasswordHasher, 'encode', autospec=True,
+                               side_effect=MD5PasswordHasher.encode) as encode:
+            for _ in range(throttle.THROTTLE_IDENTIFIER_LIMIT):
+                self._post()
+            self.assertGreater(encode.call_count, 0)
+            encode.reset_mock()
+
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(50):
+                    self.assertEqual(self._post().status_code, 429)
+
+        self.assertEqual(encode.call_count, 0)
+        self.assertFalse([q for q in queries if 'auth_user' in q['sql']])
+
+    def test_send_otp_and_verify_otp_are_throttled(self):
+        for _ in range(throttle.THROTTLE_IDENTIFIER_LIMIT):
+            self.client.post(reverse('send_otp'), {'email': 'alice@example.com'})
+        self.assertEqual(self.client.post(reverse('send_otp'), {'email': 'alice@example.com'}).status_code, 429)
+
+        session = self.client.session
+        session['otp_email'] = 'alice@example.com'
+        session.save()
+        for _ in range(throttle.THROTTLE_IDENTIFIER_LIMIT):
+            self.client.post(reverse('verify_otp'), {'otp': '00000'})
+        self.assertEqual(self.client.post(reverse('verify_otp'), {'otp': '00000'}).status_code, 429)
+
+
+class OTPStoreTestsMixin:
+    """Behaviour shared by both one-time code stores."""
+    store_class = None
+
+    def setUp(self):
+        cache.clear()
+        self.store = self.store_class()
+        self.store.issue('Customer@Example.com', '12345')
+
+    def expire(self):
+        raise NotImplementedError
+
+    def test_correct_code_is_accepted_once(self):
+        # Emails are compared case-insensitively
+        self.assertTrue(self.store.verify('customer@example.com', '12345'))
+        self.assertFalse(self.store.verify('customer@example.com', '12345'))
+
+    def test_new_code_replaces_the_old_one(self):
+        self.store.issue('customer@example.com', '54321')
+        self.assertFalse(self.store.verify('customer@example.com', '12345'))
+        self.assertTrue(self.store.verify('customer@example.com', '54321'))
+
+    def test_expired_code_is_rejected(self):
+        self.expire()
+        self.assertFalse(self.store.verify('customer@example.com', '12345'))
+
+    def test_code_is_locked_after_max_attempts(self):
+        for _ in range(otp.OTP_MAX_ATTEMPTS):
+            self.assertFalse(self.store.verify('customer@example.com', '00000'))
+        self.assertFalse(self.store.verify('customer@example.com', '12345'))
+
+
+class DatabaseOTPStoreTests(OTPStoreTestsMixin, TestCase):
+    store_class = otp.DatabaseOTPStore
+
+    def expire(self):
+        EmailOTP.objects.update(
+            created_at=timezone.now() - timezone.timedelta(minutes=otp.OTP_EXPIRY_MINUTES, seconds=1)
+        )
+
+    def test_only_the_hash_is_stored(self):
+        stored = EmailOTP.objects.get()
+        self.assertEqual(stored.email, 'customer@example.com')
+        self.assertEqual(stored.code_hash, otp.hash_code('customer@example.com', '12345'))
+        self.assertNotIn('12345', stored.code_hash)
+
+    def test_used_code_is_deleted(self):
+        self.store.verify('customer@example.com', '12345')
+        self.assertFalse(EmailOTP.objects.exists())
+
+
+class CacheOTPStoreTests(OTPStoreTestsMixin, TestCase):
+    store_class = otp.CacheOTPStore
+
+    def expire(self):
+        later = time.time() + otp.OTP_EXPIRY_MINUTES * 60 + 1
+        patcher = mock.patch('django.core.cache.backends.locmem.time.time', return_value=later)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nothing_is_written_to_the_database(self):
+        self.assertFalse(EmailOTP.objects.exists())
+
+    def test_verify_uses_the_configured_store(self):
+        with mock.patch.object(otp, 'OTP_STORE', 'cache'):
+            code = otp.issue_otp('other@example.com')
+            self.assertTrue(otp.verify_otp_code('other@example.com', f' {code} '))
+        self.assertFalse(EmailOTP.objects.exists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CaseInsensitiveLoginTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('Alice', 'Alice@Example.com', 'correct-horse')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_username_and_email_match_in_any_case(self):
+        for identifier in ('aLICE', 'ALICE@example.COM'):
+            with self.subTest(identifier=identifier):
+                response = self.client.post(reverse('login'), {'username': identifier, 'password': 'correct-horse'})
+                self.assertRedirects(response, reverse('verify_otp'), fetch_redirect_response=False)
+                self.assertEqual(self.client.session['pending_user_id'], self.user.pk)
+
+    def test_lookup_uses_the_lower_indexes(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('login'), {'username': 'ALICE@example.com', 'password': 'correct-horse'})
+        lookups = [q['sql'] for q in queries.captured_queries if 'FROM "auth_user"' in q['sql']]
+        self.assertEqual(len(lookups), 1)
+        self.assertIn('LOWER("auth_user"."email")', lookups[0])
+
+        if connection.vendor == 'sqlite':
+            plan = User.objects.for_login('ALICE@example.com').explain()
+            self.assertIn('user_username_lower', plan)
+            self.assertIn('user_email_lower', plan)
+
+    def test_otp_link_finds_the_user_through_the_lower_index(self):
+        code = otp.issue_otp('alice@example.com')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('verify_otp_direct'), {'email': 'ALICE@example.com', 'otp': code})
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+        self.assertEqual(response.status_code, 302)
+        lookups = [q['sql'] for q in queries.captured_queries if 'FROM "auth_user"' in q['sql']]
+        self.assertIn('LOWER("auth_user"."email")', lookups[0])
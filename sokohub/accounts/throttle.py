@@ -0,0 +1,139 @@
+"""
+Sliding-window rate limiting for the login endpoints.
+
+Each limit keeps one counter per fixed window in the Django cache, bumped
+with atomic add()/incr(). The sliding count is estimated from the current
+and previous windows:
+
+    previous * (time left in the current window / window) + current
+
+Attempts are checked both per client IP and per identifier (username or
+email), and over-limit attempts are rejected before the account lookup and
+password hashing happen.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.shortcuts import render
+
+THROTTLE_WINDOW = getattr(settings, 'LOGIN_THROTTLE_WINDOW', 300)
+THROTTLE_IP_LIMIT = getattr(settings, 'LOGIN_THROTTLE_IP_LIMIT', 30)
+THROTTLE_IDENTIFIER_LIMIT = getattr(settings, 'LOGIN_THROTTLE_IDENTIFIER_LIMIT', 10)
+# Number of reverse proxies in front of the app that append to X-Forwarded-For
+THROTTLE_PROXY_COUNT = getattr(settings, 'LOGIN_THROTTLE_PROXY_COUNT', 0)
+
+STATS_KEY = 'throttle:stats:{scope}:{outcome}'
+
+
+def client_ip(request):
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if THROTTLE_PROXY_COUNT and forwarded:
+        # Only trust the entries our own proxies appended; the left ones are client-supplied
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        if len(hops) >= THROTTLE_PROXY_COUNT:
+            return hops[-THROTTLE_PROXY_COUNT]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _incr(key, timeout):
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout)
+        return 1
+
+
+class SlidingWindowLimit:
+
+    def __init__(self, name, limit, window=THROTTLE_WINDOW):
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+    def _keys(self, value, now):
+        current = int(now // self.window)
+        # Hash the value so client-supplied text is always a valid cache key
+        prefix = f'throttle:{self.name}:{hashlib.md5(value.encode()).hexdigest()}'
+        return f'{prefix}:{current}', f'{prefix}:{current - 1}'
+
+    def _estimate(self, counts, now, current_key, previous_key):
+        elapsed = (now % self.window) / self.window
+        return counts.get(previous_key, 0) * (1 - elapsed) + counts.get(current_key, 0)
+
+    def count(self, value, now=None):
+        """Return the estimated number of attempts in the last window."""
+        now = time.time() if now is None else now
+        current_key, previous_key = self._keys(value, now)
+        return self._estimate(cache.get_many([current_key, previous_key]), now, current_key, previous_key)
+
+    def hit(self, value, now=None):
+        """Record an attempt for `value`."""
+        now = time.time() if now is None else now
+        current_key, _ = self._keys(value, now)
+        # Keep the counter alive through the next window so it can be weighed there
+        _incr(current_key, self.window * 2)
+
+    def exceeded(self, value, now=None):
+        return self.count(value, now) >= self.limit
+
+
+def _record(scope, outcome):
+    _incr(STATS_KEY.format(scope=scope, outcome=outcome), None)
+
+
+def get_counters(scopes=('login', 'send_otp', 'verify_otp')):
+    """Return {scope: {'allowed': n, 'rejected': n}} since the cache was last cleared."""
+    keys = {
+        (scope, outcome): STATS_KEY.format(scope=scope, outcome=outcome)
+        for scope in scopes for outcome in ('allowed', 'rejected')
+    }
+    values = cache.get_many(keys.values())
+    counters = {scope: {'allowed': 0, 'rejected': 0} for scope in scopes}
+    for (scope, outcome), key in keys.items():
+        counters[scope][outcome] = values.get(key, 0)
+    return counters
+
+
+def check_attempt(request, scope, identifier=None):
+    """
+    Return True and count the attempt if the client may proceed, or False if
+    the IP or the identifier is over its limit.
+    """
+    now = time.time()
+    checks = [(SlidingWindowLimit(f'{scope}:ip', THROTTLE_IP_LIMIT), client_ip(request))]
+    if identifier:
+        checks.append((SlidingWindowLimit(f'{scope}:id', THROTTLE_IDENTIFIER_LIMIT), identifier.strip().lower()))
+
+    if any(limit.exceeded(value, now) for limit, value in checks):
+        _record(scope, 'rejected')
+        return False
+
+    for limit, value in checks:
+        limit.hit(value, now)
+    _record(scope, 'allowed')
+    return True
+
+
+def throttle(scope, template, identifier=None):
+    """
+    Rate limit POSTs to a view. `identifier` is a callable returning the
+    username/email the attempt is for; rejected requests get a 429 rendering
+    `template`.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method == 'POST':
+                value = identifier(request) if identifier else None
+                if not check_attempt(request, scope, value):
+                    messages.error(request, "Too many attempts. Please wait a few minutes and try again.")
+                    return render(request, template, {'title': 'Too Many Attempts - Soko Hub'}, status=429)
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
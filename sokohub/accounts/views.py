@@ -1,16 +1,17 @@
-import random
-import string
-import sys
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from .forms import UserRegistrationForm, UserProfileForm, SokohubCardRequestForm
+from .backends import find_login_user
 from .models import User, SokohubCard
+from .throttle import throttle
+from .otp import OTP_EXPIRY_MINUTES, issue_otp, verify_otp_code
 from .decorators import vendor_required, customer_required
+from notifications.mail import queue_mail
 from decimal import Decimal
-from django.db.models import Q
+from django.db import transaction
 
 
 def register(request):
@@ -41,71 +42,50 @@ def register(request):
 
 
 
+@throttle('login', 'accounts/login.html', identifier=lambda request: request.POST.get('username'))
 def login_view(request):
     """
     Custom login view: authenticate credentials, then send a 5-digit OTP.
     Actual login() happens only after OTP verification.
     """
-    from django.contrib.auth import authenticate as auth_authenticate
-
     if request.user.is_authenticated:
         if request.user.is_vendor():
             return redirect('vendor_dashboard')
         return redirect('product_list')
 
     if request.method == 'POST':
-        sys.stderr.write("DEBUG: Received POST request for login\n")
         # Ensure a clean session for this new login attempt
         if 'pending_user_id' in request.session: del request.session['pending_user_id']
         if 'otp_email' in request.session: del request.session['otp_email']
 
         username = request.POST.get('username', '').strip()
         password = request.POST.get('password', '').strip()
-        sys.stderr.write(f"DEBUG: Login application attempt for: {username}\n")
 
-        # Authenticate using the custom backend (supports both username and email)
-        user = auth_authenticate(request, username=username, password=password)
-        sys.stderr.write(f"DEBUG: Authentication result: {user}\n")
+        user = authenticate(request, username=username, password=password)
 
-        print(f"DEBUG: Checking if user is None: {user is None}")
         if user is None:
-            print("DEBUG: User is None, checking for social account...")
             # Check if it might be a social account with no usable password
-            try:
-                user_obj = User.objects.get(Q(username__iexact=username) | Q(email__iexact=username))
-                print(f"DEBUG: Found user_obj for social check: {user_obj}")
-                if not user_obj.has_usable_password():
-                    print("DEBUG: User has no usable password (social account)")
-                    messages.error(
-                        request,
-                        'This account was created via Google. Please use "Continue with Google" to sign in, '
-                        'or use "Login with Email OTP" below.'
-                    )
-                    context = {'title': 'Login - Soko Hub'}
-                    return render(request, 'accounts/login.html', context)
-            except (User.DoesNotExist, User.MultipleObjectsReturned) as e:
-                sys.stderr.write(f"DEBUG: Social check exception: {e}\n")
-                pass
-
-        sys.stderr.write(f"DEBUG: Final user check before redirect/error: {user}\n")
+            # (find_login_user reuses the lookup the backend just made)
+            user_obj = find_login_user(request, username)
+            if user_obj is not None and not user_obj.has_usable_password():
+                messages.error(
+                    request,
+                    'This account was created via Google. Please use "Continue with Google" to sign in, '
+                    'or use "Login with Email OTP" below.'
+                )
+                context = {'title': 'Login - Soko Hub'}
+                return render(request, 'accounts/login.html', context)
+
         if user is not None:
-            sys.stderr.write(f"DEBUG: User is not None, is_active: {user.is_active}\n")
             if not user.is_active:
                 messages.error(request, 'Your account has been disabled. Please contact support.')
                 context = {'title': 'Login - Soko Hub'}
                 return render(request, 'accounts/login.html', context)
 
             # Generate and send 5-digit OTP
-            sys.stderr.write("DEBUG: Generating OTP...\n")
-            otp_code = ''.join(random.choices(string.digits, k=5))
-            from .models import EmailOTP
-            EmailOTP.objects.create(email=user.email, otp=otp_code)
-
-            # Send Email with direct login link
-            from django.core.mail import send_mail
-            from django.conf import settings
+            otp_code = issue_otp(user.email)
 
-            sys.stderr.write(f"DEBUG: Sending OTP to {user.email}\n")
+            # Queue the email with a direct login link; the mail worker sends it
             subject = "Your Soko Hub Login Verification"
             verify_url = request.build_absolute_uri(
                 reverse('verify_otp_direct')
@@ -116,20 +96,9 @@ def login_view(request):
                 f"Your 5-digit verification code is: {otp_code}\n\n"
                 f"Alternatively, you can click the link below to verify and login automatically:\n"
                 f"{verify_url}\n\n"
-                f"This code will expire in 3 minutes."
+                f"This code will expire in {OTP_EXPIRY_MINUTES} minutes."
             )
-            try:
-                send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
-                sys.stderr.write(f"DEBUG: OTP email sent successfully to {user.email}\n")
-            except Exception as e:
-                sys.stderr.write(f"DEBUG: Email sending failed: {e}\n")
-                messages.error(
-                    request,
-                    "We couldn't send the verification email due to a server issue. "
-                    "Please try again later or contact support."
-                )
-                context = {'title': 'Login - Soko Hub'}
-                return render(request, 'accounts/login.html', context)
+            queue_mail(subject, message, [user.email])
 
             # Defer full login until OTP is verified
             request.session['pending_user_id'] = user.id
@@ -138,7 +107,6 @@ def login_view(request):
             messages.success(request, f"A verification code has been sent to {user.email}.")
             return redirect('verify_otp')
         else:
-            sys.stderr.write("DEBUG: Authentication failed, adding error message\n")
             messages.error(request, 'Invalid username/email or password. Please try again.')
             context = {'title': 'Login Failed Credentials - Soko Hub'}
             return render(request, 'accounts/login.html', context)
@@ -196,6 +164,7 @@ def all_notifications(request):
     })
 
 
+@throttle('send_otp', 'accounts/send_otp.html', identifier=lambda request: request.POST.get('email'))
 def send_otp(request):
     """Generates and sends a 5-digit OTP to the user's email."""
     if request.method == "POST":
@@ -213,30 +182,13 @@ def send_otp(request):
             messages.error(request, "This email is not registered.")
             return render(request, 'accounts/send_otp.html', {'title': 'Send OTP - Soko Hub'})
 
-        # Generate 5-digit random OTP
-        otp_code = ''.join(random.choices(string.digits, k=5))
-        
-        # Save OTP to database
-        from .models import EmailOTP
-        EmailOTP.objects.create(email=email, otp=otp_code)
+        # Generate and store a 5-digit OTP (only its hash is kept)
+        otp_code = issue_otp(email)
 
-        # Send Email
-        from django.core.mail import send_mail
-        from django.conf import settings
-        
+        # Queue the email; the mail worker sends it
         subject = "Your Soko Hub Login OTP"
-        message = f"Hello {user.username},\n\nYour 5-digit login OTP is: {otp_code}\n\nThis code will expire in 5 minutes."
-        try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [email])
-            sys.stderr.write(f"DEBUG: OTP email sent to {email}\n")
-        except Exception as mail_err:
-            sys.stderr.write(f"DEBUG: Failed to send OTP email: {mail_err}\n")
-            messages.error(
-                request,
-                "We couldn't send the OTP email due to a server issue. "
-                "Please try logging in with your username and password instead."
-            )
-            return render(request, 'accounts/send_otp.html', {'title': 'Send OTP - Soko Hub'})
+        message = f"Hello {user.username},\n\nYour 5-digit login OTP is: {otp_code}\n\nThis code will expire in {OTP_EXPIRY_MINUTES} minutes."
+        queue_mail(subject, message, [email])
 
         request.session['otp_email'] = email
         messages.success(request, f"A 5-digit OTP has been sent to {email}.")
@@ -245,6 +197,7 @@ def send_otp(request):
     return render(request, 'accounts/send_otp.html', {'title': 'Send OTP - Soko Hub'})
 
 
+@throttle('verify_otp', 'accounts/verify_otp.html', identifier=lambda request: request.session.get('otp_email'))
 def verify_otp(request):
     """Verifies the 5-digit OTP and finalizes user login."""
     email = request.session.get('otp_email')
@@ -255,12 +208,8 @@ def verify_otp(request):
 
     if request.method == "POST":
         otp_input = request.POST.get('otp')
-        from .models import EmailOTP
-        
-        # Verify the most recent valid OTP for this email
-        otp_obj = EmailOTP.objects.filter(email=email).last()
-        
-        if otp_obj and otp_obj.otp == otp_input and otp_obj.is_valid():
+
+        if verify_otp_code(email, otp_input):
             try:
                 # If we had a pending password login, get that user
                 if pending_user_id:
@@ -271,7 +220,7 @@ def verify_otp(request):
                         return redirect('login')
                 else:
                     # Flow from direct email-only login (if supported)
-                    user = User.objects.get(email__iexact=email)
+                    user = User.objects.for_email(email).get()
             except User.DoesNotExist:
                 messages.error(request, "Account not found. Please try logging in again.")
                 return redirect('login')
@@ -307,13 +256,9 @@ def verify_otp_direct(request):
         messages.error(request, "Invalid verification link.")
         return redirect('login')
         
-    from .models import EmailOTP
-    # Verify the most recent valid OTP for this email
-    otp_obj = EmailOTP.objects.filter(email=email).last()
-    
-    if otp_obj and otp_obj.otp == otp and otp_obj.is_valid():
+    if verify_otp_code(email, otp):
         try:
-            user = User.objects.get(email__iexact=email)
+            user = User.objects.for_email(email).get()
             login(request, user, backend='accounts.backends.EmailOrUsernameModelBackend')
             
             # Cleanup session (if any)
@@ -331,7 +276,8 @@ def verify_otp_direct(request):
             messages.error(request, "User associated with this link does not exist.")
             return redirect('login')
     else:
-        pass
+        messages.error(request, "This verification link is invalid or has expired.")
+        return redirect('login')
 
 @login_required
 def request_sokohub_card(request):
@@ -361,6 +307,7 @@ def request_sokohub_card(request):
 
 
 @login_required
+@transaction.atomic
 def pay_sokohub_card(request):
     """View to simulate payment for Sokohub Card"""
     card = get_object_or_404(SokohubCard, user=request.user)
@@ -379,9 +326,9 @@ def pay_sokohub_card(request):
         card.generate_card_details()
         
         # Notify user
-        from notifications.models import Notification
+        from notifications.outbox import notify
         # Notify user of approval
-        Notification.objects.create(
+        notify(
             user=request.user,
             title="Sokohub Card Approved",
             message="Your Sokohub Card has been approved. You can now enjoy 5% discounts on promotion days!",
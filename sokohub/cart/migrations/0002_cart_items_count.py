@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_items_count(apps, schema_editor):
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+    lines = CartItem.objects.filter(
+        cart=OuterRef('pk')
+    ).order_by().values('cart').annotate(total=Count('id')).values('total')
+    Cart.objects.update(items_count=Coalesce(Subquery(lines), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_items_count, migrations.RunPython.noop),
+    ]
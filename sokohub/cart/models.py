@@ -1,20 +1,109 @@
+from contextvars import ContextVar
+from decimal import Decimal
 from django.db import models
+from django.db.models import F
 from django.conf import settings
-from products.models import Product
+from django.utils import timezone
+from products.models import Product, PromotionDay
+
+# Discount granted to active Sokohub Card holders on promotion days
+PROMOTION_DISCOUNT_RATE = Decimal('0.05')
+
+# Carts being emptied by Cart.clear(), which resets their counter once itself
+clearing_carts = ContextVar('clearing_carts', default=frozenset())
+
+
+def get_promotion_discount_rate(user):
+    """Return the discount rate that applies to `user` today (0 if none)."""
+    from accounts.models import SokohubCard
+    if not PromotionDay.objects.filter(date=timezone.now().date()).exists():
+        return Decimal('0.00')
+    if not SokohubCard.objects.filter(user=user, status='approved', is_active=True).exists():
+        return Decimal('0.00')
+    return PROMOTION_DISCOUNT_RATE
+
+
+class CartSummary:
+    """
+    Everything the cart and checkout pages need, computed from one query.
+
+    `lines` are CartItems with product and vendor joined in and `line_total`
+    (quantity * price) computed by the database.
+    """
+
+    def __init__(self, lines, discount_rate=Decimal('0.00')):
+        self.lines = lines
+        self.items_count = len(lines)
+        self.quantity = sum(line.quantity for line in lines)
+        self.subtotal = sum((line.line_total for line in lines), Decimal('0.00'))
+
+        # Lines and subtotals grouped per vendor, in cart order
+        self.vendor_lines = {}
+        self.vendor_subtotals = {}
+        for line in lines:
+            vendor = line.product.vendor
+            self.vendor_lines.setdefault(vendor, []).append(line)
+            self.vendor_subtotals[vendor] = self.vendor_subtotals.get(vendor, Decimal('0.00')) + line.line_total
+
+        self.discount_rate = discount_rate
+        self.discount = self.subtotal * discount_rate
+        self.total = self.subtotal - self.discount
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def vendor_total(self, vendor):
+        """Vendor subtotal after the discount, as charged on that vendor's order."""
+        return self.vendor_subtotals[vendor] * (1 - self.discount_rate)
+
 
 class Cart(models.Model):
     customer = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Denormalized number of lines in the cart, maintained by cart.signals
+    items_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Cart - {self.customer.username}"
-    
+
+    def get_summary(self, with_discount=False):
+        """
+        Load the cart lines once and return a memoized CartSummary.
+        Pass with_discount=True to apply today's promotion discount.
+        """
+        cache_attr = '_summary_discounted' if with_discount else '_summary'
+        summary = getattr(self, cache_attr, None)
+        if summary is None:
+            lines = getattr(self, '_summary_lines', None)
+            if lines is None:
+                lines = list(
+                    self.items.select_related('product__vendor')
+                    .annotate(line_total=F('quantity') * F('product__price'))
+                    .order_by('added_at', 'id')
+                )
+                self._summary_lines = lines
+            rate = get_promotion_discount_rate(self.customer_id) if with_discount else Decimal('0.00')
+            summary = CartSummary(lines, rate)
+            setattr(self, cache_attr, summary)
+        return summary
+
     def get_total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        return self.get_summary().subtotal
     
     def get_items_count(self):
-        return self.items.count()
+        return self.items_count
+
+    def clear(self):
+        """Delete every line and reset the counter, in the same number of queries for any cart size."""
+        token = clearing_carts.set(clearing_carts.get() | {self.pk})
+        try:
+            self.items.all().delete()
+        finally:
+            clearing_carts.reset(token)
+        Cart.objects.filter(pk=self.pk).update(items_count=0)
+        self.items_count = 0
+        self._summary = self._summary_discounted = self._summary_lines = None
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
@@ -26,4 +115,4 @@ class CartItem(models.Model):
         return f"{self.quantity} x {self.product.name}"
     
     def get_total_price(self):
-        return self.quantity * self.product.price
\ No newline at end of file
+        return self.quantity * self.product.price
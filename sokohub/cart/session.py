@@ -0,0 +1,105 @@
+"""
+Guest cart kept in the visitor's session.
+
+Anonymous visitors never touch the cart tables: their lines live in the
+session as {product_id: quantity} and are materialized into Cart/CartItem
+rows in one bulk_create when they log in (see cart.signals). The session
+itself is saved by SESSION_ENGINE, the database backend by default.
+"""
+from django.db import transaction
+from django.db.models import F
+from products.models import Product
+from .models import Cart, CartItem, CartSummary
+
+SESSION_KEY = 'guest_cart'
+
+
+class GuestCartItem:
+    """Quacks like a CartItem for the cart template. `id` is the product id."""
+
+    def __init__(self, product, quantity):
+        self.id = product.id
+        self.product = product
+        self.quantity = quantity
+        self.line_total = product.price * quantity
+
+    def get_total_price(self):
+        return self.line_total
+
+
+class SessionCart:
+
+    def __init__(self, request):
+        self.session = request.session
+
+    def _lines(self):
+        return self.session.get(SESSION_KEY, {})
+
+    def _save(self, lines):
+        if lines:
+            self.session[SESSION_KEY] = lines
+        else:
+            self.session.pop(SESSION_KEY, None)
+
+    def __len__(self):
+        return len(self._lines())
+
+    def get_quantity(self, product_id):
+        return self._lines().get(str(product_id), 0)
+
+    def set_quantity(self, product_id, quantity):
+        lines = dict(self._lines())
+        if quantity > 0:
+            lines[str(product_id)] = quantity
+        else:
+            lines.pop(str(product_id), None)
+        self._save(lines)
+
+    def get_summary(self):
+        lines = self._lines()
+        products = Product.objects.select_related('vendor').in_bulk([int(pk) for pk in lines])
+        items = [
+            GuestCartItem(products[int(pk)], quantity)
+            for pk, quantity in lines.items() if int(pk) in products
+        ]
+        return CartSummary(items)
+
+    def clear(self):
+        self._save({})
+
+
+def merge_session_cart(request, user):
+    """
+    Move the guest cart into the user's Cart. Quantities of products already
+    in the cart are added together, and every line is clamped to the stock.
+    """
+    guest_cart = SessionCart(request)
+    lines = {int(pk): quantity for pk, quantity in guest_cart._lines().items()}
+    if not lines:
+        return
+
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(customer=user)
+        stock = dict(Product.objects.filter(id__in=lines).values_list('id', 'stock'))
+        existing = {item.product_id: item for item in cart.items.filter(product_id__in=lines)}
+
+        new_items = []
+        for product_id, quantity in lines.items():
+            if product_id not in stock:
+                continue
+            if product_id in existing:
+                item = existing[product_id]
+                merged = min(item.quantity + quantity, stock[product_id])
+                if merged > item.quantity:
+                    CartItem.objects.filter(pk=item.pk).update(quantity=merged)
+            else:
+                quantity = min(quantity, stock[product_id])
+                if quantity > 0:
+                    new_items.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+
+        if new_items:
+            # bulk_create skips post_save, so keep the denormalized counter in step here
+            CartItem.objects.bulk_create(new_items)
+            Cart.objects.filter(pk=cart.pk).update(items_count=F('items_count') + len(new_items))
+
+    guest_cart.clear()
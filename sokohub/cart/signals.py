@@ -0,0 +1,26 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Cart, CartItem, clearing_carts
+
+
+@receiver(post_save, sender=CartItem)
+def increment_items_count(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        Cart.objects.filter(pk=instance.cart_id).update(items_count=F('items_count') + 1)
+
+
+@receiver(post_delete, sender=CartItem)
+def decrement_items_count(sender, instance, **kwargs):
+    if instance.cart_id in clearing_carts.get():
+        return
+    Cart.objects.filter(pk=instance.cart_id, items_count__gt=0).update(items_count=F('items_count') - 1)
+
+
+@receiver(user_logged_in)
+def merge_guest_cart_on_login(sender, request, user, **kwargs):
+    """Materialize the session cart of a visitor who just logged in."""
+    if request is not None and hasattr(request, 'session'):
+        from .session import merge_session_cart
+        merge_session_cart(request, user)
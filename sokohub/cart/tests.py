@@ -1,3 +1,127 @@
-from django.test import TestCase
+from decimal import Decimal
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.template import engines
+from django.test import RequestFactory, TestCase
+from accounts.models import User
+from cart.models import Cart, CartItem
+from cart.session import SESSION_KEY
+from products.models import Product
 
-# Create your tests here.
+
+def render(source, user, session=None):
+    request = RequestFactory().get('/')
+    request.user = user
+    request.session = session or SessionStore()
+    return engines['django'].from_string(source).render({}, request)
+
+
+class CartCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.products = [
+            Product.objects.create(vendor=vendor, name=f'Item {i}', description='d', price=10, stock=5)
+            for i in range(2)
+        ]
+        cart = Cart.objects.create(customer=cls.customer)
+        for product in cls.products:
+            CartItem.objects.create(cart=cart, product=product)
+
+    def test_count_is_read_only_when_used(self):
+        with self.assertNumQueries(0):
+            render('<p>{{ request.path }}</p>', self.customer)
+        with self.assertNumQueries(1):
+            self.assertEqual(render('{{ cart_count }}{% if cart_count %}!{% endif %}', self.customer), '2!')
+
+    def test_guest_count_comes_from_the_session(self):
+        session = SessionStore()
+        session[SESSION_KEY] = {str(self.products[0].pk): 3}
+        with self.assertNumQueries(0):
+            self.assertEqual(render('{{ cart_count }}', AnonymousUser(), session), '1')
+
+
+class CartSummaryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        cls.vendors = [
+            User.objects.create_user(f'vendor{i}', f'vendor{i}@example.com', user_type='vendor') for i in range(2)
+        ]
+        cart = Cart.objects.create(customer=cls.customer)
+        for i, (vendor, price, quantity) in enumerate([(0, '2.50', 2), (1, '10.00', 1), (0, '1.25', 4)]):
+            product = Product.objects.create(
+                vendor=cls.vendors[vendor], name=f'Item {i}', description='d', price=Decimal(price), stock=10
+            )
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+
+    def test_summary_is_computed_from_one_query(self):
+        cart = Cart.objects.get(customer=self.customer)
+        with self.assertNumQueries(1):
+            summary = cart.get_summary()
+            self.assertEqual(summary.items_count, 3)
+            self.assertEqual(summary.quantity, 7)
+            self.assertEqual(summary.subtotal, Decimal('20.00'))
+            self.assertEqual([line.line_total for line in summary.lines], [Decimal('5.00'), Decimal('10.00'), Decimal('5.00')])
+            self.assertEqual(summary.vendor_subtotals, {self.vendors[0]: Decimal('10.00'), self.vendors[1]: Decimal('10.00')})
+            self.assertEqual([line.product.name for line in summary.vendor_lines[self.vendors[0]]], ['Item 0', 'Item 2'])
+            self.assertEqual(cart.get_total_price(), Decimal('20.00'))
+
+        # Memoized per cart instance
+        with self.assertNumQueries(0):
+            self.assertIs(cart.get_summary(), summary)
+
+
+class GuestCartMergeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com', 'password')
+        vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.kettle, cls.toaster, cls.mug = [
+            Product.objects.create(vendor=vendor, name=name, description='d', price=10, stock=stock)
+            for name, stock in [('Kettle', 5), ('Toaster', 3), ('Mug', 10)]
+        ]
+
+    def _guest_cart(self, lines):
+        session = self.client.session
+        session[SESSION_KEY] = {str(product.pk): quantity for product, quantity in lines.items()}
+        session.save()
+
+    def _quantities(self):
+        cart = Cart.objects.get(customer=self.customer)
+        return cart.items_count, dict(cart.items.values_list('product__name', 'quantity'))
+
+    def test_login_adds_quantities_and_caps_them_at_stock(self):
+        cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=cart, product=self.kettle, quantity=2)
+        self._guest_cart({self.kettle: 2, self.toaster: 7, self.mug: 1})
+
+        self.client.login(username='customer', password='password')
+
+        self.assertEqual(self._quantities(), (3, {'Kettle': 4, 'Toaster': 3, 'Mug': 1}))
+        self.assertNotIn(SESSION_KEY, self.client.session)
+
+    def test_existing_lines_are_capped_too(self):
+        cart = Cart.objects.create(customer=self.customer)
+        CartItem.objects.create(cart=cart, product=self.kettle, quantity=4)
+        self._guest_cart({self.kettle: 4})
+
+        self.client.login(username='customer', password='password')
+
+        self.assertEqual(self._quantities(), (1, {'Kettle': 5}))
+
+    def test_deleted_products_are_dropped(self):
+        self._guest_cart({self.kettle: 1, self.toaster: 1})
+        self.toaster.delete()
+
+        self.client.login(username='customer', password='password')
+
+        self.assertEqual(self._quantities(), (1, {'Kettle': 1}))
+
+    def test_empty_guest_cart_creates_nothing(self):
+        self.client.login(username='customer', password='password')
+        self.assertFalse(Cart.objects.exists())
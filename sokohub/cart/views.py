@@ -1,19 +1,36 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Cart, CartItem
+from .models import Cart, CartItem, CartSummary
+from .session import SessionCart
 from products.models import Product
 
-@login_required
 def view_cart(request):
     """View shopping cart"""
-    cart, created = Cart.objects.get_or_create(customer=request.user)
-    return render(request, 'cart/cart.html', {'cart': cart})
+    if not request.user.is_authenticated:
+        return render(request, 'cart/cart.html', {'summary': SessionCart(request).get_summary()})
+
+    # Read-only: don't create an empty cart just to display it
+    cart = Cart.objects.filter(customer=request.user).first()
+    summary = cart.get_summary() if cart else CartSummary([])
+    return render(request, 'cart/cart.html', {'cart': cart, 'summary': summary})
 
-@login_required
 def add_to_cart(request, product_id):
     """Add product to cart"""
     product = get_object_or_404(Product, id=product_id)
+
+    if not request.user.is_authenticated:
+        guest_cart = SessionCart(request)
+        quantity = guest_cart.get_quantity(product.id)
+        if quantity >= product.stock:
+            messages.error(request, f"Cannot add more {product.name} - limited stock")
+        else:
+            guest_cart.set_quantity(product.id, quantity + 1)
+            if quantity:
+                messages.success(request, f"Added another {product.name} to cart")
+            else:
+                messages.success(request, f"Added {product.name} to cart")
+        return redirect('view_cart')
+
     cart, created = Cart.objects.get_or_create(customer=request.user)
     
     # Check if item already in cart
@@ -36,13 +53,25 @@ def add_to_cart(request, product_id):
     
     return redirect('view_cart')
 
-@login_required
 def update_cart_item(request, item_id):
-    """Update cart item quantity"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__customer=request.user)
-    
+    """Update cart item quantity (for guests `item_id` is the product id)"""
     if request.method == 'POST':
         quantity = int(request.POST.get('quantity', 1))
+
+        if not request.user.is_authenticated:
+            guest_cart = SessionCart(request)
+            product = get_object_or_404(Product, id=item_id)
+            if quantity > 0 and quantity <= product.stock:
+                guest_cart.set_quantity(product.id, quantity)
+                messages.success(request, "Cart updated")
+            elif quantity == 0:
+                guest_cart.set_quantity(product.id, 0)
+                messages.success(request, "Item removed from cart")
+            else:
+                messages.error(request, "Invalid quantity")
+            return redirect('view_cart')
+
+        cart_item = get_object_or_404(CartItem, id=item_id, cart__customer=request.user)
         
         if quantity > 0 and quantity <= cart_item.product.stock:
             cart_item.quantity = quantity
@@ -56,10 +85,12 @@ def update_cart_item(request, item_id):
     
     return redirect('view_cart')
 
-@login_required
 def remove_from_cart(request, item_id):
-    """Remove item from cart"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__customer=request.user)
-    cart_item.delete()
+    """Remove item from cart (for guests `item_id` is the product id)"""
+    if not request.user.is_authenticated:
+        SessionCart(request).set_quantity(item_id, 0)
+    else:
+        cart_item = get_object_or_404(CartItem, id=item_id, cart__customer=request.user)
+        cart_item.delete()
     messages.success(request, "Item removed from cart")
-    return redirect('view_cart')
\ No newline at end of file
+    return redirect('view_cart')
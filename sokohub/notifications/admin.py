@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import QueuedEmail
 
-# Register your models here.
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('attempts',)
+    readonly_fields = ('last_error', 'created_at')
@@ -0,0 +1,140 @@
+"""
+Persistent mail queue.
+
+`queue_mail()` stores the message in the QueuedEmail table so the request
+never waits on SMTP. `send_queued()` is run by the `send_queued_mail` worker:
+it claims a batch of due messages, sends them over one backend connection
+and reschedules failures with exponential backoff.
+
+The worker only uses `get_connection()`, so the locmem and file backends work
+the same as SMTP in tests and development.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+MAIL_QUEUE_BATCH_SIZE = getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', 50)
+MAIL_QUEUE_MAX_ATTEMPTS = getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 5)
+MAIL_QUEUE_RETRY_DELAY = getattr(settings, 'MAIL_QUEUE_RETRY_DELAY', 30)
+
+# How long a claimed batch stays invisible to other workers while it is sent
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def queue_mail(subject, body, recipient_list, from_email=None):
+    """Queue an email for delivery. Same arguments as django's send_mail()."""
+    return QueuedEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        to=list(recipient_list)
+    )
+
+
+def queue_mass_mail(datatuple):
+    """
+    Queue several emails with one INSERT. `datatuple` is the same as for
+    django's send_mass_mail(): (subject, body, from_email, recipient_list).
+    """
+    return QueuedEmail.objects.bulk_create([
+        QueuedEmail(
+            subject=subject,
+            body=body,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+            to=list(recipient_list)
+        )
+        for subject, body, from_email, recipient_list in datatuple
+    ])
+
+
+def pending():
+    """Queued messages that will still be attempted."""
+    return QueuedEmail.objects.filter(attempts__lt=MAIL_QUEUE_MAX_ATTEMPTS)
+
+
+def queue_depth():
+    """Return (pending, due_now, failed) message counts."""
+    now = timezone.now()
+    return (
+        pending().count(),
+        pending().filter(next_attempt_at__lte=now).count(),
+        QueuedEmail.objects.filter(attempts__gte=MAIL_QUEUE_MAX_ATTEMPTS).count(),
+    )
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            pending().filter(next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            # Push the claimed rows into the future so a concurrent worker skips them
+            # without holding row locks for the whole SMTP conversation.
+            QueuedEmail.objects.filter(pk__in=[queued.pk for queued in batch]).update(
+                next_attempt_at=now + CLAIM_TIMEOUT
+            )
+    return batch
+
+
+def _retry_later(queued, error):
+    queued.attempts += 1
+    queued.last_error = str(error)[:1000]
+    queued.next_attempt_at = timezone.now() + timedelta(
+        seconds=MAIL_QUEUE_RETRY_DELAY * 2 ** (queued.attempts - 1)
+    )
+    queued.save(update_fields=['attempts', 'last_error', 'next_attempt_at'])
+    if queued.attempts >= MAIL_QUEUE_MAX_ATTEMPTS:
+        logger.error("Giving up on email %s to %s: %s", queued.pk, queued.to, error)
+
+
+def send_queued(batch_size=MAIL_QUEUE_BATCH_SIZE):
+    """
+    Send one batch of due messages. Returns (sent, failed) so callers can
+    loop until nothing is left.
+    """
+    batch = _claim(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent, failed = [], 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("Mail backend unavailable, retrying %d emails later: %s", len(batch), e)
+        for queued in batch:
+            _retry_later(queued, e)
+        return 0, len(batch)
+
+    try:
+        for queued in batch:
+            message = EmailMessage(
+                subject=queued.subject,
+                body=queued.body,
+                from_email=queued.from_email or None,
+                to=queued.to,
+                connection=connection
+            )
+            try:
+                message.send()
+            except Exception as e:
+                logger.warning("Failed to send email %s: %s", queued.pk, e)
+                _retry_later(queued, e)
+                failed += 1
+            else:
+                sent.append(queued.pk)
+    finally:
+        connection.close()
+
+    QueuedEmail.objects.filter(pk__in=sent).delete()
+    return len(sent), failed
@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.outbox import drain
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notifications from the outbox in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the outbox is empty.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait between polls in --loop mode.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = drain(batch_size=options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} notifications."))
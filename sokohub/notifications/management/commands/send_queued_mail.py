@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.mail import MAIL_QUEUE_BATCH_SIZE, queue_depth, send_queued
+
+
+class Command(BaseCommand):
+    help = "Send queued emails in batches over a single mail connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=MAIL_QUEUE_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the queue is empty.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait between polls in --loop mode.")
+        parser.add_argument('--status', action='store_true', help="Only print the queue depth.")
+
+    def handle(self, *args, **options):
+        if options['status']:
+            waiting, due, failed = queue_depth()
+            self.stdout.write(f"Pending: {waiting} (due now: {due}), failed: {failed}")
+            return
+
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_queued(batch_size=options['batch_size'])
+            total_sent += sent
+            total_failed += failed
+            if sent:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Sent {total_sent} emails, {total_failed} failed."))
@@ -1,5 +1,31 @@
 from django.db import models
+from django.db.models import Case, F, IntegerField, Value, When
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+
+class NotificationQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Bulk insert notifications and bump each recipient's unread counter
+        with a single UPDATE (bulk_create does not send post_save).
+        """
+        objs = super().bulk_create(objs, *args, **kwargs)
+        unread = {}
+        for notification in objs:
+            if not notification.is_read:
+                unread[notification.user_id] = unread.get(notification.user_id, 0) + 1
+        if unread:
+            get_user_model().objects.filter(pk__in=unread).update(
+                unread_notifications_count=F('unread_notifications_count') + Case(
+                    *[When(pk=user_id, then=Value(count)) for user_id, count in unread.items()],
+                    output_field=IntegerField()
+                )
+            )
+        return objs
+
 
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
@@ -16,13 +42,77 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     target_url = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = NotificationQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notification_user_read_created'),
+            models.Index(fields=['user', '-created_at'], name='notification_user_created'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.username}"
     
     def mark_as_read(self):
         self.is_read = True
-        self.save()
\ No newline at end of file
+        self.save()
+
+class NotificationOutbox(models.Model):
+    """
+    Notifications waiting to be delivered.
+
+    Request handlers write here inside their own transaction (one cheap
+    INSERT) and the `process_notification_outbox` worker turns the rows
+    into Notification records and email/SMS messages in batches.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    target_url = models.CharField(max_length=255, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Outbox Notification"
+        verbose_name_plural = "Notification Outbox"
+
+    def __str__(self):
+        return f"Pending: {self.title} - {self.user_id}"
+
+    def to_notification(self):
+        return Notification(
+            user_id=self.user_id,
+            title=self.title,
+            message=self.message,
+            notification_type=self.notification_type,
+            target_url=self.target_url
+        )
+
+
+class QueuedEmail(models.Model):
+    """
+    An outgoing email persisted by the request and delivered by the
+    `send_queued_mail` worker (see notifications.mail).
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.JSONField(default=list)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='queued_email_due'),
+        ]
+        verbose_name = "Queued Email"
+        verbose_name_plural = "Mail Queue"
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
@@ -0,0 +1,77 @@
+"""
+Transactional outbox for user notifications.
+
+`notify()` / `notify_many()` only insert outbox rows, so they commit or roll
+back together with the order that caused them. `drain()` is run by the
+`process_notification_outbox` worker outside the request cycle; it hands
+emails to the mail queue (notifications.mail), which retries failed sends.
+"""
+import logging
+
+from django.db import transaction
+from .mail import queue_mass_mail
+from .models import Notification, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def notify(user, title, message, notification_type, target_url=None):
+    """Queue a notification for `user`."""
+    return NotificationOutbox.objects.create(
+        user=user,
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        target_url=target_url
+    )
+
+
+def notify_many(entries):
+    """Queue several notifications with one INSERT. `entries` are NotificationOutbox instances."""
+    return NotificationOutbox.objects.bulk_create(entries)
+
+
+def send_sms(phone, text):
+    """
+    Hand an SMS to the gateway. No SMS provider is integrated yet, so the
+    message is only logged.
+    """
+    logger.info("SMS to %s: %s", phone, text)
+
+
+def _queue_emails(entries):
+    """Queue one email per notification whose user wants them."""
+    queue_mass_mail(
+        (f"Soko Hub: {entry.title}", entry.message, None, [entry.user.email])
+        for entry in entries
+        if entry.user.email_notifications and entry.user.email
+    )
+
+
+def _send_sms(entries):
+    for entry in entries:
+        if entry.user.sms_notifications and entry.user.phone:
+            send_sms(entry.user.phone, f"{entry.title}: {entry.message}")
+
+
+def drain(batch_size=100):
+    """
+    Process up to `batch_size` queued notifications. Returns how many were
+    processed, so callers can loop until it returns 0.
+    """
+    with transaction.atomic():
+        # skip_locked lets several workers drain the outbox concurrently on Postgres
+        entries = list(
+            NotificationOutbox.objects.select_related('user')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')[:batch_size]
+        )
+        if not entries:
+            return 0
+        Notification.objects.bulk_create([entry.to_notification() for entry in entries])
+        # Queued in the same transaction, so a crash can neither lose nor repeat them
+        _queue_emails(entries)
+        NotificationOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+
+    _send_sms(entries)
+    return len(entries)
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Notification
+
+
+def _adjust_unread_count(user_id, delta):
+    users = get_user_model().objects.filter(pk=user_id)
+    if delta < 0:
+        users = users.filter(unread_notifications_count__gt=0)
+    users.update(unread_notifications_count=F('unread_notifications_count') + delta)
+
+
+@receiver(post_init, sender=Notification)
+def remember_read_state(sender, instance, **kwargs):
+    instance._was_unread = instance.__dict__.get('is_read') is False
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    was_unread = False if created else getattr(instance, '_was_unread', False)
+    is_unread = not instance.is_read
+    if was_unread != is_unread:
+        _adjust_unread_count(instance.user_id, 1 if is_unread else -1)
+    instance._was_unread = is_unread
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        _adjust_unread_count(instance.user_id, -1)
@@ -1,3 +1,76 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.template import engines
+from django.core import mail
+from django.test import RequestFactory, TestCase
+from accounts.models import User
+from notifications.mail import send_queued
+from notifications.models import Notification, NotificationOutbox, QueuedEmail
+from notifications.outbox import drain, notify_many
 
-# Create your tests here.
+
+def render(source, user):
+    request = RequestFactory().get('/')
+    request.user = user
+    request.session = SessionStore()
+    return engines['django'].from_string(source).render({}, request)
+
+
+class ContextProcessorTests(TestCase):
+    """The global notification and cart values cost nothing unless a template uses them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        Notification.objects.bulk_create([
+            Notification(user=cls.user, title=f'Note {i}', message='m', notification_type='system')
+            for i in range(3)
+        ])
+
+    def setUp(self):
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def test_unused_values_run_no_queries(self):
+        with self.assertNumQueries(0):
+            render('<p>{{ request.path }}</p>', self.user)
+
+    def test_unread_count_comes_from_the_user_row(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(render('{{ unread_notifications_count }}', self.user), '3')
+
+    def test_recent_notifications_are_loaded_once(self):
+        source = '{% for n in recent_notifications %}{{ n.title }},{% endfor %}{{ recent_notifications|length }}'
+        with self.assertNumQueries(1):
+            *titles, count = render(source, self.user).split(',')
+        self.assertEqual(sorted(titles), ['Note 0', 'Note 1', 'Note 2'])
+        self.assertEqual(count, '3')
+
+    def test_anonymous_visitors(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(render('{{ unread_notifications_count }}{{ recent_notifications|length }}', AnonymousUser()), '00')
+
+
+class OutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user('opted_in', 'in@example.com'),
+            User.objects.create_user('opted_out', 'out@example.com', email_notifications=False),
+        ]
+
+    def test_drain_queues_emails_instead_of_sending_them(self):
+        notify_many([
+            NotificationOutbox(user=user, title='Hello', message='Body', notification_type='system')
+            for user in self.users
+        ])
+
+        self.assertEqual(drain(), 2)
+
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(list(QueuedEmail.objects.values_list('subject', 'to')), [('Soko Hub: Hello', ['in@example.com'])])
+
+        self.assertEqual(send_queued(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['in@example.com'])
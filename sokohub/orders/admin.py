@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import Order, OrderItem
 from django.contrib import admin
-from .models import Order, OrderItem
+from .models import Order, OrderItem, DailySales
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
@@ -35,3 +35,10 @@ class OrderItemAdmin(admin.ModelAdmin):
     def get_subtotal(self, obj):
         return f"${obj.get_subtotal()}"
     get_subtotal.short_description = 'Subtotal'
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    list_display = ('day', 'vendor', 'product', 'units', 'revenue', 'order_count')
+    list_filter = ('day',)
+    search_fields = ('vendor__username', 'product__name')
+    raw_id_fields = ('vendor', 'product')
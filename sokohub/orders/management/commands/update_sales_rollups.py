@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from orders.rollups import ROLLUP_BATCH_SIZE, rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = "Fold orders changed since the last run into the daily sales rollups. Run it periodically (e.g. every 5 minutes via cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE)
+        parser.add_argument('--rebuild', action='store_true', help="Discard all rollups and recompute them from every order.")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            processed = rebuild_rollups()
+        else:
+            processed = update_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} orders."))
@@ -1,7 +1,27 @@
 from django.db import models
+from django.db.models.signals import post_init
 from django.conf import settings
 from django.core.validators import MinValueValidator
-from products.models import Product
+from products.models import Product, VendorStats
+
+
+class OrderQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Bulk insert orders and add them to the vendors' stats with a single
+        UPDATE (bulk_create does not send post_save).
+        """
+        objs = super().bulk_create(objs, *args, **kwargs)
+        deltas = {}
+        for order in objs:
+            contribution = VendorStats.order_contribution(order.status, order.payment_status, order.total)
+            VendorStats.add_deltas(deltas, order.vendor_id, contribution)
+            # Later saves of these instances are diffed against this
+            order._vendor_contribution = (order.vendor_id, contribution)
+        VendorStats.adjust(deltas)
+        return objs
+
 
 class Order(models.Model):
     STATUS_CHOICES = (
@@ -69,8 +89,9 @@ class Order(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
-    
+
+    objects = OrderQuerySet.as_manager()
+
     def can_be_cancelled(self):
         """" order can not only be cancelled if not shipped and delivered """
         return self.status in ['pending', 'paid', 'approved']
@@ -78,9 +99,24 @@ class Order(models.Model):
     def can_be_confirmed(self):
         """" vendor can only confirm order if it is paid """
         return self.status == 'paid'
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            # The vendor stats diff later saves against the state remembered on load
+            post_init.send(sender=type(self), instance=self)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # High-water-mark scans of orders.rollups
+            models.Index(fields=['updated_at'], name='order_updated_at'),
+            # Vendor order queue: status counts, status filter and keyset paging
+            models.Index(fields=['vendor', 'status', 'created_at'], name='order_vendor_status_created'),
+            models.Index(fields=['vendor', 'created_at'], name='order_vendor_created'),
+            # Customer order history, newest first
+            models.Index(fields=['customer', 'created_at'], name='order_customer_created'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer.username}"
@@ -143,4 +179,48 @@ class Receipt(models.Model):
         return f"Receipt {self.receipt_number} for Order #{self.order.id}"
 
     class Meta:
-        ordering = ['-issued_at']
\ No newline at end of file
+        ordering = ['-issued_at']
+
+
+class DailySales(models.Model):
+    """
+    Units, revenue and orders per vendor, product and day, filled in by
+    `update_sales_rollups` (see orders.rollups). Rows with no product hold
+    the vendor's totals for the day, where an order is only counted once.
+    """
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'day'], condition=models.Q(product__isnull=False),
+                name='dailysales_unique_product_day'
+            ),
+            models.UniqueConstraint(
+                fields=['vendor', 'day'], condition=models.Q(product__isnull=True),
+                name='dailysales_unique_vendor_day'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['vendor', 'day'], name='dailysales_vendor_day'),
+        ]
+        verbose_name = "Daily Sales"
+        verbose_name_plural = "Daily Sales"
+
+    def __str__(self):
+        return f"{self.day} vendor {self.vendor_id} product {self.product_id or '-'}: {self.units} units"
+
+
+class RollupState(models.Model):
+    """High-water mark of a rollup job, on Order.updated_at."""
+    name = models.CharField(max_length=50, unique=True)
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.high_water_mark}"
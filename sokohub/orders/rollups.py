@@ -0,0 +1,168 @@
+"""
+Daily sales rollups for vendor analytics.
+
+`update_rollups()` walks the orders changed since the last run (by
+Order.updated_at), and recomputes the DailySales rows of every (vendor, day)
+those orders touch. Recomputing whole vendor-days keeps the job idempotent,
+so status changes and cancellations are picked up without tracking deltas.
+The analytics views then read a few hundred pre-aggregated rows at most
+instead of scanning the order history.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import DailySales, Order, OrderItem, RollupState
+
+ROLLUP_NAME = 'daily_sales'
+ROLLUP_BATCH_SIZE = getattr(settings, 'SALES_ROLLUP_BATCH_SIZE', 500)
+# Re-read orders saved this long before the mark, in case their transaction
+# committed after the previous run had already moved past them.
+ROLLUP_OVERLAP = timedelta(seconds=getattr(settings, 'SALES_ROLLUP_OVERLAP_SECONDS', 300))
+
+ANALYTICS_PERIODS = (7, 30, 365)
+
+
+def sold_order_filter(prefix=''):
+    """Orders that count as sales: paid and not cancelled."""
+    return Q(**{f'{prefix}payment_status': 'paid'}) & ~Q(**{f'{prefix}status': 'cancelled'})
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _vendor_days_filter(vendor_days, prefix=''):
+    """Q matching orders of the given {day: {vendor_id, ...}} pairs."""
+    condition = Q()
+    for day, vendor_ids in vendor_days.items():
+        start, end = _day_bounds(day)
+        condition |= Q(**{
+            f'{prefix}created_at__gte': start,
+            f'{prefix}created_at__lt': end,
+            f'{prefix}vendor_id__in': vendor_ids,
+        })
+    return condition
+
+
+def recompute(vendor_days):
+    """Rebuild the DailySales rows for {day: {vendor_id, ...}}."""
+    if not vendor_days:
+        return 0
+    items = OrderItem.objects.filter(
+        sold_order_filter('order__'), _vendor_days_filter(vendor_days, 'order__')
+    ).annotate(day=TruncDate('order__created_at')).order_by()
+    revenue = Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+    rows = [
+        DailySales(vendor_id=row['order__vendor'], product_id=row['product'], day=row['day'],
+                   units=row['units'], revenue=row['revenue'], order_count=row['orders'])
+        for row in items.values('order__vendor', 'product', 'day').annotate(
+            units=Sum('quantity'), revenue=revenue, orders=Count('order', distinct=True)
+        )
+    ]
+    rows += [
+        DailySales(vendor_id=row['order__vendor'], product_id=None, day=row['day'],
+                   units=row['units'], revenue=row['revenue'], order_count=row['orders'])
+        for row in items.values('order__vendor', 'day').annotate(
+            units=Sum('quantity'), revenue=revenue, orders=Count('order', distinct=True)
+        )
+    ]
+
+    stale = Q()
+    for day, vendor_ids in vendor_days.items():
+        stale |= Q(day=day, vendor_id__in=vendor_ids)
+    with transaction.atomic():
+        DailySales.objects.filter(stale).delete()
+        DailySales.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def update_rollups(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Fold orders changed since the high-water mark into DailySales.
+    Returns the number of orders processed.
+    """
+    state, _ = RollupState.objects.get_or_create(name=ROLLUP_NAME)
+    changed = Order.objects.filter(vendor__isnull=False)
+    if state.high_water_mark:
+        changed = changed.filter(updated_at__gt=state.high_water_mark - ROLLUP_OVERLAP)
+
+    processed = 0
+    last = None
+    while True:
+        batch = changed
+        if last:
+            # Keyset over (updated_at, id) so ties on updated_at are not skipped
+            batch = batch.filter(Q(updated_at__gt=last[0]) | Q(updated_at=last[0], id__gt=last[1]))
+        batch = list(
+            batch.order_by('updated_at', 'id').values_list('id', 'vendor_id', 'created_at', 'updated_at')[:batch_size]
+        )
+        if not batch:
+            break
+
+        vendor_days = defaultdict(set)
+        for order_id, vendor_id, created_at, updated_at in batch:
+            vendor_days[timezone.localdate(created_at)].add(vendor_id)
+        recompute(vendor_days)
+
+        last = (batch[-1][3], batch[-1][0])
+        processed += len(batch)
+        if state.high_water_mark is None or last[0] > state.high_water_mark:
+            state.high_water_mark = last[0]
+            state.save(update_fields=['high_water_mark', 'updated_at'])
+    return processed
+
+
+def rebuild_rollups():
+    """Drop every rollup and the high-water mark, then roll up all orders again."""
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        RollupState.objects.filter(name=ROLLUP_NAME).delete()
+    return update_rollups()
+
+
+def sales_series(vendor, days):
+    """
+    Daily totals for the last `days` days (oldest first, missing days as
+    zeros) plus the best-selling products of the period.
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rollups = DailySales.objects.filter(vendor=vendor, day__gte=start, day__lte=today)
+
+    totals = {
+        row['day']: row
+        for row in rollups.filter(product__isnull=True).values('day', 'units', 'revenue', 'order_count')
+    }
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = totals.get(day, {})
+        series.append({
+            'day': day,
+            'units': row.get('units', 0),
+            'revenue': row.get('revenue', 0),
+            'orders': row.get('order_count', 0),
+        })
+
+    top_products = list(
+        rollups.filter(product__isnull=False).order_by().values('product', 'product__name')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', 'product')[:10]
+    )
+    return {
+        'days': days,
+        'series': series,
+        'totals': {
+            'units': sum(point['units'] for point in series),
+            'revenue': sum(point['revenue'] for point in series),
+            'orders': sum(point['orders'] for point in series),
+        },
+        'top_products': top_products,
+    }
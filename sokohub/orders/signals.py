@@ -0,0 +1,45 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from products.models import VendorStats
+from .models import Order
+
+
+def _vendor_contribution(values):
+    """Return (vendor_id, contribution) for loaded order values, or None if some were deferred."""
+    if any(name not in values for name in ('vendor_id', 'status', 'payment_status', 'total')):
+        return None
+    return values['vendor_id'], VendorStats.order_contribution(
+        values['status'], values['payment_status'], values['total']
+    )
+
+
+@receiver(post_init, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    """Remember the loaded status/total so saves can adjust the vendor stats."""
+    instance._vendor_contribution = _vendor_contribution(instance.__dict__)
+
+
+@receiver(post_save, sender=Order)
+def update_vendor_stats_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_vendor_contribution', None)
+    if old is None and not created:
+        # The order was loaded with deferred fields; rebuild_vendor_stats catches up
+        return
+    new = _vendor_contribution(instance.__dict__)
+    deltas = {}
+    if old is not None:
+        VendorStats.add_deltas(deltas, old[0], old[1], -1)
+    VendorStats.add_deltas(deltas, new[0], new[1])
+    VendorStats.adjust(deltas)
+    instance._vendor_contribution = new
+
+
+@receiver(post_delete, sender=Order)
+def update_vendor_stats_on_delete(sender, instance, **kwargs):
+    old = getattr(instance, '_vendor_contribution', None)
+    if old is not None:
+        deltas = {}
+        VendorStats.add_deltas(deltas, old[0], old[1], -1)
+        VendorStats.adjust(deltas)
@@ -1,3 +1,447 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from decimal import Decimal
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import SokohubCard, User
+from cart.models import Cart, CartItem
+from notifications.models import NotificationOutbox
+from orders import rollups
+from orders.models import DailySales, Order, OrderItem, RollupState
+from products.models import Category, Product, PromotionDay, StockReservation, VendorStats
 
-# Create your tests here.
+
+class FlashSaleStockTests(TransactionTestCase):
+    """Concurrent checkouts on a promotion day must never oversell."""
+
+    def setUp(self):
+        vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        self.product = Product.objects.create(vendor=vendor, name='Flash item', description='d', price=10, stock=5)
+        self.customers = [
+            User.objects.create_user(f'customer{i}', f'customer{i}@example.com')
+            for i in range(20)
+        ]
+
+    def _checkout(self, customer, results):
+        """Start checkout (hold), then pay (convert the hold into a sale)."""
+        try:
+            for attempt in range(100):
+                try:
+                    if StockReservation.hold(customer, {self.product.pk: 1}):
+                        results.append('rejected')
+                        return
+                    with transaction.atomic():
+                        if not Product.objects.decrement_stock({self.product.pk: 1}, holder=customer):
+                            results.append('rejected')
+                            return
+                        StockReservation.release(customer, [self.product.pk])
+                    results.append('sold')
+                    return
+                except OperationalError:
+                    # SQLite reports lock contention instead of waiting; back off and retry
+                    time.sleep(0.005 * (attempt + 1))
+            results.append('gave up')
+        finally:
+            close_old_connections()
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        results = []
+        threads = [threading.Thread(target=self._checkout, args=(customer, results)) for customer in self.customers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.product.refresh_from_db()
+        self.assertNotIn('gave up', results)
+        self.assertEqual(results.count('sold'), 5)
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(self.product.status, 'out_of_stock')
+
+    def test_holds_reduce_available_stock_for_others(self):
+        first, second = self.customers[:2]
+        self.assertEqual(StockReservation.hold(first, {self.product.pk: 4}), {})
+        self.assertEqual(StockReservation.hold(second, {self.product.pk: 2}), {self.product.pk: 1})
+
+        with transaction.atomic():
+            self.assertFalse(Product.objects.decrement_stock({self.product.pk: 2}, holder=second))
+            self.assertTrue(Product.objects.decrement_stock({self.product.pk: 4}, holder=first))
+            StockReservation.release(first, [self.product.pk])
+
+        available = Product.objects.with_available(second).get(pk=self.product.pk).available
+        self.assertEqual(available, 1)
+
+    def test_expired_holds_are_ignored_and_purged(self):
+        StockReservation.hold(self.customers[0], {self.product.pk: 5})
+        StockReservation.objects.update(expires_at='2000-01-01T00:00:00Z')
+
+        self.assertEqual(Product.objects.with_available().get(pk=self.product.pk).available, 5)
+        self.assertEqual(StockReservation.purge_expired(), 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class CheckoutCartTests(TestCase):
+    """The cart checkout either writes everything or nothing."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        cls.vendors = [
+            User.objects.create_user(f'vendor{i}', f'vendor{i}@example.com', user_type='vendor') for i in range(2)
+        ]
+        cls.category = Category.objects.create(name='Phones')
+        cls.products = [
+            Product.objects.create(vendor=vendor, category=cls.category, name=f'Item {i}',
+                                   description='d', price=10 * (i + 1), stock=5)
+            for i, vendor in enumerate(cls.vendors)
+        ]
+        cls.card = SokohubCard.objects.create(
+            user=cls.customer, email='customer@example.com', phone='0700000000',
+            status='approved', virtual_id='SH-123456', balance=100, is_active=True
+        )
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+        self.cart = Cart.objects.create(customer=self.customer)
+        # 2 x 10 from vendor0, 3 x 20 from vendor1
+        CartItem.objects.create(cart=self.cart, product=self.products[0], quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=3)
+
+    def checkout(self, payment_method='virtual_card'):
+        return self.client.post(reverse('checkout_cart'), {
+            'delivery_address': '1 Main Street',
+            'phone': '0700000000',
+            'payment_method': payment_method,
+        })
+
+    def assertNothingWritten(self, balance=Decimal('100.00')):
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual([p.stock for p in Product.objects.order_by('pk')], [5, 5])
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.balance, balance)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.items_count, 2)
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_insufficient_balance_writes_nothing(self):
+        SokohubCard.objects.filter(pk=self.card.pk).update(balance=79)
+
+        response = self.checkout()
+
+        self.assertRedirects(response, reverse('checkout_cart'), fetch_redirect_response=False)
+        self.assertNothingWritten(balance=Decimal('79.00'))
+
+    def test_stock_taken_by_another_hold_rolls_back_the_charge(self):
+        other = User.objects.create_user('other', 'other@example.com')
+        StockReservation.hold(other, {self.products[1].pk: 4})
+
+        response = self.checkout()
+
+        self.assertRedirects(response, reverse('view_cart'), fetch_redirect_response=False)
+        self.assertNothingWritten()
+
+    def test_orders_are_split_per_vendor_with_discounted_totals(self):
+        PromotionDay.objects.create(date=timezone.now().date())
+
+        response = self.checkout()
+
+        orders = {order.vendor_id: order for order in Order.objects.all()}
+        self.assertRedirects(
+            response, reverse('order_confirmation', args=[min(o.pk for o in orders.values())]),
+            fetch_redirect_response=False
+        )
+        # 5% off each vendor's subtotal; the card is charged their sum
+        self.assertEqual(orders[self.vendors[0].pk].total, Decimal('19.00'))
+        self.assertEqual(orders[self.vendors[1].pk].total, Decimal('57.00'))
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.balance, Decimal('24.00'))
+        for order in orders.values():
+            self.assertEqual((order.status, order.payment_status), ('paid', 'paid'))
+            self.assertEqual(order.transaction_id, f'VC-{order.pk}-3456')
+        self.assertEqual(
+            sorted(OrderItem.objects.values_list('order__vendor', 'product', 'quantity')),
+            sorted([(self.vendors[0].pk, self.products[0].pk, 2), (self.vendors[1].pk, self.products[1].pk, 3)])
+        )
+
+    def test_counters_and_notifications_after_checkout(self):
+        self.checkout(payment_method='mtn')
+
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.items_count, 0)
+        self.assertFalse(self.cart.items.exists())
+        self.assertEqual([p.stock for p in Product.objects.order_by('pk')], [3, 2])
+
+        stats = {s.vendor_id: s for s in VendorStats.objects.all()}
+        self.assertEqual(stats[self.vendors[0].pk].open_orders, 1)
+        self.assertEqual(stats[self.vendors[0].pk].inventory_value, Decimal('30.00'))
+        self.assertEqual(stats[self.vendors[1].pk].inventory_value, Decimal('40.00'))
+        # Unpaid orders earn no revenue yet
+        self.assertEqual(stats[self.vendors[1].pk].revenue, 0)
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.active_product_count, 2)
+
+        self.assertEqual(
+            sorted(NotificationOutbox.objects.values_list('user', 'title')),
+            sorted((vendor.pk, 'New Order Received') for vendor in self.vendors)
+        )
+
+    def test_query_count_does_not_grow_with_the_cart(self):
+        def checkout_queries(lines):
+            self.cart.items.all().delete()
+            for i in range(lines):
+                product = Product.objects.create(vendor=self.vendors[0], name=f'Extra {i}', description='d',
+                                                 price=1, stock=5)
+                CartItem.objects.create(cart=self.cart, product=product)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.checkout(payment_method='mtn')
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(self.cart.items.count(), 0)
+            return len(queries)
+
+        self.assertEqual(checkout_queries(1), checkout_queries(8))
+
+    def test_selling_the_last_unit_updates_the_category_count(self):
+        self.cart.items.filter(product=self.products[1]).update(quantity=5)
+
+        self.checkout(payment_method='mtn')
+
+        self.category.refresh_from_db()
+        self.assertEqual(self.category.active_product_count, 1)
+        stats = VendorStats.objects.get(vendor=self.vendors[1])
+        self.assertEqual((stats.active_products, stats.out_of_stock_products), (0, 1))
+
+
+class CustomerOrderHistoryTests(TestCase):
+    """The history page costs the same few queries however many orders there are."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.products = [
+            Product.objects.create(vendor=vendor, name=f'Item {i}', description='d', price=10, stock=50)
+            for i in range(3)
+        ]
+        cls.vendor = vendor
+
+    def setUp(self):
+        self.client.force_login(self.customer)
+
+    def create_orders(self, count):
+        orders = Order.objects.bulk_create([
+            Order(customer=self.customer, vendor=self.vendor, total=30, delivery_address='a',
+                  phone='1', payment_method='mtn')
+            for _ in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=10)
+            for order in orders for product in self.products
+        ])
+
+    def history_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('customer_orders'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.create_orders(2)
+        _, few = self.history_queries()
+
+        self.create_orders(45)
+        response, many = self.history_queries()
+        self.assertEqual(few, many)
+
+        page = response.context['orders']
+        orders = list(page)
+        self.assertEqual(len(orders), 20)
+        self.assertEqual({(order.item_count, order.first_item_name) for order in orders}, {(3, 'Item 0')})
+
+        _, next_page = self.history_queries(cursor=page.next_cursor)
+        self.assertEqual(next_page, many)
+
+
+class SalesRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        cls.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.kettle = Product.objects.create(vendor=cls.vendor, name='Kettle', description='d', price=10, stock=50)
+        cls.toaster = Product.objects.create(vendor=cls.vendor, name='Toaster', description='d', price=25, stock=50)
+
+    def order(self, *lines, status='paid', updated_at=None):
+        order = Order.objects.create(
+            customer=self.customer, vendor=self.vendor, total=sum(qty * p.price for p, qty in lines),
+            delivery_address='a', phone='1', payment_method='mtn', status=status,
+            payment_status='paid' if status == 'paid' else 'pending'
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=qty, price=product.price) for product, qty in lines
+        ])
+        if updated_at:
+            # update() leaves auto_now alone: the order looks saved at `updated_at`
+            Order.objects.filter(pk=order.pk).update(updated_at=updated_at)
+        return order
+
+    def day_totals(self):
+        row = DailySales.objects.get(vendor=self.vendor, product__isnull=True, day=timezone.localdate())
+        return row.units, row.revenue, row.order_count
+
+    def mark(self):
+        return RollupState.objects.get(name=rollups.ROLLUP_NAME).high_water_mark
+
+    def test_folds_only_orders_past_the_mark(self):
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        self.order((self.kettle, 2), updated_at=an_hour_ago - timedelta(hours=1))
+        self.order((self.kettle, 1), (self.toaster, 1), updated_at=an_hour_ago - timedelta(hours=1))
+        self.order((self.toaster, 3), status='pending', updated_at=an_hour_ago)
+        self.assertEqual(rollups.update_rollups(), 3)
+        self.assertEqual(self.day_totals(), (4, Decimal('55.00'), 2))
+        self.assertEqual(self.mark(), an_hour_ago)
+
+        # Only the new order and the one within the overlap of the mark are read
+        self.order((self.toaster, 1))
+        self.assertEqual(rollups.update_rollups(), 2)
+        self.assertEqual(self.day_totals(), (5, Decimal('80.00'), 3))
+        self.assertEqual(
+            dict(DailySales.objects.filter(product__isnull=False).values_list('product', 'units')),
+            {self.kettle.pk: 3, self.toaster.pk: 2}
+        )
+
+    def test_late_commits_inside_the_overlap_are_counted_once(self):
+        self.order((self.kettle, 1))
+        rollups.update_rollups()
+        mark = self.mark()
+
+        # Saved before the mark but committed after the previous run
+        self.order((self.kettle, 2), updated_at=mark - rollups.ROLLUP_OVERLAP / 2)
+        self.assertEqual(rollups.update_rollups(), 2)
+        self.assertEqual(self.day_totals(), (3, Decimal('30.00'), 2))
+
+        # Re-reading the overlap again changes nothing
+        rollups.update_rollups()
+        self.assertEqual(self.day_totals(), (3, Decimal('30.00'), 2))
+        self.assertEqual(DailySales.objects.count(), 2)
+
+    def test_cancellation_rebuilds_the_vendor_day(self):
+        self.order((self.kettle, 1))
+        cancelled = self.order((self.toaster, 2))
+        rollups.update_rollups()
+        self.assertEqual(self.day_totals(), (3, Decimal('60.00'), 2))
+
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        rollups.update_rollups()
+        self.assertEqual(self.day_totals(), (1, Decimal('10.00'), 1))
+        self.assertFalse(DailySales.objects.filter(product=self.toaster).exists())
+
+        self.assertEqual(rollups.rebuild_rollups(), 2)
+        self.assertEqual(self.day_totals(), (1, Decimal('10.00'), 1))
+
+    def test_analytics_data(self):
+        self.order((self.kettle, 1), (self.toaster, 2))
+        self.order((self.kettle, 4))
+        rollups.update_rollups()
+        self.client.force_login(self.vendor)
+
+        data = self.client.get(reverse('vendor_analytics_data'), {'days': 7}).json()
+        self.assertEqual(data['days'], 7)
+        self.assertEqual(len(data['series']), 7)
+        self.assertEqual(data['series'][-1], {
+            'day': timezone.localdate().isoformat(), 'units': 7, 'revenue': '100.00', 'orders': 2
+        })
+        self.assertEqual({point['units'] for point in data['series'][:-1]}, {0})
+        self.assertEqual(data['totals'], {'units': 7, 'revenue': '100.00', 'orders': 2})
+        self.assertEqual(
+            [(row['name'], row['units'], Decimal(row['revenue'])) for row in data['top_products']],
+            [('Kettle', 5, Decimal('50')), ('Toaster', 2, Decimal('50'))]
+        )
+
+        # Unknown periods fall back to 30 days
+        self.assertEqual(self.client.get(reverse('vendor_analytics_data'), {'days': 5}).json()['days'], 30)
+
+
+class VendorOrdersTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        cls.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        other = User.objects.create_user('other', 'other@example.com', user_type='vendor')
+        statuses = ['pending', 'pending', 'paid', 'paid', 'paid', 'shipped', 'cancelled']
+        cls.orders = Order.objects.bulk_create([
+            Order(customer=cls.customer, vendor=vendor, total=10, delivery_address='a', phone='1',
+                  payment_method='mtn', status=status)
+            for vendor in (cls.vendor, other) for status in statuses
+        ])
+        # Equal timestamps: only the id tiebreak orders these rows
+        cls.now = timezone.now()
+        Order.objects.update(created_at=cls.now)
+
+    def setUp(self):
+        self.client.force_login(self.vendor)
+
+    def get(self, **params):
+        response = self.client.get(reverse('vendor_orders'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def ids(self, page):
+        return [order.pk for order in page]
+
+    def own(self, **filters):
+        return list(Order.objects.filter(vendor=self.vendor, **filters).order_by('-id').values_list('pk', flat=True))
+
+    @mock.patch('orders.views.VENDOR_ORDERS_PER_PAGE', 3)
+    def test_cursors_walk_every_order_once(self):
+        pages, cursor = [], None
+        while True:
+            page = self.get(**({'cursor': cursor} if cursor else {}))['orders']
+            pages.append(self.ids(page))
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.own())
+
+        back = self.get(cursor=page.previous_cursor)['orders']
+        self.assertEqual(self.ids(back), pages[1])
+
+    def test_filters(self):
+        self.assertEqual(self.ids(self.get(status='paid')['orders']), self.own(status='paid'))
+        # Unknown statuses are ignored
+        context = self.get(status='lost')
+        self.assertEqual(context['status'], '')
+        self.assertEqual(self.ids(context['orders']), self.own())
+
+        yesterday = self.now - timedelta(days=1)
+        old = self.own()[-2:]
+        Order.objects.filter(pk__in=old).update(created_at=yesterday)
+        today, day_before = timezone.localdate(self.now), timezone.localdate(yesterday)
+        self.assertEqual(self.ids(self.get(**{'from': today.isoformat()})['orders']), self.own()[:-2])
+        self.assertEqual(self.ids(self.get(to=day_before.isoformat())['orders']), old)
+        self.assertEqual(
+            self.ids(self.get(status='pending', to=day_before.isoformat())['orders']),
+            self.own(status='pending', pk__in=old)
+        )
+        self.assertEqual(self.get(**{'from': 'not-a-date'})['date_from'], None)
+
+    def test_status_counts_match_the_orders(self):
+        self.orders[0].status = 'delivered'
+        self.orders[0].save()
+        context = self.get(status='paid')
+
+        expected = {value: Order.objects.filter(vendor=self.vendor, status=value).count()
+                    for value, label in Order.STATUS_CHOICES}
+        self.assertEqual({value: count for value, label, count in context['status_counts']}, expected)
+        self.assertEqual(expected['pending'], 1)
+        self.assertEqual(context['total_orders'], 7)
+        self.assertEqual(context['pending_count'], 1)
@@ -15,6 +15,8 @@ urlpatterns = [
     path('vendor/orders/approve/<int:order_id>/', views.approve_order, name='approve_order'),
     path('vendor/orders/cancel/<int:order_id>/', views.cancel_order, name='cancel_order'),
     path('vendor/orders/transaction/<int:order_id>/', views.transaction_detail, name='transaction_detail'),
+    path('vendor/analytics/', views.vendor_analytics, name='vendor_analytics'),
+    path('vendor/analytics/data/', views.vendor_analytics_data, name='vendor_analytics_data'),
 
     # Payment routes
     path('pay/<int:order_id>/', views.pay_order, name='pay_order'),
@@ -3,24 +3,51 @@ from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery
 from django.http import HttpResponseForbidden, JsonResponse
 from accounts.decorators import customer_required, vendor_required
-from products.models import Product, PromotionDay
-from cart.models import Cart
+from products.models import Product, PromotionDay, StockReservation
+from products.pagination import KeysetPaginator
+from cart.models import Cart, get_promotion_discount_rate
 from .models import Order, OrderItem
 from .forms import CheckoutForm
-from notifications.models import Notification
+from .rollups import ANALYTICS_PERIODS, sales_series
+from notifications.models import NotificationOutbox
+from notifications.outbox import notify, notify_many
 from accounts.models import SokohubCard
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from decimal import Decimal
+from datetime import datetime, time, timedelta
+
+VENDOR_ORDERS_PER_PAGE = 25
+CUSTOMER_ORDERS_PER_PAGE = 20
+
+
+def _parse_day(value):
+    """Return the date in a YYYY-MM-DD query parameter, or None if it is missing or invalid."""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class OutOfStock(Exception):
+    """Raised inside a checkout transaction to roll it back when stock ran out."""
 
 @customer_required
 def checkout_cart(request):
     """
     Handle checkout for all items in the cart
     """
-    cart, created = Cart.objects.get_or_create(customer=request.user)
-    items = cart.items.all()
+    cart = Cart.objects.filter(customer=request.user).first()
+    # The discount is decided once here; the page and the charge both use it
+    summary = cart.get_summary(with_discount=True) if cart else None
+    items = summary.lines if summary else []
 
     if not items:
         messages.error(request, 'Your cart is empty.')
@@ -31,13 +58,8 @@ def checkout_cart(request):
         if form.is_valid():
             try:
                 with transaction.atomic():
-                    # Group items by vendor
-                    vendor_items_map = {}
-                    for item in items:
-                        vendor = item.product.vendor
-                        if vendor not in vendor_items_map:
-                            vendor_items_map[vendor] = []
-                        vendor_items_map[vendor].append(item)
+                    # Lines were loaded with their products and vendors in one query
+                    vendor_items_map = summary.vendor_lines
 
                     # Check stock for all items
                     for item in items:
@@ -46,87 +68,90 @@ def checkout_cart(request):
                             return redirect('checkout_cart')
 
                     # Calculate grand total for all vendors
-                    grand_total = Decimal('0.00')
-                    is_promotion = PromotionDay.objects.filter(date=timezone.now().date()).exists()
-                    has_card = SokohubCard.objects.filter(user=request.user, status='approved', is_active=True).exists()
-                    
-                    for vendor, v_items in vendor_items_map.items():
-                        v_total = sum(item.get_total_price() for item in v_items)
-                        if is_promotion and has_card:
-                            v_total = v_total * Decimal('0.95')
-                        grand_total += v_total
+                    vendor_totals = {vendor: summary.vendor_total(vendor) for vendor in summary.vendor_subtotals}
+                    grand_total = sum(vendor_totals.values(), Decimal('0.00'))
 
                     # Handle Virtual Card payment deduction
                     payment_method = form.cleaned_data['payment_method']
                     if payment_method == 'virtual_card':
-                        if not has_card:
+                        user_card = SokohubCard.objects.filter(user=request.user, status='approved', is_active=True).first()
+                        if user_card is None:
                             messages.error(request, "You do not have a Sokohub Card to use this payment method.")
                             return redirect('checkout_cart')
                         
-                        user_card = SokohubCard.objects.get(user=request.user)
-                        if user_card.balance < grand_total:
+                        # Deduct from balance only if it covers the total
+                        charged = SokohubCard.objects.filter(
+                            pk=user_card.pk, balance__gte=grand_total
+                        ).update(balance=F('balance') - grand_total)
+                        if not charged:
                             messages.error(request, f"Insufficient balance on your Sokohub Card. (Balance: ${user_card.balance})")
                             return redirect('checkout_cart')
-                        
-                        # Deduct from balance
-                        user_card.balance -= grand_total
-                        user_card.save()
-
-                    created_order_ids = []
-                    for vendor, v_items in vendor_items_map.items():
-                        # Calculate vendor subtotal
-                        vendor_total = sum(item.get_total_price() for item in v_items)
-                        
-                        if is_promotion and has_card:
-                            vendor_total = vendor_total * Decimal('0.95')
 
-                        # Create order for this vendor
-                        order = Order.objects.create(
+                    # Take everything out of stock with one conditional UPDATE
+                    quantities = {}
+                    for item in items:
+                        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+                    if not Product.objects.decrement_stock(quantities, holder=request.user):
+                        raise OutOfStock()
+                    StockReservation.release(request.user, list(quantities))
+
+                    # Create one order per vendor
+                    paid = payment_method == 'virtual_card'
+                    orders = Order.objects.bulk_create([
+                        Order(
                             customer=request.user,
                             vendor=vendor,
                             total=vendor_total,
                             delivery_address=form.cleaned_data['delivery_address'],
                             phone=form.cleaned_data['phone'],
-                            payment_method=payment_method
+                            payment_method=payment_method,
+                            # If paid with virtual card, mark as paid immediately
+                            status='paid' if paid else 'pending',
+                            payment_status='paid' if paid else 'pending'
                         )
-                        
-                        # If paid with virtual card, mark as paid immediately
-                        if payment_method == 'virtual_card':
-                            order.status = 'paid'
-                            order.payment_status = 'paid'
+                        for vendor, vendor_total in vendor_totals.items()
+                    ])
+
+                    if paid:
+                        for order in orders:
                             order.transaction_id = f"VC-{order.id}-{user_card.virtual_id[-4:]}"
-                            order.save()
-
-                        created_order_ids.append(str(order.id))
-
-                        # Create order items and update stock
-                        for item in v_items:
-                            OrderItem.objects.create(
-                                order=order,
-                                product=item.product,
-                                quantity=item.quantity,
-                                price=item.product.price
-                            )
-                            item.product.stock -= item.quantity
-                            item.product.save()
-
-                        # Create notification for vendor
-                        Notification.objects.create(
-                            user=vendor,
+                        Order.objects.bulk_update(orders, ['transaction_id'])
+
+                    # Create order items and vendor notifications
+                    OrderItem.objects.bulk_create([
+                        OrderItem(
+                            order=order,
+                            product=item.product,
+                            quantity=item.quantity,
+                            price=item.product.price
+                        )
+                        for order in orders
+                        for item in vendor_items_map[order.vendor]
+                    ])
+
+                    notify_many([
+                        NotificationOutbox(
+                            user=order.vendor,
                             title="New Order Received",
-                            message=f"You have a new order (# {order.id}) for {v_items.__len__()} items.",
+                            message=f"You have a new order (# {order.id}) for {len(vendor_items_map[order.vendor])} items.",
                             notification_type='order_update',
                             target_url=f"/orders/vendor/orders/transaction/{order.id}/"
                         )
+                        for order in orders
+                    ])
 
                     # Clear cart
-                    items.delete()
+                    cart.clear()
 
+                    created_order_ids = [str(order.id) for order in orders]
                     order_str = ", ".join(created_order_ids)
                     messages.success(request, f'Order(s) placed successfully! Order number(s): #{order_str}')
                     # Redirect to confirmation with the first order ID (we'll update confirmation to handle context if needed)
                     return redirect('order_confirmation', order_id=created_order_ids[0])
 
+            except OutOfStock:
+                messages.error(request, 'Sorry, some items in your cart just sold out. Please review your cart.')
+                return redirect('view_cart')
             except Exception as e:
                 messages.error(request, f'Error placing order: {str(e)}')
     else:
@@ -138,21 +163,29 @@ def checkout_cart(request):
 
     is_promotion = PromotionDay.objects.filter(date=timezone.now().date()).exists()
     card = SokohubCard.objects.filter(user=request.user, status='approved', is_active=True).first()
+
+    # On promotion days hold the stock while the customer completes checkout
+    if is_promotion and request.method == 'GET':
+        quantities = {}
+        for item in items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        shortfall = StockReservation.hold(request.user, quantities)
+        if shortfall:
+            names = ", ".join(item.product.name for item in items if item.product_id in shortfall)
+            messages.error(request, f'Sorry, these items are sold out or reserved by other shoppers: {names}.')
+            return redirect('view_cart')
     
-    total = cart.get_total_price()
-    discount_amount = Decimal('0.00')
-    discounted_total = total
-    
-    if is_promotion and card:
-        discount_amount = total * Decimal('0.05')
-        discounted_total = total - discount_amount
+    total = summary.subtotal
+    discount_amount = summary.discount
+    discounted_total = summary.total
 
     # Calculate default payment method
     default_method = form['payment_method'].value()
 
     context = {
         'cart': cart,
-        'items': items,
+        'summary': summary,
+        'items': summary.lines,
         'form': form,
         'title': 'Cart Checkout',
         'is_cart_checkout': True,
@@ -161,6 +194,7 @@ def checkout_cart(request):
         'total': total,
         'discount_amount': discount_amount,
         'discounted_total': discounted_total,
+        'discounted_unit_price': discounted_total,
         'default_method': default_method
     }
     return render(request, 'orders/checkout.html', context)
@@ -192,12 +226,9 @@ def checkout(request, product_id):
                     # Calculate total
                     total = product.price * quantity
 
-                    # Apply 5% discount for Sokohub Card holders on Promotion Days
-                    is_promotion = PromotionDay.objects.filter(date=timezone.now().date()).exists()
+                    # Sokohub Card holders get the promotion day discount
+                    total = total * (1 - get_promotion_discount_rate(request.user))
                     has_card = SokohubCard.objects.filter(user=request.user, status='approved', is_active=True).exists()
-                    
-                    if is_promotion and has_card:
-                        total = total * Decimal('0.95')
 
                     # Handle Virtual Card payment deduction
                     payment_method = form.cleaned_data['payment_method']
@@ -240,12 +271,13 @@ def checkout(request, product_id):
                         price=product.price
                     )
 
-                    # Update product stock
-                    product.stock -= quantity
-                    product.save()
+                    # Update product stock; other shoppers' promotion holds are respected
+                    if not Product.objects.decrement_stock({product.id: quantity}, holder=request.user):
+                        raise OutOfStock()
+                    StockReservation.release(request.user, [product.id])
 
                     # Create notification for vendor
-                    Notification.objects.create(
+                    notify(
                         user=product.vendor,
                         title="New Order Received",
                         message=f"You have a new order (# {order.id}) for {quantity}x {product.name}.",
@@ -256,6 +288,9 @@ def checkout(request, product_id):
                     messages.success(request, f'Order placed successfully! Your order number is #{order.id}')
                     return redirect('order_confirmation', order_id=order.id)
 
+            except OutOfStock:
+                messages.error(request, 'Sorry, this product just sold out or is reserved by other shoppers.')
+                return redirect('product_detail', product_id=product_id)
             except Exception as e:
                 messages.error(request, f'Error placing order: {str(e)}')
 
@@ -270,15 +305,17 @@ def checkout(request, product_id):
 
     is_promotion = PromotionDay.objects.filter(date=timezone.now().date()).exists()
     card = SokohubCard.objects.filter(user=request.user, status='approved', is_active=True).first()
+
+    # On promotion days hold one unit while the customer completes checkout
+    if is_promotion and request.method == 'GET':
+        if StockReservation.hold(request.user, {product.id: 1}):
+            messages.error(request, 'Sorry, this product is currently reserved by other shoppers. Please try again in a few minutes.')
+            return redirect('product_detail', product_id=product_id)
     
     # We use initial quantity 1 for display
     unit_price = product.price
-    discount_amount = Decimal('0.00')
-    discounted_unit_price = unit_price
-    
-    if is_promotion and card:
-        discount_amount = unit_price * Decimal('0.05')
-        discounted_unit_price = unit_price - discount_amount
+    discount_amount = unit_price * get_promotion_discount_rate(request.user)
+    discounted_unit_price = unit_price - discount_amount
 
     # Calculate default payment method
     default_method = form['payment_method'].value()
@@ -313,11 +350,21 @@ def order_confirmation(request, order_id):
 @customer_required
 def customer_orders(request):
     """
-    Display all orders for the logged-in customer
+    Display the logged-in customer's order history, one keyset page at a time.
+    Only a summary of each order is loaded; items are shown on order_detail.
     """
-    orders = Order.objects.filter(customer=request.user).prefetch_related('items', 'items__product')
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by()
+    orders = Order.objects.filter(customer=request.user).only(
+        'id', 'status', 'total', 'created_at', 'delivery_address', 'payment_method', 'payment_status'
+    ).annotate(
+        item_count=Subquery(items.values('order').annotate(total=Count('id')).values('total')),
+        first_item_name=Subquery(items.order_by('id').values('product__name')[:1]),
+    )
+    page = KeysetPaginator(orders, ('-created_at', '-id'), per_page=CUSTOMER_ORDERS_PER_PAGE).get_page(
+        request.GET.get('cursor')
+    )
     context = {
-        'orders': orders,
+        'orders': page,
         'title': 'My Orders'
     }
     return render(request, 'orders/customer_orders.html', context)
@@ -327,38 +374,105 @@ def order_detail(request, order_id):
     """
     Display detailed view of a specific order
     """
-    order = get_object_or_404(Order, id=order_id, customer=request.user)
+    order = get_object_or_404(
+        Order.objects.prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product__vendor'))
+        ),
+        id=order_id, customer=request.user
+    )
     context = {
         'order': order,
         'title': f'Order #{order.id}'
     }
     return render(request, 'orders/order_detail.html', context)
 
-@customer_required
-def customer_orders(request):
-    """Customer's order history"""
-    orders = Order.objects.filter(customer=request.user).order_by('-created_at')
-    return render(request, 'orders/customer_orders.html', {'orders': orders})
-
 @vendor_required
 def vendor_orders(request):
-    """Vendor's order management page"""
-    # Get all orders for this vendor
-    orders = Order.objects.filter(
-        vendor=request.user
-    ).prefetch_related('items', 'items__product').order_by('-created_at')
-    
-    # Count pending orders for notifications
-    pending_count = orders.filter(status='pending').count()
-    
+    """Vendor's order queue: filtered, newest first, one keyset page at a time"""
+    vendor_orders_qs = Order.objects.filter(vendor=request.user)
+
+    # All status counts in one grouped query on the (vendor, status, created_at) index
+    status_counts = dict(
+        vendor_orders_qs.order_by().values_list('status').annotate(total=Count('id'))
+    )
+
+    orders = vendor_orders_qs
+    status = request.GET.get('status', '')
+    if status in dict(Order.STATUS_CHOICES):
+        orders = orders.filter(status=status)
+    else:
+        status = ''
+
+    # Plain created_at ranges (not __date) so the index can be used
+    date_from = _parse_day(request.GET.get('from'))
+    date_to = _parse_day(request.GET.get('to'))
+    if date_from:
+        orders = orders.filter(created_at__gte=_start_of_day(date_from))
+    if date_to:
+        orders = orders.filter(created_at__lt=_start_of_day(date_to + timedelta(days=1)))
+
+    orders = orders.select_related('customer')
+    page = KeysetPaginator(orders, ('-created_at', '-id'), per_page=VENDOR_ORDERS_PER_PAGE).get_page(
+        request.GET.get('cursor')
+    )
+
     context = {
-        'orders': orders,
-        'pending_count': pending_count,
+        'orders': page,
+        'status_counts': [
+            (value, label, status_counts.get(value, 0)) for value, label in Order.STATUS_CHOICES
+        ],
+        'total_orders': sum(status_counts.values()),
+        'pending_count': status_counts.get('pending', 0),
+        'status': status,
+        'date_from': date_from,
+        'date_to': date_to,
         'title': 'Vendor Orders'
     }
     return render(request, 'orders/vendor_orders.html', context)
 
+
+def _analytics_days(request):
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    return days if days in ANALYTICS_PERIODS else 30
+
+
+@vendor_required
+def vendor_analytics(request):
+    """Vendor sales report, served from the daily rollups"""
+    report = sales_series(request.user, _analytics_days(request))
+    context = {
+        'report': report,
+        'periods': ANALYTICS_PERIODS,
+        'title': 'Sales Analytics'
+    }
+    return render(request, 'orders/vendor_analytics.html', context)
+
+
+@vendor_required
+def vendor_analytics_data(request):
+    """JSON version of the sales report for charts"""
+    report = sales_series(request.user, _analytics_days(request))
+    return JsonResponse({
+        'days': report['days'],
+        'series': [
+            {'day': point['day'].isoformat(), 'units': point['units'],
+             'revenue': str(point['revenue']), 'orders': point['orders']}
+            for point in report['series']
+        ],
+        'totals': {**report['totals'], 'revenue': str(report['totals']['revenue'])},
+        'top_products': [
+            {'id': row['product'], 'name': row['product__name'],
+             'units': row['units'], 'revenue': str(row['revenue'])}
+            for row in report['top_products']
+        ],
+    })
+
+
 @vendor_required
+@transaction.atomic
 def approve_order(request, order_id):
     """Vendor approves an order"""
     order = get_object_or_404(Order, id=order_id, vendor=request.user)
@@ -377,7 +491,7 @@ def approve_order(request, order_id):
         )
 
         # Create notification for customer
-        Notification.objects.create(
+        notify(
             user=order.customer,
             title="Order Approved",
             message=f"Your order #{order.id} has been approved by the vendor. You can now download your receipt.",
@@ -391,11 +505,6 @@ def approve_order(request, order_id):
         receipt_no = f"REC-{order.id}-{get_random_string(5).upper()}"
         Receipt.objects.get_or_create(order=order, defaults={'receipt_number': receipt_no})
         
-        print(f"=== ORDER APPROVED ===")
-        print(f"Order: #{order.id}")
-        print(f"Vendor: {request.user.username}")
-        print(f"Customer: {order.customer.username}")
-        
     else:
         messages.error(request, "This order cannot be approved. Ensure it has been paid first.")
     
@@ -404,6 +513,7 @@ def approve_order(request, order_id):
 
 
 @vendor_required
+@transaction.atomic
 def cancel_order(request, order_id):
     """Vendor cancels an order"""
     order = get_object_or_404(Order, id=order_id, vendor=request.user)
@@ -427,7 +537,7 @@ def cancel_order(request, order_id):
                 user_card.save()
 
                 # Add a refund notification for customer
-                Notification.objects.create(
+                notify(
                     user=order.customer,
                     title="Order Refunded",
                     message=f"Your payment of ${order.total} for order #{order.id} has been refunded to your Sokohub Card.",
@@ -440,7 +550,7 @@ def cancel_order(request, order_id):
         messages.success(request, f"Order #{order.id} has been cancelled.")
 
         # Create notification for customer
-        Notification.objects.create(
+        notify(
             user=order.customer,
             title="Order Cancelled",
             message=f"Your order #{order.id} has been cancelled by the vendor.",
@@ -453,6 +563,7 @@ def cancel_order(request, order_id):
     return redirect('vendor_orders')
 
 @customer_required
+@transaction.atomic
 def pay_order(request, order_id):
     """
     Simulate payment for an order
@@ -467,7 +578,7 @@ def pay_order(request, order_id):
         order.save()
         
         # Notify vendor
-        Notification.objects.create(
+        notify(
             user=order.vendor,
             title="Order Paid",
             message=f"Order #{order.id} has been paid. Click to review and approve.",
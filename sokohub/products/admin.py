@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Product, Category, PromotionDay
+from .models import (
+    Blob, Product, Category, GalleryUpload, PromotionDay, RemoteImage, StockReservation, ThumbnailJob, VendorStats
+)
 
 @admin.register(PromotionDay)
 class PromotionDayAdmin(admin.ModelAdmin):
@@ -7,9 +9,50 @@ class PromotionDayAdmin(admin.ModelAdmin):
     list_filter = ('date',)
     search_fields = ('description',)
 
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'customer', 'quantity', 'created_at', 'expires_at')
+    list_filter = ('expires_at',)
+    search_fields = ('product__name', 'customer__username')
+    raw_id_fields = ('product', 'customer')
+
+@admin.register(VendorStats)
+class VendorStatsAdmin(admin.ModelAdmin):
+    list_display = ('vendor', 'total_products', 'active_products', 'out_of_stock_products',
+                    'inventory_value', 'open_orders', 'revenue', 'updated_at')
+    search_fields = ('vendor__username',)
+    raw_id_fields = ('vendor',)
+
+@admin.register(ThumbnailJob)
+class ThumbnailJobAdmin(admin.ModelAdmin):
+    list_display = ('model', 'object_id', 'field', 'source', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('model', 'attempts')
+    readonly_fields = ('last_error', 'created_at')
+
+@admin.register(GalleryUpload)
+class GalleryUploadAdmin(admin.ModelAdmin):
+    list_display = ('original_name', 'product', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    raw_id_fields = ('product', 'image')
+    readonly_fields = ('error', 'created_at', 'processed_at')
+
+@admin.register(RemoteImage)
+class RemoteImageAdmin(admin.ModelAdmin):
+    list_display = ('url', 'name', 'fetched_at', 'next_fetch_at', 'attempts')
+    list_filter = ('attempts',)
+    search_fields = ('url',)
+    readonly_fields = ('content_hash', 'etag', 'last_modified', 'last_error', 'created_at')
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'ref_count', 'updated_at')
+    list_filter = ('ref_count',)
+    search_fields = ('name',)
+    readonly_fields = ('name', 'ref_count', 'updated_at')
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug', 'created_at')
+    list_display = ('name', 'slug', 'active_product_count', 'created_at')
     search_fields = ('name',)
     prepopulated_fields = {'slug': ('name',)}
 
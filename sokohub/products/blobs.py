@@ -0,0 +1,109 @@
+"""
+Reference counting and garbage collection for content-addressed media.
+
+Blob rows count the rows referring to each file under cas/ (kept by
+products.signals for the BLOB_FIELDS below). `collect()` deletes the files,
+and their thumbnails, of blobs that have had no references for
+MEDIA_GC_GRACE_HOURS, plus files under cas/ that no Blob knows about, such
+as uploads whose request failed before the row was saved. `recount()`
+rebuilds the counts from the tables if they may have drifted.
+"""
+import posixpath
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Blob, Product, ProductImage, RemoteImage
+from .storage import CAS_DIR, content_addressed_storage
+from .thumbnails import RENDITIONS_DIR
+
+MEDIA_GC_GRACE = timedelta(hours=getattr(settings, 'MEDIA_GC_GRACE_HOURS', 24))
+
+# Fields holding content-addressed file names. Product.remote_image is not
+# listed: it mirrors RemoteImage.name, which holds the reference.
+BLOB_FIELDS = {
+    Product: ('image',),
+    ProductImage: ('image',),
+    RemoteImage: ('name',),
+}
+
+
+def recount():
+    """Recompute every reference count from the tables. Returns the number of referenced blobs."""
+    counts = Counter()
+    for model, fields in BLOB_FIELDS.items():
+        for field in fields:
+            names = model._default_manager.filter(**{f'{field}__startswith': CAS_DIR + '/'})
+            counts.update(names.values_list(field, flat=True).iterator())
+
+    by_count = {}
+    for name, count in counts.items():
+        by_count.setdefault(count, []).append(name)
+    with transaction.atomic():
+        Blob.objects.bulk_create([Blob(name=name) for name in counts], ignore_conflicts=True, batch_size=500)
+        # Blobs that lose their last reference start their grace period now
+        Blob.objects.filter(ref_count__gt=0).update(ref_count=0, updated_at=timezone.now())
+        for count, names in by_count.items():
+            for start in range(0, len(names), 500):
+                Blob.objects.filter(name__in=names[start:start + 500]).update(ref_count=count)
+    return len(counts)
+
+
+def _delete_files(name, storage=content_addressed_storage):
+    storage.delete(name)
+    renditions = posixpath.join(RENDITIONS_DIR, posixpath.splitext(name)[0])
+    if storage.exists(renditions):
+        for filename in storage.listdir(renditions)[1]:
+            storage.delete(posixpath.join(renditions, filename))
+
+
+def unreferenced(grace=MEDIA_GC_GRACE):
+    return Blob.objects.filter(ref_count__lte=0, updated_at__lt=timezone.now() - grace)
+
+
+def collect(grace=MEDIA_GC_GRACE, batch_size=500):
+    """Delete unreferenced blobs and untracked files. Returns (blobs, untracked files) deleted."""
+    blobs = 0
+    while True:
+        with transaction.atomic():
+            # The row lock and the ref_count filter keep blobs that just gained a reference
+            names = list(
+                unreferenced(grace).select_for_update(skip_locked=True)
+                .order_by('updated_at').values_list('name', flat=True)[:batch_size]
+            )
+            Blob.objects.filter(name__in=names, ref_count__lte=0).delete()
+        if not names:
+            break
+        # An upload of the same bytes since the delete re-created the row; keep its file
+        revived = set(Blob.objects.filter(name__in=names).values_list('name', flat=True))
+        for name in names:
+            if name not in revived:
+                _delete_files(name)
+        blobs += len(names)
+
+    return blobs, _collect_untracked(timezone.now() - grace, batch_size)
+
+
+def untracked_files(cutoff, batch_size=500, storage=content_addressed_storage):
+    """Yield files under cas/ older than `cutoff` that have no Blob row."""
+    if not storage.exists(CAS_DIR):
+        return
+    for directory in storage.listdir(CAS_DIR)[0]:
+        directory = posixpath.join(CAS_DIR, directory)
+        files = [posixpath.join(directory, filename) for filename in storage.listdir(directory)[1]]
+        for start in range(0, len(files), batch_size):
+            chunk = files[start:start + batch_size]
+            known = set(Blob.objects.filter(name__in=chunk).values_list('name', flat=True))
+            for name in chunk:
+                if name not in known and storage.get_modified_time(name) < cutoff:
+                    yield name
+
+
+def _collect_untracked(cutoff, batch_size):
+    deleted = 0
+    for name in list(untracked_files(cutoff, batch_size)):
+        _delete_files(name)
+        deleted += 1
+    return deleted
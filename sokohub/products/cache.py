@@ -0,0 +1,116 @@
+"""
+Catalog caches: the blocks shown on the home page and whole public pages
+rendered for anonymous visitors (products.middleware).
+
+Keys embed a catalog version number. Product, ProductImage and Category
+writes bump the version (see products.signals), which makes every previously
+cached block and page unreachable at once instead of deleting keys one by one.
+"""
+import hashlib
+import re
+import time
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import translation
+
+HOME_CACHE_TIMEOUT = getattr(settings, 'HOME_CACHE_TIMEOUT', 60 * 15)
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 5)
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Query parameters that never change what a page shows
+IGNORED_PARAMS = {'fbclid', 'gclid'}
+IGNORED_PARAM_PREFIXES = ('utm_',)
+# Rendered by {% csrf_token %}; every visitor gets their own token back
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed with a timestamp so an evicted counter never reuses an old version
+        cache.add(CATALOG_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATALOG_VERSION_KEY, 0)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, int(time.time()), None)
+
+
+def _block_key(name, version, language):
+    return f'home:{name}:{language or settings.LANGUAGE_CODE}:v{version}'
+
+
+def get_home_blocks(builders):
+    """
+    Return the home page blocks, building and caching the missing ones.
+
+    `builders` maps a block name to a callable returning a picklable value
+    (evaluate querysets into lists before returning them).
+    """
+    version = get_catalog_version()
+    language = translation.get_language()
+    keys = {name: _block_key(name, version, language) for name in builders}
+
+    cached = cache.get_many(keys.values())
+    blocks, missing = {}, {}
+    for name, key in keys.items():
+        if key in cached:
+            blocks[name] = cached[key]
+        else:
+            blocks[name] = missing[key] = builders[name]()
+
+    if missing:
+        cache.set_many(missing, HOME_CACHE_TIMEOUT)
+    return blocks
+
+
+def cache_anonymous_page(view):
+    """Let AnonymousPageCacheMiddleware serve `view` to anonymous visitors from the cache."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return view(*args, **kwargs)
+    wrapper.anonymous_page_cache = True
+    return wrapper
+
+
+def _normalized_query(query_string):
+    params = [
+        (name, value) for name, value in parse_qsl(query_string)
+        if value and name not in IGNORED_PARAMS and not name.startswith(IGNORED_PARAM_PREFIXES)
+    ]
+    return urlencode(sorted(params))
+
+
+def page_key(request):
+    """Cache key of the page `request` asks for, in the active language and catalog version."""
+    url = f'{request.scheme}://{request.get_host()}{request.path}?{_normalized_query(request.META.get("QUERY_STRING", ""))}'
+    digest = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+    language = translation.get_language() or settings.LANGUAGE_CODE
+    return f'page:{language}:v{get_catalog_version()}:{digest}'
+
+
+def store_page(key, response):
+    headers = [(name, value) for name, value in response.items() if name.lower() != 'set-cookie']
+    cache.set(key, (response.status_code, headers, response.content), PAGE_CACHE_TIMEOUT)
+
+
+def cached_page(request, key):
+    """Rebuild the cached response for `key`, or return None."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    status, headers, content = entry
+    content = CSRF_INPUT_RE.sub(lambda match: match[1] + get_token(request) + match[2], content.decode())
+    response = HttpResponse(content, status=status)
+    for name, value in headers:
+        response[name] = value
+    return response
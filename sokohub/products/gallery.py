@@ -0,0 +1,211 @@
+"""
+Off-request processing of product gallery uploads.
+
+add_product/edit_product only copy the uploaded files into the staging area
+(in chunks, or by moving Django's temporary upload file) and register them
+with a single bulk_create. The `process_gallery_uploads` worker claims the
+pending uploads and hands the decoding to a process pool, which validates
+each image, applies its EXIF orientation and re-encodes it without the
+metadata (camera details, GPS position). Clean images become ProductImage
+rows, which in turn queue their thumbnails; rejected ones are marked failed
+with a reason the edit page shows while it polls `upload_status()`.
+"""
+import logging
+import posixpath
+import uuid
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .models import GalleryUpload, ProductImage
+from .thumbnails import _has_alpha
+
+logger = logging.getLogger(__name__)
+
+GALLERY_MAX_UPLOAD_SIZE = getattr(settings, 'GALLERY_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+GALLERY_MAX_PIXELS = getattr(settings, 'GALLERY_MAX_PIXELS', 40_000_000)
+# Longest side kept after re-encoding; larger images are scaled down
+GALLERY_MAX_DIMENSION = getattr(settings, 'GALLERY_MAX_DIMENSION', 2400)
+GALLERY_BATCH_SIZE = getattr(settings, 'GALLERY_BATCH_SIZE', 20)
+GALLERY_PROCESSES = getattr(settings, 'GALLERY_PROCESSES', 2)
+GALLERY_MAX_ATTEMPTS = getattr(settings, 'GALLERY_MAX_ATTEMPTS', 3)
+# Finished uploads are kept this long so the edit page can report on them
+GALLERY_UPLOAD_RETENTION = timedelta(days=1)
+
+STAGING_DIR = 'staging/gallery'
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+CLAIM_TIMEOUT = timedelta(minutes=5)
+RETRY_DELAY = 60
+
+
+class InvalidImage(Exception):
+    """The upload is not an image we accept; retrying will not help."""
+
+
+def stage_uploads(product, files):
+    """
+    Copy uploaded files to the staging area and queue them for processing.
+    Returns (uploads, rejected) where rejected is a list of (name, reason).
+    """
+    uploads, rejected = [], []
+    for upload in files:
+        if upload.size > GALLERY_MAX_UPLOAD_SIZE:
+            rejected.append((upload.name, f"larger than {filesizeformat(GALLERY_MAX_UPLOAD_SIZE)}"))
+            continue
+        # The worker decides the real format, so the client's file name is not reused
+        staged_name = default_storage.save(posixpath.join(STAGING_DIR, uuid.uuid4().hex), upload)
+        uploads.append(GalleryUpload(product=product, staged_name=staged_name, original_name=upload.name[:255]))
+    GalleryUpload.objects.bulk_create(uploads)
+    return uploads, rejected
+
+
+def reencode(data):
+    """
+    Validate raw upload bytes and re-encode them without metadata.
+    Returns (bytes, extension). Runs inside the worker's process pool.
+    """
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise InvalidImage(f"unsupported image type ({image.format or 'unknown'})")
+            if image.width * image.height > GALLERY_MAX_PIXELS:
+                raise InvalidImage(f"image is too large ({image.width}x{image.height})")
+            # A CMYK profile would not match the RGB output
+            icc_profile = image.info.get('icc_profile') if image.mode != 'CMYK' else None
+            image = ImageOps.exif_transpose(image)
+    except InvalidImage:
+        raise
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImage("not a valid image") from e
+
+    image.thumbnail((GALLERY_MAX_DIMENSION, GALLERY_MAX_DIMENSION), Image.LANCZOS)
+    output = BytesIO()
+    # Only the colour profile is carried over; EXIF and text chunks are dropped
+    if _has_alpha(image):
+        image.convert('RGBA').save(output, 'PNG', optimize=True, icc_profile=icc_profile)
+        return output.getvalue(), '.png'
+    image.convert('RGB').save(output, 'JPEG', quality=88, optimize=True, progressive=True, icc_profile=icc_profile)
+    return output.getvalue(), '.jpg'
+
+
+def pending():
+    """Uploads that will still be attempted."""
+    return GalleryUpload.objects.filter(status='pending', attempts__lt=GALLERY_MAX_ATTEMPTS)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            pending().filter(next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            # Hide the batch from other workers while the pool works on it
+            GalleryUpload.objects.filter(pk__in=[upload.pk for upload in batch]).update(
+                next_attempt_at=now + CLAIM_TIMEOUT
+            )
+    return batch
+
+
+def _fail(upload, reason):
+    GalleryUpload.objects.filter(pk=upload.pk).update(
+        status='failed', error=reason[:255], processed_at=timezone.now()
+    )
+    default_storage.delete(upload.staged_name)
+
+
+def _retry_later(upload, error):
+    upload.attempts += 1
+    upload.next_attempt_at = timezone.now() + timedelta(seconds=RETRY_DELAY * 2 ** (upload.attempts - 1))
+    if upload.attempts >= GALLERY_MAX_ATTEMPTS:
+        logger.error("Giving up on gallery upload %s: %s", upload.pk, error)
+        _fail(upload, "could not be processed")
+        return
+    upload.save(update_fields=['attempts', 'next_attempt_at'])
+
+
+def _store(upload, data, extension):
+    """Turn re-encoded bytes into a ProductImage. Returns False if the product is gone."""
+    stem = posixpath.splitext(posixpath.basename(upload.original_name))[0] or 'image'
+    with transaction.atomic():
+        if not GalleryUpload.objects.select_for_update().filter(pk=upload.pk).exists():
+            # The product was deleted while we worked
+            return False
+        image = ProductImage(product_id=upload.product_id)
+        image.image.save(stem + extension, ContentFile(data), save=False)
+        image.save()
+        GalleryUpload.objects.filter(pk=upload.pk).update(
+            status='done', image=image, error='', processed_at=timezone.now()
+        )
+    return True
+
+
+def process_uploads(batch_size=GALLERY_BATCH_SIZE, executor=None):
+    """
+    Process one batch of staged uploads, decoding them in `executor` (a
+    concurrent.futures executor) or inline when none is given. Returns
+    (done, failed) so callers can loop until nothing is left.
+    """
+    batch = _claim(batch_size)
+    done = failed = 0
+    jobs = []
+    for upload in batch:
+        try:
+            with default_storage.open(upload.staged_name) as file:
+                data = file.read()
+        except FileNotFoundError:
+            _fail(upload, "the upload was lost, please add it again")
+            failed += 1
+            continue
+        jobs.append((upload, executor.submit(reencode, data) if executor else data))
+
+    for upload, job in jobs:
+        try:
+            data, extension = job.result() if executor else reencode(job)
+            stored = _store(upload, data, extension)
+        except InvalidImage as e:
+            _fail(upload, str(e))
+            failed += 1
+            continue
+        except Exception as e:
+            logger.warning("Failed to process gallery upload %s: %s", upload.pk, e)
+            _retry_later(upload, e)
+            failed += 1
+            continue
+        default_storage.delete(upload.staged_name)
+        done += stored
+    return done, failed
+
+
+def purge_finished():
+    """Delete finished upload records past the retention period."""
+    cutoff = timezone.now() - GALLERY_UPLOAD_RETENTION
+    deleted, _ = GalleryUpload.objects.filter(status__in=['done', 'failed'], processed_at__lt=cutoff).delete()
+    return deleted
+
+
+def upload_status(product, ids=None):
+    """
+    Describe the product's uploads for the edit page: the given `ids`, or
+    the ones still pending or failed.
+    """
+    uploads = product.gallery_uploads.select_related('image').order_by('id')
+    uploads = uploads.filter(pk__in=ids) if ids is not None else uploads.filter(status__in=['pending', 'failed'])
+    return [
+        {
+            'id': upload.pk,
+            'name': upload.original_name,
+            'status': upload.status,
+            'error': upload.error,
+            'image_url': upload.image.image.url if upload.image else None,
+        }
+        for upload in uploads
+    ]
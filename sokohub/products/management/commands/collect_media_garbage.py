@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from products.blobs import MEDIA_GC_GRACE, collect, recount, unreferenced, untracked_files
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed media files that no product or gallery image refers to."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=MEDIA_GC_GRACE.total_seconds() / 3600,
+                            help="Only delete files unreferenced for at least this long.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--recount', action='store_true',
+                            help="First rebuild the reference counts from the database.")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted.")
+        parser.add_argument('--loop', action='store_true', help="Keep collecting instead of exiting after one pass.")
+        parser.add_argument('--sleep', type=float, default=3600.0, help="Seconds to wait between passes in --loop mode.")
+
+    def handle(self, *args, **options):
+        grace = timedelta(hours=options['grace_hours'])
+        if options['recount']:
+            self.stdout.write(f"Recounted references to {recount()} files.")
+
+        if options['dry_run']:
+            blobs = unreferenced(grace).count()
+            untracked = sum(1 for _ in untracked_files(timezone.now() - grace, options['batch_size']))
+            self.stdout.write(f"Would delete {blobs} unreferenced and {untracked} untracked files.")
+            return
+
+        while True:
+            blobs, untracked = collect(grace, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {blobs} unreferenced and {untracked} untracked files."))
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
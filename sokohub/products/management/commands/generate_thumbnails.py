@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from products.thumbnails import THUMBNAIL_BATCH_SIZE, generate_thumbnails, queue_missing
+
+
+class Command(BaseCommand):
+    help = "Build the resized WebP/JPEG renditions of uploaded product, category and profile images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=THUMBNAIL_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the queue is empty.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait between polls in --loop mode.")
+        parser.add_argument('--backfill', action='store_true',
+                            help="First queue every stored image that has no up-to-date renditions.")
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.stdout.write(f"Queued {queue_missing()} images.")
+
+        total_done = total_failed = 0
+        while True:
+            done, failed = generate_thumbnails(batch_size=options['batch_size'])
+            total_done += done
+            total_failed += failed
+            if done or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Generated renditions for {total_done} images, {total_failed} failed."))
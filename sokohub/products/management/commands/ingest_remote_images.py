@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from products.remote_images import REMOTE_IMAGE_BATCH_SIZE, ingest, register_missing
+
+
+class Command(BaseCommand):
+    help = "Download and refresh local copies of external product image URLs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REMOTE_IMAGE_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when nothing is due.")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Seconds to wait between polls in --loop mode.")
+        parser.add_argument('--backfill', action='store_true',
+                            help="First register product image URLs saved before ingestion existed.")
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.stdout.write(f"Registered {register_missing()} image URLs.")
+
+        total_fetched = total_failed = 0
+        while True:
+            fetched, failed = ingest(batch_size=options['batch_size'])
+            total_fetched += fetched
+            total_failed += failed
+            if fetched or failed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Fetched {total_fetched} remote images, {total_failed} failed."))
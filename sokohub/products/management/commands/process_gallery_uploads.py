@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from products.gallery import GALLERY_BATCH_SIZE, GALLERY_PROCESSES, process_uploads, purge_finished
+
+
+class Command(BaseCommand):
+    help = "Validate, re-encode and attach staged product gallery uploads using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=GALLERY_BATCH_SIZE)
+        parser.add_argument('--processes', type=int, default=GALLERY_PROCESSES,
+                            help="Image decoding processes; 0 decodes in this process.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when the queue is empty.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait between polls in --loop mode.")
+
+    def handle(self, *args, **options):
+        executor = None
+        if options['processes'] > 0:
+            # Pool processes unpickle products.gallery functions, which needs the app registry
+            executor = ProcessPoolExecutor(max_workers=options['processes'], initializer=django.setup)
+
+        total_done = total_failed = 0
+        try:
+            while True:
+                done, failed = process_uploads(batch_size=options['batch_size'], executor=executor)
+                total_done += done
+                total_failed += failed
+                if done or failed:
+                    continue
+                purge_finished()
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {total_done} gallery images, {total_failed} failed."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from products import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text product search index from the products table."
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError(f"Full-text search is not supported on '{connection.vendor}'.")
+
+        with transaction.atomic():
+            search.create_index()
+            count = search.rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
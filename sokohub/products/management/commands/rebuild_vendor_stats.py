@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.models import VendorStats
+
+
+class Command(BaseCommand):
+    help = "Recompute every vendor's dashboard stats from products and orders."
+
+    def handle(self, *args, **options):
+        rebuilt = VendorStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {rebuilt} vendors."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized active product count of every category."
+
+    def handle(self, *args, **options):
+        updated = Category.reconcile_product_counts()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {updated} categories."))
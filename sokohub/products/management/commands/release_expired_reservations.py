@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from products.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = "Delete expired stock reservations. Run it periodically (e.g. every minute via cron) or with --loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="Keep running instead of exiting after one pass.")
+        parser.add_argument('--sleep', type=float, default=60.0, help="Seconds to wait between passes in --loop mode.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            total += StockReservation.purge_expired(batch_size=options['batch_size'])
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"Released {total} expired reservations."))
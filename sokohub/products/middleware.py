@@ -0,0 +1,48 @@
+"""
+Full-page cache for anonymous visitors.
+
+Views decorated with products.cache.cache_anonymous_page are served from
+the cache to visitors without a session or messages cookie: they are not
+logged in, their guest cart is empty and no flash message is waiting, so
+they all see the same page for a given URL and language. A hit never opens
+the session or touches the database. The middleware sits last so every
+other middleware has set up the request (language, CSRF cookie) before the
+lookup, and so responses are stored before the session, messages and CSRF
+cookies are added on the way out.
+"""
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from .cache import cached_page, page_key, store_page
+
+
+class AnonymousPageCacheMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        key = getattr(request, '_page_cache_key', None)
+        if key and self._cacheable(request, response):
+            store_page(key, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(view_func, 'anonymous_page_cache', False) or request.method not in ('GET', 'HEAD'):
+            return None
+        cookies = request.COOKIES
+        if settings.SESSION_COOKIE_NAME in cookies or CookieStorage.cookie_name in cookies:
+            return None
+        request._page_cache_key = page_key(request)
+        return cached_page(request, request._page_cache_key)
+
+    def _cacheable(self, request, response):
+        if response.status_code != 200 or response.streaming or response.cookies:
+            return False
+        cache_control = response.get('Cache-Control', '')
+        if 'private' in cache_control or 'no-store' in cache_control:
+            return False
+        # The view logged someone in, filled the guest cart or queued a message
+        # (len() does not mark the messages as displayed)
+        return not request.session.modified and not len(messages.get_messages(request))
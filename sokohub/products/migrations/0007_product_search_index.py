@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from products import search
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    search.create_index(schema_editor)
+    search.rebuild_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from products import search
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_promotionday'),
+        ('accounts', '0009_sokohubcard_balance'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 17:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_active_product_count(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    active_count = Product.objects.filter(
+        category=OuterRef('pk'), status='active'
+    ).order_by().values('category').annotate(total=Count('id')).values('total')
+    Category.objects.update(active_product_count=Coalesce(Subquery(active_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='active_product_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(populate_active_product_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Q, Sum
+
+
+def populate_vendor_stats(apps, schema_editor):
+    VendorStats = apps.get_model('products', 'VendorStats')
+    Product = apps.get_model('products', 'Product')
+    Order = apps.get_model('orders', 'Order')
+    stats = {}
+    for row in Product.objects.order_by().values('vendor').annotate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        inactive=Count('id', filter=Q(status='inactive')),
+        out_of_stock=Count('id', filter=Q(status='out_of_stock')),
+        value=Sum(F('price') * F('stock'), filter=Q(status='active'),
+                  output_field=DecimalField(max_digits=14, decimal_places=2)),
+    ):
+        stats[row['vendor']] = VendorStats(
+            vendor_id=row['vendor'], total_products=row['total'], active_products=row['active'],
+            inactive_products=row['inactive'], out_of_stock_products=row['out_of_stock'],
+            inventory_value=row['value'] or 0,
+        )
+    for row in Order.objects.filter(vendor__isnull=False).order_by().values('vendor').annotate(
+        open=Count('id', filter=Q(status__in=('pending', 'paid', 'approved', 'shipped'))),
+        revenue=Sum('total', filter=Q(payment_status='paid') & ~Q(status='cancelled')),
+    ):
+        vendor_stats = stats.setdefault(row['vendor'], VendorStats(vendor_id=row['vendor']))
+        vendor_stats.open_orders = row['open']
+        vendor_stats.revenue = row['revenue'] or 0
+    VendorStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_user_login_lookup_indexes'),
+        ('orders', '0004_receipt'),
+        ('products', '0009_stockreservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorStats',
+            fields=[
+                ('vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vendor_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_products', models.PositiveIntegerField(default=0)),
+                ('active_products', models.PositiveIntegerField(default=0)),
+                ('inactive_products', models.PositiveIntegerField(default=0)),
+                ('out_of_stock_products', models.PositiveIntegerField(default=0)),
+                ('inventory_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('open_orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Vendor Stats',
+                'verbose_name_plural': 'Vendor Stats',
+            },
+        ),
+        migrations.RunPython(populate_vendor_stats, migrations.RunPython.noop),
+    ]
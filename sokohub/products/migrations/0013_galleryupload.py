@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GalleryUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('staged_name', models.CharField(help_text='Storage name of the staged upload', max_length=255)),
+                ('original_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('image', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='products.productimage')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gallery_uploads', to='products.product')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='gallery_upload_due'), models.Index(fields=['product', 'status'], name='gallery_upload_product')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:19
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_galleryupload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemoteImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, unique=True)),
+                ('name', models.CharField(blank=True, help_text='Storage name of the current copy', max_length=255)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.CharField(blank=True, max_length=64)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+                ('next_fetch_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0, help_text='Consecutive failed fetches')),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='remote_image',
+            field=models.ImageField(blank=True, default='', editable=False, upload_to='remote/'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='remote_image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('image_url__gt', '')), fields=['image_url'], name='product_image_url'),
+        ),
+        migrations.AddIndex(
+            model_name='remoteimage',
+            index=models.Index(fields=['next_fetch_at'], name='remote_image_due'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 18:22
+
+import products.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_remote_images'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, default='products/default_product.png', null=True, storage=products.storage.get_content_addressed_storage, upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='remote_image',
+            field=models.ImageField(blank=True, default='', editable=False, storage=products.storage.get_content_addressed_storage, upload_to='remote/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=products.storage.get_content_addressed_storage, upload_to='products/gallery/'),
+        ),
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('ref_count__lte', 0)), fields=['updated_at'], name='blob_unreferenced')],
+            },
+        ),
+    ]
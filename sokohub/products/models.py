@@ -1,15 +1,26 @@
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models.signals import post_init
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
 from django.conf import settings
 from django.core.validators import URLValidator, MinValueValidator
 from django.urls import reverse
 import uuid
+from decimal import Decimal
 from django.utils.text import slugify
+from django.utils import timezone
+from .storage import get_content_addressed_storage
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(unique=True, blank=True)
     icon = models.CharField(max_length=50, help_text="Font Awesome class, e.g., fas fa-laptop", blank=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    # Resized copies of `image`, written by the generate_thumbnails worker
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # Denormalized number of active products, maintained by products.signals
+    active_product_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -26,6 +37,106 @@ class Category(models.Model):
     def get_absolute_url(self):
         return reverse('product_list_by_category', args=[self.slug])
 
+    @classmethod
+    def reconcile_product_counts(cls):
+        """Recompute every category's active product count in one UPDATE."""
+        active_count = Product.objects.filter(
+            category=OuterRef('pk'), status='active'
+        ).order_by().values('category').annotate(total=Count('id')).values('total')
+        return cls.objects.update(active_product_count=Coalesce(Subquery(active_count), 0))
+
+    @classmethod
+    def adjust_product_counts(cls, deltas):
+        """Apply {category_id: delta} to the active product counts in one UPDATE."""
+        deltas = {pk: delta for pk, delta in deltas.items() if pk and delta}
+        if not deltas:
+            return
+        change = Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            output_field=IntegerField()
+        )
+        # Never go below zero if the counter has drifted; reconcile fixes it
+        cls.objects.filter(pk__in=deltas).update(
+            active_product_count=Case(
+                When(Q(active_product_count__lt=-change), then=Value(0)),
+                default=F('active_product_count') + change,
+                output_field=IntegerField()
+            )
+        )
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def _held_by_others(self, customer=None):
+        """Subquery summing the active stock holds on each product."""
+        holds = StockReservation.objects.active().filter(product=OuterRef('pk'))
+        if customer is not None:
+            holds = holds.exclude(customer=customer)
+        held = holds.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+        return Coalesce(Subquery(held), 0)
+
+    def with_available(self, customer=None):
+        """
+        Annotate `available`: stock minus the active holds of other customers.
+        Served by the (product, expires_at) index on StockReservation.
+        """
+        return self.annotate(available=F('stock') - self._held_by_others(customer))
+
+    def decrement_stock(self, quantities, holder=None):
+        """
+        Atomically take {product_id: quantity} out of stock with one
+        conditional UPDATE. Returns False, changing nothing, unless every
+        product had enough stock. Stock held by other customers' active
+        reservations is not available; `holder`'s own holds are.
+
+        Products that run out are switched to 'out_of_stock' like
+        Product.save() would do, and the category and vendor counters are
+        adjusted.
+        Must be called inside transaction.atomic(): the rows stay locked
+        until commit, and the caller can roll back a partial update.
+        """
+        if not quantities:
+            return True
+        quantity = Case(
+            *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+            output_field=IntegerField()
+        )
+        products = self.filter(pk__in=quantities)
+        # Lock the rows (in pk order, so concurrent checkouts cannot deadlock)
+        # so the snapshot the counters are adjusted from is still true at the UPDATE
+        before = list(
+            products.select_for_update().order_by('pk')
+            .values_list('category_id', 'vendor_id', 'price', 'stock', 'pk', 'status')
+        )
+        # SET expressions see the row as it was before the UPDATE
+        updated = products.filter(stock__gte=quantity + self._held_by_others(holder)).update(
+            stock=F('stock') - quantity,
+            status=Case(
+                When(Q(status='active') & Q(stock=quantity), then=Value('out_of_stock')),
+                default=F('status')
+            )
+        )
+        if updated != len(quantities):
+            return False
+
+        category_deltas, vendor_deltas = {}, {}
+        for category_id, vendor_id, price, stock, pk, status in before:
+            if status != 'active':
+                continue
+            sold = quantities[pk]
+            changes = vendor_deltas.setdefault(vendor_id, {})
+            changes['inventory_value'] = changes.get('inventory_value', 0) - price * sold
+            if stock == sold:
+                category_deltas[category_id] = category_deltas.get(category_id, 0) - 1
+                changes['active_products'] = changes.get('active_products', 0) - 1
+                changes['out_of_stock_products'] = changes.get('out_of_stock_products', 0) + 1
+        Category.adjust_product_counts(category_deltas)
+        VendorStats.adjust(vendor_deltas)
+
+        from .cache import bump_catalog_version
+        transaction.on_commit(bump_catalog_version)
+        return True
+
 
 class Product(models.Model):
     STATUS_CHOICES = (
@@ -37,10 +148,13 @@ class Product(models.Model):
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     image = models.ImageField(
         upload_to='products/',
+        storage=get_content_addressed_storage,
         blank=True,
         null=True,
         default='products/default_product.png'
     )
+    # Resized copies of `image`, written by the generate_thumbnails worker
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     image_url = models.URLField(
         max_length=500,
@@ -49,14 +163,27 @@ class Product(models.Model):
         validators=[URLValidator()],
         help_text="Optional URL for the product image."
     )
+    # Local copy of `image_url`, kept up to date by the ingest_remote_images worker
+    remote_image = models.ImageField(
+        upload_to='remote/', storage=get_content_addressed_storage, blank=True, default='', editable=False
+    )
+    remote_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
 
     def get_image_display(self):
         if self.image_url:
-            return self.image_url
+            # Serve the cached copy once it has been downloaded
+            return self.remote_image.url if self.remote_image else self.image_url
         elif self.image:
             return self.image.url
         else:
             return None
+
+    @property
+    def display_image_field(self):
+        """The image field get_image_display serves, or None for a remote URL that is not cached yet."""
+        if self.image_url:
+            return 'remote_image' if self.remote_image else None
+        return 'image'
     
     vendor = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -88,8 +215,27 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Catalog listings: newest first, by category, by price
+            models.Index(fields=['status', '-created_at'], name='product_status_created'),
+            models.Index(fields=['category', 'status', '-created_at'], name='product_cat_status_created'),
+            models.Index(fields=['status', 'price'], name='product_status_price'),
+            models.Index(fields=['name'], condition=Q(status='active'), name='product_active_name'),
+            # Home page trending block
+            models.Index(
+                fields=['-created_at'], condition=Q(status='active', is_trending=True),
+                name='product_trending_created'
+            ),
+            # Vendor dashboard and related products
+            models.Index(fields=['vendor', 'status'], name='product_vendor_status'),
+            models.Index(fields=['vendor', '-created_at'], name='product_vendor_created'),
+            # Products sharing a remote image, updated together after a download
+            models.Index(fields=['image_url'], condition=Q(image_url__gt=''), name='product_image_url'),
+        ]
 
     def __str__(self):
         return self.name
@@ -114,9 +260,150 @@ class Product(models.Model):
             
         super().save(*args, **kwargs)
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            # The counters diff later saves against the state remembered on load
+            post_init.send(sender=type(self), instance=self)
+
+class VendorStats(models.Model):
+    """
+    Denormalized dashboard figures for one vendor, kept current with F()
+    updates by products.signals and orders.signals. Run
+    `rebuild_vendor_stats` to recompute them from scratch.
+    """
+    # Orders that still need the vendor's attention
+    OPEN_ORDER_STATUSES = ('pending', 'paid', 'approved', 'shipped')
+    DECIMAL_FIELDS = ('inventory_value', 'revenue')
+
+    vendor = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='vendor_stats'
+    )
+    total_products = models.PositiveIntegerField(default=0)
+    active_products = models.PositiveIntegerField(default=0)
+    inactive_products = models.PositiveIntegerField(default=0)
+    out_of_stock_products = models.PositiveIntegerField(default=0)
+    inventory_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    open_orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Vendor Stats"
+        verbose_name_plural = "Vendor Stats"
+
+    def __str__(self):
+        return f"Stats for vendor {self.vendor_id}"
+
+    @staticmethod
+    def product_contribution(status, price, stock):
+        """What one product adds to its vendor's figures."""
+        return {
+            'total_products': 1,
+            f'{status}_products': 1,
+            # Values may still be strings on instances that were never reloaded
+            'inventory_value': Decimal(str(price)) * int(stock) if status == 'active' else 0,
+        }
+
+    @classmethod
+    def order_contribution(cls, status, payment_status, total):
+        """What one order adds to its vendor's figures."""
+        return {
+            'open_orders': 1 if status in cls.OPEN_ORDER_STATUSES else 0,
+            'revenue': Decimal(str(total)) if payment_status == 'paid' and status != 'cancelled' else 0,
+        }
+
+    @staticmethod
+    def add_deltas(deltas, vendor_id, contribution, sign=1):
+        """Accumulate `contribution` (times `sign`) into {vendor_id: {field: delta}}."""
+        if not vendor_id:
+            return
+        changes = deltas.setdefault(vendor_id, {})
+        for field, value in contribution.items():
+            changes[field] = changes.get(field, 0) + sign * value
+
+    @classmethod
+    def adjust(cls, deltas):
+        """
+        Apply {vendor_id: {field: delta}}: one INSERT for vendors without a
+        row yet and one UPDATE for all of them. Rows are only created for
+        increases, so deletes cascading from a vendor never recreate one.
+        """
+        deltas = {
+            vendor_id: {field: delta for field, delta in changes.items() if delta}
+            for vendor_id, changes in deltas.items() if vendor_id
+        }
+        deltas = {vendor_id: changes for vendor_id, changes in deltas.items() if changes}
+        if not deltas:
+            return
+        cls.objects.bulk_create([
+            cls(vendor_id=vendor_id) for vendor_id, changes in deltas.items()
+            if any(delta > 0 for delta in changes.values())
+        ], ignore_conflicts=True)
+
+        updates = {}
+        for field in {field for changes in deltas.values() for field in changes}:
+            if field in cls.DECIMAL_FIELDS:
+                output_field = DecimalField(max_digits=14, decimal_places=2)
+            else:
+                output_field = IntegerField()
+            change = Case(
+                *[When(pk=vendor_id, then=Value(changes[field]))
+                  for vendor_id, changes in deltas.items() if field in changes],
+                default=Value(0),
+                output_field=output_field
+            )
+            # Never go below zero if the figures have drifted; rebuild fixes it
+            updates[field] = Greatest(F(field) + change, Value(0), output_field=output_field)
+        cls.objects.filter(pk__in=deltas).update(updated_at=timezone.now(), **updates)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every vendor's figures with two aggregate queries."""
+        Order = apps.get_model('orders', 'Order')
+        stats = {}
+
+        product_totals = Product.objects.order_by().values('vendor').annotate(
+            total=Count('id'),
+            active=Count('id', filter=Q(status='active')),
+            inactive=Count('id', filter=Q(status='inactive')),
+            out_of_stock=Count('id', filter=Q(status='out_of_stock')),
+            value=Sum(F('price') * F('stock'), filter=Q(status='active'),
+                      output_field=DecimalField(max_digits=14, decimal_places=2)),
+        )
+        for row in product_totals:
+            stats[row['vendor']] = cls(
+                vendor_id=row['vendor'],
+                total_products=row['total'],
+                active_products=row['active'],
+                inactive_products=row['inactive'],
+                out_of_stock_products=row['out_of_stock'],
+                inventory_value=row['value'] or 0,
+            )
+
+        order_totals = Order.objects.filter(vendor__isnull=False).order_by().values('vendor').annotate(
+            open=Count('id', filter=Q(status__in=cls.OPEN_ORDER_STATUSES)),
+            revenue=Sum('total', filter=Q(payment_status='paid') & ~Q(status='cancelled')),
+        )
+        for row in order_totals:
+            vendor_stats = stats.setdefault(row['vendor'], cls(vendor_id=row['vendor']))
+            vendor_stats.open_orders = row['open']
+            vendor_stats.revenue = row['revenue'] or 0
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(stats.values(), batch_size=500)
+        return len(stats)
+
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='products/gallery/')
+    image = models.ImageField(upload_to='products/gallery/', storage=get_content_addressed_storage)
+    # Resized copies of `image`, written by the generate_thumbnails worker
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -134,4 +421,224 @@ class PromotionDay(models.Model):
     class Meta:
         ordering = ['-date']
         verbose_name = "Promotion Day"
-        verbose_name_plural = "Promotion Days"
\ No newline at end of file
+        verbose_name_plural = "Promotion Days"
+
+
+class StockReservationQuerySet(models.QuerySet):
+
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class StockReservation(models.Model):
+    """
+    A short-lived hold on stock placed when a customer starts checking out,
+    so concurrent buyers on busy promotion days cannot sell the same units.
+    Holds are deleted when the order is placed; expired holds stop counting
+    immediately and are purged by `release_expired_reservations`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stock_reservations'
+    )
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'customer'], name='unique_reservation_per_customer'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_expiry'),
+            models.Index(fields=['expires_at'], name='reservation_expiry'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for {self.customer_id} until {self.expires_at}"
+
+    @classmethod
+    def hold(cls, customer, quantities, minutes=None):
+        """
+        Reserve {product_id: quantity} for `customer`, replacing any earlier
+        holds on those products. Returns {product_id: available} for the
+        products that could not be held in full; the rest are held.
+        """
+        minutes = minutes or getattr(settings, 'STOCK_RESERVATION_MINUTES', 10)
+        expires_at = timezone.now() + timezone.timedelta(minutes=minutes)
+
+        with transaction.atomic():
+            # Lock the product rows so concurrent holds are serialized per product
+            products = (
+                Product.objects.select_for_update(of=('self',))
+                .filter(pk__in=quantities)
+                .with_available(customer)
+                .values_list('pk', 'available')
+            )
+            shortfall = {}
+            held = []
+            for product_id, available in products:
+                if available < quantities[product_id]:
+                    shortfall[product_id] = max(available, 0)
+                else:
+                    held.append(cls(
+                        product_id=product_id,
+                        customer=customer,
+                        quantity=quantities[product_id],
+                        expires_at=expires_at
+                    ))
+
+            cls.objects.filter(customer=customer, product_id__in=quantities).delete()
+            cls.objects.bulk_create(held)
+        return shortfall
+
+    @classmethod
+    def release(cls, customer, product_ids):
+        """Drop the customer's holds, e.g. once the order has been placed."""
+        return cls.objects.filter(customer=customer, product_id__in=product_ids).delete()[0]
+
+    @classmethod
+    def purge_expired(cls, batch_size=1000):
+        """Delete expired holds in batches. Returns the number deleted."""
+        deleted = 0
+        while True:
+            batch = list(cls.objects.expired().values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += cls.objects.filter(pk__in=batch).delete()[0]
+
+
+class ThumbnailJob(models.Model):
+    """
+    An uploaded image waiting for its resized renditions. Queued when an
+    image field changes and processed by the `generate_thumbnails` worker
+    (see products.thumbnails).
+    """
+    model = models.CharField(max_length=100, help_text="Owner model label, e.g. products.product")
+    object_id = models.PositiveBigIntegerField()
+    field = models.CharField(max_length=50)
+    source = models.CharField(max_length=255, help_text="Storage name of the uploaded image")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id', 'field'], name='unique_thumbnail_job'),
+        ]
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='thumbnail_job_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.model}:{self.object_id}.{self.field} ({self.source})"
+
+
+class GalleryUpload(models.Model):
+    """
+    A gallery image received by add_product/edit_product and parked in the
+    staging area until the `process_gallery_uploads` worker has validated
+    and re-encoded it into a ProductImage (see products.gallery).
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='gallery_uploads')
+    staged_name = models.CharField(max_length=255, help_text="Storage name of the staged upload")
+    original_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    image = models.ForeignKey(ProductImage, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.CharField(max_length=255, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='gallery_upload_due'),
+            models.Index(fields=['product', 'status'], name='gallery_upload_product'),
+        ]
+
+    def __str__(self):
+        return f"{self.original_name} for product {self.product_id} ({self.status})"
+
+
+class RemoteImage(models.Model):
+    """
+    The local copy of an external product image URL. Downloaded and refreshed
+    with conditional requests by the `ingest_remote_images` worker; the file
+    is stored under the hash of its content (see products.remote_images).
+    """
+    url = models.URLField(max_length=500, unique=True)
+    name = models.CharField(max_length=255, blank=True, help_text="Storage name of the current copy")
+    content_hash = models.CharField(max_length=64, blank=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+    next_fetch_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0, help_text="Consecutive failed fetches")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['next_fetch_at'], name='remote_image_due'),
+        ]
+
+    def __str__(self):
+        return self.url
+
+
+class Blob(models.Model):
+    """
+    A content-addressed media file (see products.storage) and the number of
+    rows referring to it, kept by products.signals. Blobs left without
+    references are deleted by `collect_media_garbage`.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], condition=Q(ref_count__lte=0), name='blob_unreferenced'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+    @classmethod
+    def adjust(cls, deltas):
+        """
+        Apply {name: delta} to the reference counts: one INSERT for new
+        names and one UPDATE for all of them.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if name and delta}
+        if not deltas:
+            return
+        cls.objects.bulk_create(
+            [cls(name=name) for name, delta in deltas.items() if delta > 0], ignore_conflicts=True
+        )
+        change = Case(
+            *[When(name=name, then=Value(delta)) for name, delta in deltas.items()],
+            output_field=IntegerField()
+        )
+        # Never go below zero if the counter has drifted; --recount fixes it
+        cls.objects.filter(name__in=deltas).update(
+            ref_count=Greatest(F('ref_count') + change, Value(0)),
+            updated_at=timezone.now()
+        )
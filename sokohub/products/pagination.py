@@ -0,0 +1,171 @@
+"""
+Keyset (cursor) pagination for the product catalog.
+
+Instead of `OFFSET n`, each page remembers the sort key of its first and last
+row in an opaque signed `?cursor=` token and the next page is fetched with a
+`WHERE (key) > (last key)` condition. Every page costs the same indexed range
+scan no matter how deep the visitor has paged.
+"""
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'products.pagination.cursor'
+
+# Counts above this threshold are displayed as "1000+" instead of being computed
+COUNT_CAP = getattr(settings, 'PRODUCT_COUNT_CAP', 1000)
+
+
+class KeysetPage:
+    """A page of results that can be iterated like a regular Paginator page."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def encode_cursor(payload):
+    return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    """Return the cursor payload, or None for a missing or tampered token."""
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by a unique ordering, e.g. ('-created_at', '-id').
+    The last field must be unique so that ties are broken deterministically.
+    """
+
+    def __init__(self, queryset, ordering, per_page=12):
+        self.queryset = queryset
+        self.ordering = ordering
+        self.per_page = per_page
+        self.fields = [field.lstrip('-') for field in ordering]
+
+    def _key(self, obj):
+        values = []
+        for name in self.fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return values
+
+    def _parse_key(self, values):
+        model = self.queryset.model
+        return [model._meta.get_field(name).to_python(value) for name, value in zip(self.fields, values)]
+
+    def _seek(self, values, backwards):
+        """Build `(f1, f2, ...) > (v1, v2, ...)` honouring each field's direction."""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith('-')
+            if backwards:
+                descending = not descending
+            lookup = 'lt' if descending else 'gt'
+            clause = Q(**{f'{self.fields[i]}__{lookup}': values[i]})
+            for j in range(i):
+                clause &= Q(**{self.fields[j]: values[j]})
+            condition |= clause
+        return condition
+
+    def get_page(self, token):
+        cursor = decode_cursor(token)
+        backwards = bool(cursor and cursor.get('d') == 'p')
+        queryset = self.queryset
+
+        if cursor and 'k' in cursor:
+            try:
+                values = self._parse_key(cursor['k'])
+            except Exception:
+                values = None
+            if values is not None and len(values) == len(self.fields):
+                queryset = queryset.filter(self._seek(values, backwards))
+            else:
+                cursor, backwards = None, False
+
+        if backwards:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+        else:
+            ordering = list(self.ordering)
+
+        # Fetch one extra row to know whether there is anything beyond this page
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([])
+
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else cursor is not None
+
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor({'k': self._key(rows[-1]), 'd': 'n'}) if has_next else None,
+            previous_cursor=encode_cursor({'k': self._key(rows[0]), 'd': 'p'}) if has_previous else None,
+        )
+
+
+def paginate_ranked(queryset, ranked_ids, token, per_page=12):
+    """
+    Paginate search results in the order given by `ranked_ids`.
+
+    The id list is already capped by the search backend, so slicing it by an
+    offset stays cheap however far the visitor pages.
+    """
+    cursor = decode_cursor(token) or {}
+    try:
+        offset = max(int(cursor.get('o', 0)), 0)
+    except (TypeError, ValueError):
+        offset = 0
+
+    visible = set(queryset.values_list('id', flat=True))
+    ordered_ids = [product_id for product_id in ranked_ids if product_id in visible]
+    page_ids = ordered_ids[offset:offset + per_page]
+    objects = queryset.in_bulk(page_ids)
+
+    has_next = offset + per_page < len(ordered_ids)
+    return KeysetPage(
+        [objects[product_id] for product_id in page_ids],
+        next_cursor=encode_cursor({'o': offset + per_page}) if has_next else None,
+        previous_cursor=encode_cursor({'o': max(offset - per_page, 0)}) if offset > 0 else None,
+    )
+
+
+def capped_count(queryset, cap=COUNT_CAP):
+    """
+    Count rows up to `cap`. Returns (count, is_capped); the database stops
+    scanning after cap + 1 rows instead of counting the whole result.
+    """
+    count = queryset.order_by()[:cap + 1].count()
+    if count > cap:
+        return cap, True
+    return count, False
@@ -0,0 +1,238 @@
+"""
+Local copies of external product images.
+
+Products may point `image_url` at another site. Instead of hotlinking it on
+every page view, saving the product registers the URL as a RemoteImage and
+the `ingest_remote_images` worker downloads it once, checks it is a real
+image with Pillow and stores it under the SHA-256 of its content (see
+products.storage). Every product using that URL then gets the file in
+`remote_image`, which get_image_display serves (thumbnails follow through
+products.thumbnails).
+
+Copies are refreshed every REMOTE_IMAGE_REFRESH seconds with If-None-Match /
+If-Modified-Since, so an unchanged image costs a 304 and no download. While
+a URL has never been fetched successfully the product keeps linking to it.
+"""
+import hashlib
+import ipaddress
+import logging
+import socket
+from datetime import timedelta
+from io import BytesIO
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from PIL import Image
+from .cache import bump_catalog_version
+from .gallery import ALLOWED_FORMATS, GALLERY_MAX_PIXELS, InvalidImage
+from .models import Product, RemoteImage
+from .storage import content_addressed_storage
+from .thumbnails import queue_rows
+
+logger = logging.getLogger(__name__)
+
+REMOTE_IMAGE_REFRESH = timedelta(seconds=getattr(settings, 'REMOTE_IMAGE_REFRESH', 60 * 60 * 24))
+REMOTE_IMAGE_TIMEOUT = getattr(settings, 'REMOTE_IMAGE_TIMEOUT', 10)
+REMOTE_IMAGE_MAX_SIZE = getattr(settings, 'REMOTE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+REMOTE_IMAGE_BATCH_SIZE = getattr(settings, 'REMOTE_IMAGE_BATCH_SIZE', 20)
+# Vendors choose the URLs, so by default the worker refuses to fetch from
+# loopback, private and link-local addresses
+REMOTE_IMAGE_ALLOW_PRIVATE_HOSTS = getattr(settings, 'REMOTE_IMAGE_ALLOW_PRIVATE_HOSTS', False)
+
+REMOTE_DIR = 'remote'
+MAX_REDIRECTS = 3
+RETRY_DELAY = 60
+CLAIM_TIMEOUT = timedelta(minutes=5)
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif'}
+USER_AGENT = 'SokoHub image fetcher'
+
+
+class FetchError(Exception):
+    pass
+
+
+def register(url):
+    """Return the cached file name for `url` ('' until downloaded), registering it for download."""
+    remote, _ = RemoteImage.objects.get_or_create(url=url)
+    return remote.name
+
+
+def register_missing():
+    """Register every product image URL that has no RemoteImage yet. Returns the number added."""
+    urls = (
+        Product.objects.filter(image_url__gt='')
+        .exclude(Exists(RemoteImage.objects.filter(url=OuterRef('image_url'))))
+        .values_list('image_url', flat=True).distinct()
+    )
+    created = RemoteImage.objects.bulk_create([RemoteImage(url=url) for url in urls], ignore_conflicts=True)
+    return len(created)
+
+
+def _check_host(url):
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise FetchError(f"unsupported URL {url}")
+    if REMOTE_IMAGE_ALLOW_PRIVATE_HOSTS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, parts.port or None)}
+    except socket.gaierror as e:
+        raise FetchError(f"cannot resolve {parts.hostname}") from e
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not ip.is_global:
+            raise FetchError(f"{parts.hostname} resolves to a non-public address")
+
+
+def _download(remote, session):
+    """
+    GET the image, conditionally if we already have a copy. Returns None when
+    the server answers 304, otherwise (bytes, etag, last_modified).
+    """
+    headers = {'User-Agent': USER_AGENT}
+    if remote.name:
+        if remote.etag:
+            headers['If-None-Match'] = remote.etag
+        if remote.last_modified:
+            headers['If-Modified-Since'] = remote.last_modified
+
+    url = remote.url
+    # Follow redirects by hand so every hop goes through the host check
+    for _ in range(MAX_REDIRECTS + 1):
+        _check_host(url)
+        response = session.get(url, headers=headers, timeout=REMOTE_IMAGE_TIMEOUT,
+                               stream=True, allow_redirects=False)
+        if not response.is_redirect:
+            break
+        url = urljoin(url, response.headers['Location'])
+        response.close()
+    else:
+        raise FetchError("too many redirects")
+
+    with response:
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            raise FetchError(f"HTTP {response.status_code}")
+        if int(response.headers.get('Content-Length') or 0) > REMOTE_IMAGE_MAX_SIZE:
+            raise InvalidImage("image is too large")
+        data = BytesIO()
+        for chunk in response.iter_content(64 * 1024):
+            data.write(chunk)
+            if data.tell() > REMOTE_IMAGE_MAX_SIZE:
+                raise InvalidImage("image is too large")
+        return data.getvalue(), response.headers.get('ETag', ''), response.headers.get('Last-Modified', '')
+
+
+def _validate(data):
+    """Return the image format of `data`, or raise InvalidImage."""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise InvalidImage(f"unsupported image type ({image.format or 'unknown'})")
+            if image.width * image.height > GALLERY_MAX_PIXELS:
+                raise InvalidImage(f"image is too large ({image.width}x{image.height})")
+            image.verify()
+            return image.format
+    except InvalidImage:
+        raise
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImage("not a valid image") from e
+
+
+def store(data, format):
+    """Save image bytes under their content hash. Returns (name, hash)."""
+    # Same content, same name: identical images are stored once
+    name = content_addressed_storage.save(REMOTE_DIR + '/image' + EXTENSIONS[format], ContentFile(data))
+    return name, hashlib.sha256(data).hexdigest()
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            RemoteImage.objects.filter(next_fetch_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_fetch_at', 'id')[:batch_size]
+        )
+        if batch:
+            RemoteImage.objects.filter(pk__in=[remote.pk for remote in batch]).update(
+                next_fetch_at=now + CLAIM_TIMEOUT
+            )
+    return batch
+
+
+def _retry_later(remote, error):
+    remote.attempts += 1
+    remote.last_error = str(error)[:1000]
+    # Back off, but never wait longer than a normal refresh; a cached copy keeps being served
+    delay = min(timedelta(seconds=RETRY_DELAY * 2 ** (remote.attempts - 1)), REMOTE_IMAGE_REFRESH)
+    remote.next_fetch_at = timezone.now() + delay
+    remote.save(update_fields=['attempts', 'last_error', 'next_fetch_at'])
+
+
+def _link_products(remote):
+    """Point every product using `remote.url` at the current copy. Returns the number changed."""
+    products = Product.objects.filter(image_url=remote.url)
+    changed = products.exclude(remote_image=remote.name).update(remote_image=remote.name)
+    if changed:
+        queue_rows(products, 'remote_image')
+    return changed
+
+
+def fetch(remote, session=None):
+    """Download or revalidate one RemoteImage. Returns True if its content changed."""
+    session = session or requests.Session()
+    result = _download(remote, session)
+    now = timezone.now()
+    remote.attempts = 0
+    remote.last_error = ''
+    remote.fetched_at = now
+    remote.next_fetch_at = now + REMOTE_IMAGE_REFRESH
+    if result is None:
+        remote.save(update_fields=['attempts', 'last_error', 'fetched_at', 'next_fetch_at'])
+        return False
+
+    data, etag, last_modified = result
+    name, digest = store(data, _validate(data))
+    changed = digest != remote.content_hash
+    remote.name, remote.content_hash = name, digest
+    remote.etag, remote.last_modified = etag[:255], last_modified[:64]
+    remote.save()
+    return changed
+
+
+def ingest(batch_size=REMOTE_IMAGE_BATCH_SIZE):
+    """
+    Fetch one batch of due remote images. Returns (fetched, failed) so
+    callers can loop until nothing is left.
+    """
+    batch = _claim(batch_size)
+    fetched = failed = 0
+    catalog_changed = False
+    session = requests.Session()
+    for remote in batch:
+        if not Product.objects.filter(image_url=remote.url).exists():
+            # No product uses this URL any more
+            remote.delete()
+            continue
+        try:
+            fetch(remote, session)
+        except (FetchError, InvalidImage, requests.RequestException) as e:
+            logger.warning("Could not fetch remote image %s: %s", remote.url, e)
+            _retry_later(remote, e)
+            failed += 1
+        else:
+            fetched += 1
+        if remote.name:
+            catalog_changed |= bool(_link_products(remote))
+
+    if catalog_changed:
+        # .update() skips the signals that normally retire cached home page blocks
+        bump_catalog_version()
+    return fetched, failed
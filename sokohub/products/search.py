@@ -0,0 +1,175 @@
+"""
+Full-text product search.
+
+Products are mirrored into an inverted index table so the catalog search can
+avoid `LIKE '%term%'` scans:
+
+* SQLite  -> an FTS5 virtual table ranked with bm25()
+* Postgres -> a tsvector table with a GIN index ranked with ts_rank()
+
+If the index is not available (unsupported database, table missing, FTS5 not
+compiled in) every function here degrades gracefully and the caller falls back
+to the old icontains filter.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'products_search_index'
+
+# Hard cap on the number of ids returned for a single search
+SEARCH_MAX_RESULTS = getattr(settings, 'PRODUCT_SEARCH_MAX_RESULTS', 1000)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def is_supported():
+    """Return True if the current database has a search index implementation."""
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _tokens(query):
+    return _TOKEN_RE.findall(query.lower())[:10]
+
+
+def _match_expression(tokens):
+    if connection.vendor == 'sqlite':
+        # Every token becomes a quoted prefix query; FTS5 ANDs them together.
+        return ' '.join(f'"{token}"*' for token in tokens)
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+# ─── Index maintenance ────────────────────────────────────────────────────────
+
+def create_index(schema_editor=None):
+    """Create the search index table for the current database vendor."""
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                f"USING fts5(name, description, vendor, tokenize='unicode61 remove_diacritics 2')"
+            )
+        elif conn.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                f"product_id bigint PRIMARY KEY REFERENCES products_product(id) "
+                f"ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+                f"document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_gin "
+                f"ON {SEARCH_TABLE} USING GIN (document)"
+            )
+
+
+def drop_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor not in ('sqlite', 'postgresql'):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def rebuild_index(conn=None):
+    """
+    Repopulate the whole index from the products table with set-based SQL.
+    Returns the number of indexed products.
+    """
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, name, description, vendor) "
+                f"SELECT p.id, p.name, p.description, u.username "
+                f"FROM products_product p INNER JOIN auth_user u ON u.id = p.vendor_id"
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, document) "
+                f"SELECT p.id, "
+                f"setweight(to_tsvector('simple', coalesce(p.name, '')), 'A') || "
+                f"setweight(to_tsvector('simple', coalesce(u.username, '')), 'B') || "
+                f"setweight(to_tsvector('simple', coalesce(p.description, '')), 'C') "
+                f"FROM products_product p INNER JOIN auth_user u ON u.id = p.vendor_id"
+            )
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def index_product(product):
+    """Insert or refresh a single product in the index."""
+    if not is_supported():
+        return
+    vendor = product.vendor.username if product.vendor_id else ''
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product.pk])
+                cursor.execute(
+                    f"INSERT INTO {SEARCH_TABLE} (rowid, name, description, vendor) VALUES (%s, %s, %s, %s)",
+                    [product.pk, product.name, product.description, vendor]
+                )
+            else:
+                cursor.execute(
+                    f"INSERT INTO {SEARCH_TABLE} (product_id, document) VALUES (%s, "
+                    f"setweight(to_tsvector('simple', %s), 'A') || "
+                    f"setweight(to_tsvector('simple', %s), 'B') || "
+                    f"setweight(to_tsvector('simple', %s), 'C')) "
+                    f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                    [product.pk, product.name, vendor, product.description]
+                )
+    except DatabaseError as e:
+        logger.warning("Could not index product %s: %s", product.pk, e)
+
+
+def unindex_product(product_id):
+    """Remove a product from the index."""
+    if not is_supported():
+        return
+    column = 'rowid' if connection.vendor == 'sqlite' else 'product_id'
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {column} = %s", [product_id])
+    except DatabaseError as e:
+        logger.warning("Could not remove product %s from the search index: %s", product_id, e)
+
+
+# ─── Querying ─────────────────────────────────────────────────────────────────
+
+def search_product_ids(query, limit=SEARCH_MAX_RESULTS):
+    """
+    Return product ids matching `query`, best match first.
+
+    Returns None when the index cannot answer the query so the caller can
+    fall back to a plain icontains filter.
+    """
+    tokens = _tokens(query)
+    if not tokens or not is_supported():
+        return None
+
+    expression = _match_expression(tokens)
+    if connection.vendor == 'sqlite':
+        # bm25() returns lower-is-better scores; name matches weigh the most.
+        sql = (
+            f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+            f"ORDER BY bm25({SEARCH_TABLE}, 10.0, 1.0, 3.0) LIMIT %s"
+        )
+    else:
+        sql = (
+            f"SELECT product_id FROM {SEARCH_TABLE}, to_tsquery('simple', %s) query "
+            f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s"
+        )
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [expression, limit])
+            return [row[0] for row in cursor.fetchall()]
+    except DatabaseError as e:
+        logger.warning("Search index unavailable, falling back to icontains: %s", e)
+        return None
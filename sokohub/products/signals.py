@@ -0,0 +1,169 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import Blob, Product, Category, ProductImage, RemoteImage, VendorStats
+from . import remote_images, search
+from .blobs import BLOB_FIELDS
+from .thumbnails import queue_renditions
+from .cache import bump_catalog_version
+from .storage import is_content_addressed
+
+
+def _active_category(category_id, status):
+    """Return the category an active product counts towards, if any."""
+    return category_id if category_id and status == 'active' else None
+
+
+def _vendor_contribution(values):
+    """Return (vendor_id, contribution) for loaded product values, or None if some were deferred."""
+    if any(name not in values for name in ('vendor_id', 'status', 'price', 'stock')):
+        return None
+    return values['vendor_id'], VendorStats.product_contribution(values['status'], values['price'], values['stock'])
+
+
+@receiver(post_init, sender=Product)
+def remember_product_state(sender, instance, **kwargs):
+    """Remember the loaded category/status/stock so saves can adjust counters."""
+    instance._counted_category_id = _active_category(
+        instance.__dict__.get('category_id'), instance.__dict__.get('status')
+    )
+    instance._vendor_contribution = _vendor_contribution(instance.__dict__)
+    instance._loaded_image_url = instance.__dict__.get('image_url')
+
+
+@receiver(pre_save, sender=Product)
+def link_remote_image(sender, instance, raw=False, **kwargs):
+    """Serve a new image_url from its local copy, registering it for download if there is none."""
+    if raw or 'image_url' in instance.get_deferred_fields():
+        return
+    if not instance._state.adding and instance.image_url == getattr(instance, '_loaded_image_url', None):
+        return
+    instance.remote_image = remote_images.register(instance.image_url) if instance.image_url else ''
+    instance._loaded_image_url = instance.image_url
+
+
+@receiver(post_save, sender=Product)
+def update_category_counts_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old_category_id = None if created else getattr(instance, '_counted_category_id', None)
+    new_category_id = _active_category(instance.category_id, instance.status)
+    if old_category_id != new_category_id:
+        Category.adjust_product_counts({old_category_id: -1, new_category_id: 1})
+    instance._counted_category_id = new_category_id
+
+
+@receiver(post_delete, sender=Product)
+def update_category_counts_on_delete(sender, instance, **kwargs):
+    Category.adjust_product_counts({_active_category(instance.category_id, instance.status): -1})
+
+
+@receiver(post_save, sender=Product)
+def update_vendor_stats_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else getattr(instance, '_vendor_contribution', None)
+    if old is None and not created:
+        # The product was loaded with deferred fields; rebuild_vendor_stats catches up
+        return
+    new = _vendor_contribution(instance.__dict__)
+    deltas = {}
+    if old is not None:
+        VendorStats.add_deltas(deltas, old[0], old[1], -1)
+    VendorStats.add_deltas(deltas, new[0], new[1])
+    VendorStats.adjust(deltas)
+    instance._vendor_contribution = new
+
+
+@receiver(post_delete, sender=Product)
+def update_vendor_stats_on_delete(sender, instance, **kwargs):
+    old = getattr(instance, '_vendor_contribution', None)
+    if old is not None:
+        deltas = {}
+        VendorStats.add_deltas(deltas, old[0], old[1], -1)
+        VendorStats.adjust(deltas)
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, raw=False, **kwargs):
+    """Keep the full-text search index in sync with product edits."""
+    if raw:
+        return
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product_on_delete(sender, instance, **kwargs):
+    search.unindex_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Retire cached catalog blocks and pages once the write is committed."""
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Category)
+def queue_image_renditions(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Have the thumbnail worker resize newly uploaded images."""
+    if raw:
+        return
+    queue_renditions(instance, 'image', update_fields)
+    if sender is Product:
+        queue_renditions(instance, 'remote_image', update_fields)
+
+
+
+def _referenced_blobs(instance):
+    """Content-addressed names the loaded instance refers to, or None if some were deferred."""
+    names = Counter()
+    for field in BLOB_FIELDS[type(instance)]:
+        if field not in instance.__dict__:
+            return None
+        value = instance.__dict__[field]
+        name = getattr(value, 'name', value)
+        if is_content_addressed(name):
+            names[name] += 1
+    return names
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=ProductImage)
+@receiver(post_init, sender=RemoteImage)
+def remember_blobs(sender, instance, **kwargs):
+    instance._referenced_blobs = _referenced_blobs(instance)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=RemoteImage)
+def count_blob_references(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old = Counter() if created else instance._referenced_blobs
+    new = _referenced_blobs(instance)
+    if old is None or new is None:
+        # Loaded with deferred fields; collect_media_garbage --recount catches up
+        return
+    deltas = Counter(new)
+    deltas.subtract(old)
+    Blob.adjust(deltas)
+    instance._referenced_blobs = new
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=RemoteImage)
+def release_blob_references(sender, instance, **kwargs):
+    old = getattr(instance, '_referenced_blobs', None)
+    if old:
+        Blob.adjust({name: -count for name, count in old.items()})
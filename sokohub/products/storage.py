@@ -0,0 +1,73 @@
+"""
+Content-addressed storage for product images.
+
+Uploads are stored under the SHA-256 of their bytes,
+
+    cas/ab/ab12...ef.jpg
+
+whatever directory the field's upload_to asks for, so the same image
+uploaded for several products or gallery entries is written once. A name
+never changes content, which makes the URLs safe to cache forever.
+
+Blob rows count the model references to each file (kept by
+products.signals); `manage.py collect_media_garbage` deletes the blobs
+nothing refers to any more.
+"""
+import hashlib
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+
+CAS_DIR = 'cas'
+
+
+def content_name(digest, original_name):
+    extension = posixpath.splitext(original_name)[1].lower()
+    return posixpath.join(CAS_DIR, digest[:2], digest + extension)
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(CAS_DIR + '/')
+
+
+class _AlreadyStored(Exception):
+    pass
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage over MEDIA_ROOT that names new files by content.
+    Files saved before it was introduced keep their names and still resolve.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content in _save(). FileSystemStorage
+        # calls back here when a concurrent upload of the same bytes created
+        # the file first; that file is the one we wanted to write.
+        if is_content_addressed(name) and self.exists(name):
+            raise _AlreadyStored(name)
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        name = content_name(digest.hexdigest(), name)
+        if self.exists(name):
+            return name
+        try:
+            return super()._save(name, content)
+        except _AlreadyStored:
+            return name
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_content_addressed_storage():
+    return content_addressed_storage
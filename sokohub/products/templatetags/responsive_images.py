@@ -0,0 +1,58 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from products.thumbnails import current_renditions
+
+register = template.Library()
+
+
+def _srcset(names):
+    return ', '.join(f'{default_storage.url(name)} {width}w' for width, name in names.items())
+
+
+@register.simple_tag
+def responsive_image(instance, field=None, **attrs):
+    """
+    Render `instance.<field>` as a <picture> with WebP and JPEG srcsets.
+
+        {% responsive_image product sizes="(min-width: 768px) 25vw, 100vw" alt=product.name class="card-img-top" %}
+
+    `field` defaults to the instance's `display_image_field`, or 'image'.
+    Extra keyword arguments become <img> attributes; `sizes` defaults to
+    100vw. Falls back to a plain lazy <img> of the original file (or the
+    product's external image URL) while no current renditions exist.
+    """
+    if field is None:
+        field = getattr(instance, 'display_image_field', 'image')
+    image = getattr(instance, field) if field else None
+    get_display = getattr(instance, 'get_image_display', None)
+    src = get_display() if get_display else (image.url if image else None)
+    if not src:
+        return ''
+
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    renditions = current_renditions(instance, field) if field else None
+    if not renditions or src != image.url:
+        return format_html('<img{}>', flatatt({'src': src, **attrs}))
+
+    sizes = attrs.pop('sizes', '100vw')
+    jpeg = renditions['jpeg']
+    style = attrs.pop('style', '')
+    if renditions.get('placeholder'):
+        # Blurry preview shown until the real image arrives
+        style = f"{style.rstrip(';')}; background: url('{renditions['placeholder']}') center / contain no-repeat".lstrip('; ')
+    img_attrs = {
+        'src': default_storage.url(jpeg[max(jpeg, key=int)]),
+        'srcset': _srcset(jpeg),
+        'sizes': sizes,
+        'width': renditions['width'],
+        'height': renditions['height'],
+        'style': style or None,
+        **attrs,
+    }
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img{}></picture>',
+        _srcset(renditions['webp']), sizes, flatatt(img_attrs)
+    )
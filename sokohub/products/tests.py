@@ -1,3 +1,716 @@
-from django.test import TestCase
+import hashlib
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from PIL import Image
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import User
+from accounts.otp import issue_otp
+from notifications.models import Notification
+from orders.models import Order, OrderItem
+from products import blobs, remote_images, search, thumbnails
+from products.cache import get_catalog_version, get_home_blocks
+from products.pagination import KeysetPaginator, capped_count
+from products.storage import content_addressed_storage
+from products.models import Blob, Category, Product, ProductImage, RemoteImage, ThumbnailJob, VendorStats
 
-# Create your tests here.
+# Tables that grow with traffic; a full scan of any of them fails the test.
+# Small lookup tables (categories, sites, social apps) are allowed to be scanned.
+WATCHED_TABLES = {
+    'products_product', 'orders_order', 'orders_orderitem', 'orders_dailysales',
+    'notifications_notification', 'accounts_emailotp', 'auth_user', 'cart_cart', 'cart_cartitem',
+}
+
+_SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def _sqlite_full_scans(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        details = [row[-1] for row in cursor.fetchall()]
+    scans = []
+    for detail in details:
+        match = _SQLITE_FULL_SCAN.match(detail)
+        if match and match.group(1) in WATCHED_TABLES:
+            scans.append(detail)
+    return scans
+
+
+def _postgres_full_scans(sql):
+    with connection.cursor() as cursor:
+        # Tiny test tables would otherwise always be read sequentially
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        import json
+        plan = json.loads(plan)
+
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in WATCHED_TABLES:
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+class QueryPlanTests(TestCase):
+    """
+    Request the hot pages and EXPLAIN every SELECT they run. Runs against the
+    configured test database: SQLite locally, Postgres when DATABASE_URL
+    points at one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        cls.category = Category.objects.create(name='Phones')
+        cls.products = [
+            Product.objects.create(
+                vendor=cls.vendor, category=cls.category, name=f'Phone {i}', description='A phone',
+                price=10 + i, stock=5, is_trending=i % 2 == 0
+            )
+            for i in range(5)
+        ]
+        cls.order = Order.objects.create(
+            customer=cls.customer, vendor=cls.vendor, total=10, delivery_address='Kigali', phone='0788'
+        )
+        OrderItem.objects.create(order=cls.order, product=cls.products[0], quantity=1, price=10)
+        Notification.objects.create(user=cls.customer, title='Hi', message='Hello', notification_type='system')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNoFullScans(self, method, url, data=None, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400, url)
+
+        explain = _postgres_full_scans if connection.vendor == 'postgresql' else _sqlite_full_scans
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            scans = explain(sql)
+            self.assertFalse(scans, f"{url} runs a full table scan ({', '.join(scans)}):\n{sql}")
+
+    def test_catalog_pages(self):
+        self.assertNoFullScans('get', reverse('home'))
+        self.assertNoFullScans('get', reverse('product_list'))
+        self.assertNoFullScans('get', reverse('product_list'), {'sort': 'price_low', 'min_price': 11})
+        self.assertNoFullScans('get', reverse('product_list'), {'sort': 'name'})
+        self.assertNoFullScans('get', reverse('product_list_by_category', args=[self.category.slug]))
+        self.assertNoFullScans('get', reverse('product_detail', args=[self.products[0].pk]))
+
+    def test_vendor_pages(self):
+        self.assertNoFullScans('get', reverse('vendor_dashboard'), user=self.vendor)
+        self.assertNoFullScans('get', reverse('vendor_products'), user=self.vendor)
+        self.assertNoFullScans('get', reverse('vendor_orders'), user=self.vendor)
+        self.assertNoFullScans('get', reverse('vendor_orders'), {'status': 'pending'}, user=self.vendor)
+        self.assertNoFullScans('get', reverse('vendor_analytics'), user=self.vendor)
+
+    def test_customer_pages(self):
+        self.assertNoFullScans('get', reverse('customer_orders'), user=self.customer)
+        self.assertNoFullScans('get', reverse('order_detail', args=[self.order.pk]), user=self.customer)
+        self.assertNoFullScans('get', reverse('all_notifications'), user=self.customer)
+        self.assertNoFullScans('get', reverse('view_cart'), user=self.customer)
+
+    def test_otp_verification(self):
+        issue_otp(self.customer.email)
+        session = self.client.session
+        session['otp_email'] = self.customer.email
+        session.save()
+        self.assertNoFullScans('post', reverse('verify_otp'), {'otp': '00000'})
+
+
+def _png(color):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 30), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ImageHost(BaseHTTPRequestHandler):
+    """Stand-in for a vendor's image host: serves `files` with ETags and records requests."""
+    files = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, dict(self.headers)))
+        if self.path not in self.files:
+            self.send_error(404)
+            return
+        body, content_type = self.files[self.path]
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RemoteImageIngestionTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHost)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # The stand-in server is on loopback, which production refuses to fetch from
+        patcher = mock.patch.object(remote_images, 'REMOTE_IMAGE_ALLOW_PRIVATE_HOSTS', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        ImageHost.files = {'/photo.png': (_png('red'), 'image/png'), '/page.html': (b'<html></html>', 'text/html')}
+        ImageHost.requests = []
+        self.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+
+    def _product(self, path, **kwargs):
+        return Product.objects.create(
+            vendor=self.vendor, name='Phone', description='A phone', price=10, stock=5,
+            image_url=self.base_url + path, **kwargs
+        )
+
+    def _make_due(self):
+        RemoteImage.objects.update(next_fetch_at=timezone.now())
+
+    def test_downloads_once_and_serves_the_local_copy(self):
+        product = self._product('/photo.png')
+        self.assertEqual(product.get_image_display(), self.base_url + '/photo.png')
+        self.assertEqual(remote_images.ingest(), (1, 0))
+
+        digest = hashlib.sha256(ImageHost.files['/photo.png'][0]).hexdigest()
+        product.refresh_from_db()
+        self.assertEqual(product.remote_image.name, f'cas/{digest[:2]}/{digest}.png')
+        self.assertTrue(default_storage.exists(product.remote_image.name))
+        self.assertEqual(product.get_image_display(), product.remote_image.url)
+        self.assertTrue(ThumbnailJob.objects.filter(object_id=product.pk, field='remote_image').exists())
+
+        # Another product with the same URL uses the copy straight away
+        other = self._product('/photo.png')
+        self.assertEqual(other.remote_image.name, product.remote_image.name)
+        self.assertEqual(remote_images.ingest(), (0, 0))
+        self.assertEqual(len(ImageHost.requests), 1)
+
+    def test_refresh_uses_conditional_requests(self):
+        product = self._product('/photo.png')
+        remote_images.ingest()
+        first_name = RemoteImage.objects.get().name
+
+        self._make_due()
+        self.assertEqual(remote_images.ingest(), (1, 0))
+        path, headers = ImageHost.requests[-1]
+        self.assertTrue(headers.get('If-None-Match'))
+        self.assertEqual(RemoteImage.objects.get().name, first_name)
+
+        # New content at the same URL replaces the copy
+        ImageHost.files['/photo.png'] = (_png('blue'), 'image/png')
+        self._make_due()
+        remote_images.ingest()
+        product.refresh_from_db()
+        self.assertNotEqual(product.remote_image.name, first_name)
+        self.assertEqual(product.remote_image.name, RemoteImage.objects.get().name)
+
+    def test_rejects_content_that_is_not_an_image(self):
+        product = self._product('/page.html')
+        self.assertEqual(remote_images.ingest(), (0, 1))
+        remote = RemoteImage.objects.get()
+        self.assertEqual((remote.name, remote.attempts), ('', 1))
+        self.assertIn('not a valid image', remote.last_error)
+        product.refresh_from_db()
+        self.assertEqual(product.get_image_display(), self.base_url + '/page.html')
+
+    def test_private_hosts_are_refused(self):
+        self._product('/photo.png')
+        with mock.patch.object(remote_images, 'REMOTE_IMAGE_ALLOW_PRIVATE_HOSTS', False):
+            self.assertEqual(remote_images.ingest(), (0, 1))
+        self.assertEqual(ImageHost.requests, [])
+        self.assertIn('non-public address', RemoteImage.objects.get().last_error)
+
+
+@skipUnless(search.is_supported(), "the test database has no full-text index")
+class ProductSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+
+    def setUp(self):
+        # Pages are cached for anonymous visitors
+        cache.clear()
+
+    def _product(self, name, description='', **kwargs):
+        return Product.objects.create(
+            vendor=self.vendor, name=name, description=description, price=10, stock=5, **kwargs
+        )
+
+    def test_name_matches_rank_above_description_matches(self):
+        in_description = self._product('Blue kettle', 'Comes with a phone charger')
+        in_name = self._product('Phone charger', 'Fast charging')
+        self._product('Toaster', 'Two slices')
+
+        self.assertEqual(search.search_product_ids('charger'), [in_name.pk, in_description.pk])
+        # Tokens are ANDed and match as prefixes
+        self.assertEqual(search.search_product_ids('phon charg'), [in_name.pk, in_description.pk])
+        self.assertEqual(search.search_product_ids('kettle charger'), [in_description.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        product = self._product('Kettle', 'Boils water')
+        self.assertEqual(search.search_product_ids('kettle'), [product.pk])
+
+        product.name = 'Toaster'
+        product.save()
+        self.assertEqual(search.search_product_ids('kettle'), [])
+        self.assertEqual(search.search_product_ids('toaster'), [product.pk])
+
+        product.delete()
+        self.assertEqual(search.search_product_ids('toaster'), [])
+
+    def test_catalog_lists_results_in_rank_order(self):
+        in_description = self._product('Blue kettle', 'Comes with a phone charger')
+        in_name = self._product('Phone charger', 'Fast charging')
+        self._product('Toaster', 'Two slices')
+
+        response = self.client.get(reverse('product_list'), {'search': 'charger'})
+        self.assertEqual([product.pk for product in response.context['products']], [in_name.pk, in_description.pk])
+        self.assertEqual(response.context['sort'], 'relevance')
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.products = [
+            Product.objects.create(vendor=vendor, name=f'Item {i}', description='d', price=10, stock=5)
+            for i in range(7)
+        ]
+        # Equal timestamps: only the id tiebreak orders these rows
+        Product.objects.update(created_at=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def _paginator(self):
+        return KeysetPaginator(Product.objects.all(), ('-created_at', '-id'), per_page=3)
+
+    def test_pages_cover_every_row_once_despite_equal_timestamps(self):
+        paginator = self._paginator()
+        seen, cursor, pages = [], None, []
+        while True:
+            page = paginator.get_page(cursor)
+            pages.append(page)
+            seen.extend(product.pk for product in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, sorted((product.pk for product in self.products), reverse=True))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous())
+
+        # The previous cursor of the last page leads back to the middle page
+        back = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual([product.pk for product in back], [product.pk for product in pages[1]])
+        self.assertTrue(back.has_previous())
+
+    def test_tampered_cursor_starts_from_the_first_page(self):
+        paginator = self._paginator()
+        first = paginator.get_page(None)
+        token = first.next_cursor
+        tampered = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+
+        page = paginator.get_page(tampered)
+        self.assertEqual([product.pk for product in page], [product.pk for product in first])
+        self.assertFalse(page.has_previous())
+
+        response = self.client.get(reverse('product_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_capped_count(self):
+        self.assertEqual(capped_count(Product.objects.all(), cap=10), (7, False))
+        self.assertEqual(capped_count(Product.objects.all(), cap=7), (7, False))
+        self.assertEqual(capped_count(Product.objects.all(), cap=5), (5, True))
+        with CaptureQueriesContext(connection) as queries:
+            capped_count(Product.objects.all(), cap=5)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT 6', queries[0]['sql'])
+
+
+class CategoryCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.phones = Category.objects.create(name='Phones')
+        cls.laptops = Category.objects.create(name='Laptops')
+
+    def _product(self, **kwargs):
+        return Product.objects.create(vendor=self.vendor, name='Item', description='d', price=10, stock=2, **kwargs)
+
+    def assertCounts(self, phones, laptops):
+        self.assertEqual(
+            list(Category.objects.order_by('name').values_list('name', 'active_product_count')),
+            [('Laptops', laptops), ('Phones', phones)]
+        )
+
+    def test_counts_follow_creates_status_changes_moves_and_deletes(self):
+        product = self._product(category=self.phones)
+        self._product(category=self.phones, status='inactive')
+        self.assertCounts(phones=1, laptops=0)
+
+        product.status = 'inactive'
+        product.save()
+        self.assertCounts(phones=0, laptops=0)
+        product.status = 'active'
+        product.save()
+        self.assertCounts(phones=1, laptops=0)
+
+        product.category = self.laptops
+        product.save()
+        self.assertCounts(phones=0, laptops=1)
+
+        product.delete()
+        self.assertCounts(phones=0, laptops=0)
+
+    def test_selling_out_and_reconcile(self):
+        product = self._product(category=self.phones)
+        self.assertTrue(Product.objects.decrement_stock({product.pk: 2}))
+        self.assertCounts(phones=0, laptops=0)
+
+        self._product(category=self.laptops)
+        Category.objects.update(active_product_count=5)
+        Category.reconcile_product_counts()
+        self.assertCounts(phones=0, laptops=1)
+
+
+class HomeCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        cls.product = Product.objects.create(vendor=cls.vendor, name='Kettle', description='d', price=10, stock=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_blocks_are_cached_until_a_product_is_saved(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return list(Product.objects.values_list('name', flat=True))
+
+        self.assertEqual(get_home_blocks({'names': build}), {'names': ['Kettle']})
+        self.assertEqual(get_home_blocks({'names': build}), {'names': ['Kettle']})
+        self.assertEqual(len(calls), 1)
+
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Toaster'
+            self.product.save()
+        self.assertEqual(get_catalog_version(), version + 1)
+        self.assertEqual(get_home_blocks({'names': build}), {'names': ['Toaster']})
+        self.assertEqual(len(calls), 2)
+
+    def test_home_page_shows_saved_changes(self):
+        # A logged-in visitor, so the full-page cache stays out of the way
+        self.client.force_login(self.customer)
+        self.assertContains(self.client.get(reverse('home')), 'Kettle')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('home'))
+        self.assertFalse([q for q in queries if 'products_product' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Toaster'
+            self.product.save()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Toaster')
+        self.assertNotContains(response, 'Kettle')
+
+
+class VendorStatsTests(TestCase):
+    """The incrementally kept figures must match a rebuild from the tables."""
+
+    FIELDS = ('total_products', 'active_products', 'inactive_products', 'out_of_stock_products',
+              'inventory_value', 'open_orders', 'revenue')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user('customer', 'customer@example.com')
+        cls.vendors = [
+            User.objects.create_user(f'vendor{i}', f'vendor{i}@example.com', user_type='vendor') for i in range(2)
+        ]
+
+    def stats(self):
+        # A vendor whose figures went back to zero keeps its row; rebuild() drops it
+        return {
+            row['vendor']: {field: row[field] for field in self.FIELDS}
+            for row in VendorStats.objects.values('vendor', *self.FIELDS)
+            if any(row[field] for field in self.FIELDS)
+        }
+
+    def assertMatchesRebuild(self):
+        kept = self.stats()
+        VendorStats.rebuild()
+        self.assertEqual(kept, self.stats())
+
+    def order(self, vendor, total, **kwargs):
+        return Order(customer=self.customer, vendor=vendor, total=total, delivery_address='a',
+                     phone='1', payment_method='mtn', **kwargs)
+
+    def test_bulk_created_orders_and_status_changes(self):
+        for vendor in self.vendors:
+            Product.objects.create(vendor=vendor, name='Item', description='d', price=10, stock=5)
+        orders = Order.objects.bulk_create([
+            self.order(self.vendors[0], 30, status='paid', payment_status='paid'),
+            self.order(self.vendors[0], 20),
+            self.order(self.vendors[1], 15, status='paid', payment_status='paid'),
+        ])
+        self.assertEqual(self.stats()[self.vendors[0].pk]['open_orders'], 2)
+        self.assertEqual(self.stats()[self.vendors[0].pk]['revenue'], 30)
+        self.assertMatchesRebuild()
+
+        # Instances returned by bulk_create are diffed correctly on their next save
+        orders[0].status = 'delivered'
+        orders[0].save()
+        orders[2].status = 'cancelled'
+        orders[2].save()
+        reloaded = Order.objects.get(pk=orders[1].pk)
+        reloaded.status = reloaded.payment_status = 'paid'
+        reloaded.save()
+        orders[1].refresh_from_db()
+        orders[1].delete()
+
+        self.assertEqual(self.stats()[self.vendors[0].pk]['open_orders'], 0)
+        self.assertEqual(self.stats()[self.vendors[0].pk]['revenue'], 30)
+        self.assertEqual(self.stats()[self.vendors[1].pk]['revenue'], 0)
+        self.assertMatchesRebuild()
+
+    def test_product_changes(self):
+        product = Product.objects.create(vendor=self.vendors[0], name='Item', description='d', price=10, stock=5)
+        Product.objects.create(vendor=self.vendors[0], name='Other', description='d', price=3, stock=1,
+                               status='inactive')
+        self.assertMatchesRebuild()
+
+        product.price = 12
+        product.save()
+        self.assertEqual(self.stats()[self.vendors[0].pk]['inventory_value'], 60)
+        product.vendor = self.vendors[1]
+        product.save()
+        self.assertTrue(Product.objects.decrement_stock({product.pk: 5}))
+        self.assertMatchesRebuild()
+
+        product.refresh_from_db()
+        product.delete()
+        self.assertNotIn(self.vendors[1].pk, self.stats())
+        self.assertMatchesRebuild()
+
+
+class ThumbnailQueueTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+
+    def test_shared_default_image_is_not_queued(self):
+        Product.objects.create(vendor=self.vendor, name='Plain', description='d', price=10, stock=5)
+        self.assertFalse(ThumbnailJob.objects.exists())
+        self.assertEqual(thumbnails.queue_missing(), 0)
+
+    def test_saves_that_leave_the_image_alone_are_ignored(self):
+        product = Product.objects.create(vendor=self.vendor, name='Photo', description='d', price=10, stock=5,
+                                          image='products/photo.png')
+        self.assertTrue(ThumbnailJob.objects.filter(object_id=product.pk, field='image').exists())
+        ThumbnailJob.objects.all().delete()
+
+        product.stock = 3
+        product.save(update_fields=['stock'])
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+        product.save()
+        self.assertTrue(ThumbnailJob.objects.filter(object_id=product.pk, field='image').exists())
+
+    def test_failing_image_is_not_retried_by_unrelated_edits(self):
+        product = Product.objects.create(vendor=self.vendor, name='Photo', description='d', price=10, stock=5,
+                                          image='products/broken.png')
+        ThumbnailJob.objects.update(attempts=thumbnails.THUMBNAIL_MAX_ATTEMPTS, last_error='cannot identify image')
+
+        product.name = 'Renamed'
+        product.save()
+        self.assertEqual(thumbnails.queue_missing(), 0)
+        job = ThumbnailJob.objects.get()
+        self.assertEqual((job.attempts, job.last_error), (thumbnails.THUMBNAIL_MAX_ATTEMPTS, 'cannot identify image'))
+
+        # A new file starts over
+        product.image = 'products/fixed.png'
+        product.save()
+        job = ThumbnailJob.objects.get()
+        self.assertEqual((job.source, job.attempts, job.last_error), ('products/fixed.png', 0, ''))
+
+    def test_login_does_not_queue_the_profile_picture(self):
+        self.vendor.profile_picture = 'profile_pics/me.png'
+        self.vendor.save()
+        self.assertTrue(ThumbnailJob.objects.filter(model='accounts.user', object_id=self.vendor.pk).exists())
+        ThumbnailJob.objects.all().delete()
+
+        self.vendor.set_password('password')
+        self.vendor.save(update_fields=['password'])
+        self.client.force_login(self.vendor)
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+
+class ContentAddressedMediaTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+
+    def _product(self, content, name='photo.png'):
+        product = Product(vendor=self.vendor, name='Phone', description='d', price=10, stock=5)
+        product.image.save(name, ContentFile(content), save=True)
+        return product
+
+    def test_same_bytes_are_stored_once_and_counted(self):
+        first = self._product(_png('red'), 'a.png')
+        second = self._product(_png('red'), 'b.PNG')
+        digest = hashlib.sha256(_png('red')).hexdigest()
+        self.assertEqual(first.image.name, f'cas/{digest[:2]}/{digest}.png')
+        self.assertEqual(second.image.name, first.image.name)
+
+        gallery = ProductImage(product=first)
+        gallery.image.save('g.png', ContentFile(_png('red')), save=True)
+        self.assertEqual(Blob.objects.get(name=first.image.name).ref_count, 3)
+
+        gallery.delete()
+        second.delete()
+        self.assertEqual(Blob.objects.get(name=first.image.name).ref_count, 1)
+
+    def test_garbage_collection_keeps_referenced_blobs(self):
+        kept = self._product(_png('red'))
+        replaced = self._product(_png('blue'))
+        old_name = replaced.image.name
+        replaced.image.save('new.png', ContentFile(_png('green')), save=True)
+        default_storage.save(f'renditions/{old_name[:-4]}/200w.webp', ContentFile(b'w'))
+        # Left behind by an upload whose request failed before the row was saved
+        default_storage.save('cas/00/untracked.png', ContentFile(b'x'))
+        self.assertEqual(Blob.objects.get(name=old_name).ref_count, 0)
+
+        call_command('collect_media_garbage', '--grace-hours', '0', '--dry-run', stdout=StringIO())
+        self.assertTrue(content_addressed_storage.exists(old_name))
+
+        self.assertEqual(blobs.collect(grace=timedelta(0)), (1, 1))
+        self.assertFalse(content_addressed_storage.exists(old_name))
+        self.assertFalse(default_storage.exists(f'renditions/{old_name[:-4]}/200w.webp'))
+        self.assertFalse(default_storage.exists('cas/00/untracked.png'))
+        for product in (kept, replaced):
+            product.refresh_from_db()
+            self.assertTrue(content_addressed_storage.exists(product.image.name))
+        self.assertEqual(set(Blob.objects.values_list('name', 'ref_count')),
+                         {(kept.image.name, 1), (replaced.image.name, 1)})
+
+    def test_grace_period_and_recount(self):
+        product = self._product(_png('red'))
+        name = product.image.name
+        product.delete()
+        self.assertEqual(blobs.collect(), (0, 0))
+        self.assertTrue(content_addressed_storage.exists(name))
+
+        other = self._product(_png('blue'))
+        Blob.objects.update(ref_count=7)
+        self.assertEqual(blobs.recount(), 1)
+        self.assertEqual(set(Blob.objects.values_list('name', 'ref_count')), {(name, 0), (other.image.name, 1)})
+
+
+class AnonymousPageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user('vendor', 'vendor@example.com', user_type='vendor')
+        cls.product = Product.objects.create(vendor=cls.vendor, name='Kettle', description='d', price=10, stock=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **cookies):
+        # Every request comes from a fresh visitor unless cookies are given
+        self.client.cookies.clear()
+        for name, value in cookies.items():
+            self.client.cookies[name] = value
+        return self.client.get(url)
+
+    def test_second_visitor_is_served_without_queries(self):
+        url = reverse('product_list')
+        self.assertContains(self.get(url), 'Kettle')
+        with self.assertNumQueries(0):
+            response = self.get(url)
+        self.assertContains(response, 'Kettle')
+        # Tracking parameters and empty filters share the entry
+        with self.assertNumQueries(0):
+            self.get(url + '?utm_source=mail&search=')
+
+    def test_session_and_messages_cookies_bypass_the_cache(self):
+        url = reverse('product_list')
+        self.get(url)
+        for name in (settings.SESSION_COOKIE_NAME, CookieStorage.cookie_name):
+            with self.subTest(cookie=name):
+                with CaptureQueriesContext(connection) as queries:
+                    self.get(url, **{name: 'x'})
+                self.assertTrue([q for q in queries if 'products_product' in q['sql']])
+
+    def test_product_save_invalidates_the_page(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        self.assertContains(self.get(url), 'Kettle')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Toaster'
+            self.product.save()
+        response = self.get(url)
+        self.assertContains(response, 'Toaster')
+        self.assertNotContains(response, 'Kettle')
@@ -0,0 +1,272 @@
+"""
+Responsive image renditions.
+
+Saving a new image only queues a ThumbnailJob (see products.signals and
+accounts.signals). The `generate_thumbnails` worker then writes WebP and JPEG
+copies at THUMBNAIL_WIDTHS plus a tiny placeholder, and stores them in the
+owner's `<field>_renditions` JSON column:
+
+    {"source": "products/x.png", "width": 1920, "height": 1080,
+     "webp": {"200": "renditions/products/x/200w.webp", ...},
+     "jpeg": {"200": "renditions/products/x/200w.jpg", ...},
+     "placeholder": "data:image/jpeg;base64,..."}
+
+Templates render them with `{% responsive_image %}` (products.templatetags.
+responsive_images). Until the worker has caught up, or while the stored
+renditions belong to a previous upload, the original file is served.
+"""
+import base64
+import logging
+import posixpath
+from datetime import timedelta
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .cache import bump_catalog_version
+from .models import ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_WIDTHS = tuple(getattr(settings, 'THUMBNAIL_WIDTHS', (200, 400, 800)))
+THUMBNAIL_BATCH_SIZE = getattr(settings, 'THUMBNAIL_BATCH_SIZE', 20)
+THUMBNAIL_MAX_ATTEMPTS = getattr(settings, 'THUMBNAIL_MAX_ATTEMPTS', 3)
+THUMBNAIL_RETRY_DELAY = getattr(settings, 'THUMBNAIL_RETRY_DELAY', 60)
+
+RENDITIONS_DIR = 'renditions'
+PLACEHOLDER_WIDTH = 16
+WEBP_OPTIONS = {'quality': 80, 'method': 4}
+JPEG_OPTIONS = {'quality': 82, 'optimize': True, 'progressive': True}
+
+# Image fields that get renditions, by model label
+IMAGE_FIELDS = {
+    'products.product': ('image', 'remote_image'),
+    'products.productimage': ('image',),
+    'products.category': ('image',),
+    'accounts.user': ('profile_picture',),
+}
+# Owners shown in the cached home page blocks
+CATALOG_MODELS = {'products.product', 'products.category'}
+
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+def renditions_field(field):
+    return f'{field}_renditions'
+
+
+def current_renditions(instance, field):
+    """Return the renditions of `instance.<field>` if they match the current file."""
+    name = renditions_field(field)
+    if name in instance.get_deferred_fields() or field in instance.get_deferred_fields():
+        return None
+    renditions = getattr(instance, name)
+    image = getattr(instance, field)
+    if renditions and image and renditions.get('source') == image.name:
+        return renditions
+    return None
+
+
+def shared_default(model, field):
+    """The file name every row gets by default (e.g. the placeholder product image), or ''."""
+    default = model._meta.get_field(field).get_default()
+    return default if isinstance(default, str) else ''
+
+
+def queue_renditions(instance, field, update_fields=None):
+    """
+    Queue renditions for `instance.<field>` unless they are up to date, it is
+    empty or the shared default, or the save (`update_fields`) left it alone.
+    """
+    if update_fields is not None and field not in update_fields:
+        return None
+    if field in instance.get_deferred_fields() or renditions_field(field) in instance.get_deferred_fields():
+        return None
+    image = getattr(instance, field)
+    if not image or image.name == shared_default(type(instance), field) or current_renditions(instance, field):
+        return None
+    job, created = ThumbnailJob.objects.get_or_create(
+        model=instance._meta.label_lower,
+        object_id=instance.pk,
+        field=field,
+        defaults={'source': image.name}
+    )
+    # A job for the same file keeps its attempts, so editing the owner does
+    # not retry an image that keeps failing
+    if not created and job.source != image.name:
+        job.source = image.name
+        job.attempts = 0
+        job.next_attempt_at = timezone.now()
+        job.last_error = ''
+        job.save(update_fields=['source', 'attempts', 'next_attempt_at', 'last_error'])
+    return job
+
+
+def queue_rows(queryset, field, batch_size=500):
+    """
+    Queue renditions for the rows of `queryset` whose `field` lacks up-to-date
+    ones and has no job for the same file yet.
+    """
+    label = queryset.model._meta.label_lower
+    rows = (
+        queryset.exclude(**{f'{field}__isnull': True})
+        .exclude(**{f'{field}__in': {'', shared_default(queryset.model, field)}})
+        .only('pk', field, renditions_field(field)).order_by('pk')
+    )
+    queued = set(ThumbnailJob.objects.filter(model=label, field=field).values_list('object_id', 'source'))
+    jobs = [
+        ThumbnailJob(model=label, object_id=row.pk, field=field, source=getattr(row, field).name)
+        for row in rows.iterator(chunk_size=batch_size)
+        if not current_renditions(row, field) and (row.pk, getattr(row, field).name) not in queued
+    ]
+    ThumbnailJob.objects.bulk_create(
+        jobs, batch_size=batch_size, update_conflicts=True,
+        unique_fields=['model', 'object_id', 'field'],
+        update_fields=['source', 'attempts', 'next_attempt_at', 'last_error']
+    )
+    return len(jobs)
+
+
+def queue_missing(batch_size=500):
+    """Queue every stored image without up-to-date renditions. Returns the number queued."""
+    queued = 0
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        for field in fields:
+            queued += queue_rows(model._default_manager.all(), field, batch_size)
+    return queued
+
+
+def _widths(original_width):
+    # Never upscale: widths past the original collapse into the original size
+    return sorted({min(width, original_width) for width in THUMBNAIL_WIDTHS})
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _flatten(image):
+    """JPEG has no alpha channel: composite transparent images onto white."""
+    if image.mode == 'RGB':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+    return background
+
+
+def _save(storage, name, image, format, **options):
+    buffer = BytesIO()
+    image.save(buffer, format, **options)
+    # Renditions have fixed names; replace instead of letting storage pick a new one
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def _placeholder(image):
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+    buffer = BytesIO()
+    _flatten(small).save(buffer, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def build_renditions(source, storage=default_storage):
+    """Write the renditions of the stored image `source` and return their description."""
+    with storage.open(source) as file:
+        with Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+
+    width, height = image.size
+    base = posixpath.join(RENDITIONS_DIR, posixpath.splitext(source)[0])
+    renditions = {'source': source, 'width': width, 'height': height, 'webp': {}, 'jpeg': {}}
+    for target in _widths(width):
+        resized = image if target == width else image.resize(
+            (target, max(1, round(height * target / width))), Image.LANCZOS, reducing_gap=3.0
+        )
+        renditions['webp'][str(target)] = _save(storage, f'{base}/{target}w.webp', resized, 'WEBP', **WEBP_OPTIONS)
+        renditions['jpeg'][str(target)] = _save(
+            storage, f'{base}/{target}w.jpg', _flatten(resized), 'JPEG', **JPEG_OPTIONS
+        )
+    renditions['placeholder'] = _placeholder(image)
+    return renditions
+
+
+def pending():
+    """Jobs that will still be attempted."""
+    return ThumbnailJob.objects.filter(attempts__lt=THUMBNAIL_MAX_ATTEMPTS)
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            pending().filter(next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            # Resizing takes a while; hide the batch from other workers without holding locks
+            ThumbnailJob.objects.filter(pk__in=[job.pk for job in batch]).update(
+                next_attempt_at=now + CLAIM_TIMEOUT
+            )
+    return batch
+
+
+def _retry_later(job, error):
+    job.attempts += 1
+    job.last_error = str(error)[:1000]
+    job.next_attempt_at = timezone.now() + timedelta(seconds=THUMBNAIL_RETRY_DELAY * 2 ** (job.attempts - 1))
+    job.save(update_fields=['attempts', 'last_error', 'next_attempt_at'])
+    if job.attempts >= THUMBNAIL_MAX_ATTEMPTS:
+        logger.error("Giving up on renditions for %s: %s", job, error)
+
+
+def _finish(job):
+    # A new upload while we worked re-queued the job with another source; leave that one
+    ThumbnailJob.objects.filter(pk=job.pk, source=job.source).delete()
+
+
+def generate_thumbnails(batch_size=THUMBNAIL_BATCH_SIZE):
+    """
+    Process one batch of due jobs. Returns (done, failed) so callers can loop
+    until nothing is left.
+    """
+    batch = _claim(batch_size)
+    built = {}
+    done = failed = 0
+    catalog_changed = False
+    for job in batch:
+        try:
+            if job.source not in built:
+                built[job.source] = build_renditions(job.source)
+        except FileNotFoundError:
+            logger.warning("Image %s for %s is missing, skipping renditions", job.source, job)
+            _finish(job)
+            continue
+        except Exception as e:
+            logger.warning("Failed to build renditions for %s: %s", job, e)
+            _retry_later(job, e)
+            failed += 1
+            continue
+
+        model = apps.get_model(job.model)
+        # Only write if the row still points at the file we resized
+        updated = model._default_manager.filter(pk=job.object_id, **{job.field: job.source}).update(
+            **{renditions_field(job.field): built[job.source]}
+        )
+        catalog_changed |= bool(updated) and job.model in CATALOG_MODELS
+        _finish(job)
+        done += 1
+
+    if catalog_changed:
+        # .update() skips the signals that normally retire cached home page blocks
+        bump_catalog_version()
+    return done, failed
@@ -15,6 +15,7 @@ urlpatterns = [
     path('vendor/products/', views.vendor_products, name='vendor_products'),
     path('vendor/products/add/', views.add_product, name='add_product'),
     path('vendor/products/edit/<int:product_id>/', views.edit_product, name='edit_product'),
+    path('vendor/products/<int:product_id>/gallery-uploads/', views.gallery_upload_status, name='gallery_upload_status'),
     #path('vendor/products/delete/<int:product_id>/', views.delete_product, name='delete_product'),
     # Legal and Support pages
     path('privacy-policy/', views.privacy_policy, name='privacy_policy'),
@@ -1,48 +1,69 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.db.models import Q
 from accounts.decorators import vendor_required
-from .models import Product, Category, ProductImage
+from .models import Product, Category, VendorStats
 from .forms import ProductForm
-from django.db.models import Count, Sum
-from orders.models import OrderItem
+from . import search
+from .pagination import KeysetPaginator, paginate_ranked, capped_count
+from .cache import cache_anonymous_page, get_home_blocks
+from .gallery import stage_uploads, upload_status
 
 
+def _featured_products():
+    return list(Product.objects.filter(status='active').select_related('category').order_by('-created_at')[:8])
+
+
+def _trending_products():
+    return list(Product.objects.filter(status='active', is_trending=True).select_related('category').order_by('-created_at')[:8])
+
+
+def _home_categories():
+    categories = list(Category.objects.filter(active_product_count__gt=0)[:4])
+
+    # Fallback categories if none have products yet
+    if not categories:
+        categories = list(Category.objects.all()[:4])
+    return categories
+
+
+@cache_anonymous_page
 def home(request):
     """Homepage view with features and categories"""
-    featured_products = Product.objects.filter(status='active').select_related('category').order_by('-created_at')[:8]
-    trending_products = Product.objects.filter(status='active', is_trending=True).select_related('category').order_by('-created_at')[:8]
-    categories = Category.objects.annotate(product_count=Count('products')).filter(product_count__gt=0)[:4]
-    
-    # Fallback categories if none have products yet
-    if not categories.exists():
-        categories = Category.objects.all()[:4]
+    blocks = get_home_blocks({
+        'featured_products': _featured_products,
+        'trending_products': _trending_products,
+        'categories': _home_categories,
+    })
 
     context = {
-        'featured_products': featured_products,
-        'trending_products': trending_products,
-        'categories': categories,
+        'featured_products': blocks['featured_products'],
+        'trending_products': blocks['trending_products'],
+        'categories': blocks['categories'],
         'title': 'Soko Hub - Online Marketplace'
     }
     return render(request, 'products/home.html', context)
 
 
+@cache_anonymous_page
 def about(request):
     """About page view"""
     return render(request, 'products/about.html', {'title': 'About Soko Hub'})
 
 
+@cache_anonymous_page
 def contact(request):
     """Contact page view"""
     return render(request, 'products/contact.html', {'title': 'Contact Us'})
 
 
+@cache_anonymous_page
 def product_list(request, category_slug=None):
     """Browse products with filtering and sorting"""
     category = None
-    categories = Category.objects.annotate(product_count=Count('products'))
+    categories = Category.objects.all()
     products_list = Product.objects.filter(status='active')
 
     if category_slug:
@@ -50,12 +71,18 @@ def product_list(request, category_slug=None):
         products_list = products_list.filter(category=category)
 
     search_query = request.GET.get('search', '')
+    matched_ids = None
     if search_query:
-        products_list = products_list.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(vendor__username__icontains=search_query)
-        )
+        matched_ids = search.search_product_ids(search_query)
+        if matched_ids is not None:
+            products_list = products_list.filter(id__in=matched_ids)
+        else:
+            # Fallback when the full-text index is unavailable
+            products_list = products_list.filter(
+                Q(name__icontains=search_query) |
+                Q(description__icontains=search_query) |
+                Q(vendor__username__icontains=search_query)
+            )
 
     # Filtering by Price
     min_price = request.GET.get('min_price')
@@ -65,21 +92,29 @@ def product_list(request, category_slug=None):
     if max_price:
         products_list = products_list.filter(price__lte=max_price)
 
-    # Sorting
-    sort = request.GET.get('sort', 'newest')
+    # Sorting (every ordering ends with a unique id tiebreak for keyset pagination)
+    sort = request.GET.get('sort', 'relevance' if search_query else 'newest')
     if sort == 'price_low':
-        products_list = products_list.order_by('price')
+        ordering = ('price', 'id')
     elif sort == 'price_high':
-        products_list = products_list.order_by('-price')
+        ordering = ('-price', '-id')
     elif sort == 'name':
-        products_list = products_list.order_by('name')
+        ordering = ('name', 'id')
     else:
-        products_list = products_list.order_by('-created_at')
+        ordering = ('-created_at', '-id')
 
     # Pagination
-    paginator = Paginator(products_list, 12)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    cursor = request.GET.get('cursor')
+    products_list = products_list.select_related('category')
+    if sort == 'relevance' and matched_ids:
+        # Keep the ranking order returned by the search index
+        products = paginate_ranked(products_list, matched_ids, cursor, per_page=12)
+    else:
+        if sort == 'relevance':
+            sort = 'newest'
+        products = KeysetPaginator(products_list, ordering, per_page=12).get_page(cursor)
+
+    total_products, total_capped = capped_count(products_list)
 
     context = {
         'category': category,
@@ -90,10 +125,12 @@ def product_list(request, category_slug=None):
         'sort': sort,
         'min_price': min_price,
         'max_price': max_price,
-        'total_products': products_list.count()
+        'total_products': total_products,
+        'total_capped': total_capped
     }
     return render(request, 'products/product_list.html', context)
 
+@cache_anonymous_page
 def product_detail(request, product_id):
     """Product detail page"""
     # Allow both active and out_of_stock products to be viewed
@@ -118,18 +155,17 @@ def product_detail(request, product_id):
 
 @vendor_required
 def vendor_dashboard(request):
-    products = Product.objects.filter(vendor=request.user)
-    active_products = products.filter(status='active')
-    out_of_stock_products = products.filter(status='out_of_stock')
-
-    total_inventory_value = sum(product.price * product.stock for product in active_products)
-    recent_products = products.order_by('-created_at')[:5]
+    # One primary-key lookup regardless of catalog size; maintained by signals
+    stats = VendorStats.objects.filter(vendor=request.user).first() or VendorStats(vendor=request.user)
+    recent_products = Product.objects.filter(vendor=request.user).select_related('category').order_by('-created_at')[:5]
 
     context = {
-        'total_products': products.count(),
-        'active_products': active_products.count(),
-        'out_of_stock_products': out_of_stock_products.count(),
-        'total_inventory_value': total_inventory_value,
+        'total_products': stats.total_products,
+        'active_products': stats.active_products,
+        'out_of_stock_products': stats.out_of_stock_products,
+        'total_inventory_value': stats.inventory_value,
+        'open_orders': stats.open_orders,
+        'revenue': stats.revenue,
         'recent_products': recent_products,
         'title': 'Vendor Dashboard',
         
@@ -188,12 +224,11 @@ def add_product(request):
 
             product.save()
 
-            # Handle multiple image uploads
-            images = request.FILES.getlist('images')
-            for img in images:
-                ProductImage.objects.create(product=product, image=img)
-
             messages.success(request, f'Product "{name}" added successfully!')
+
+            # Gallery images are processed in the background
+            if _stage_gallery_images(request, product):
+                return redirect('edit_product', product_id=product.id)
             return redirect('vendor_products')
 
         except Exception as e:
@@ -208,13 +243,11 @@ def edit_product(request, product_id):
         form = ProductForm(request.POST, request.FILES, instance=product)
         if form.is_valid():
             product = form.save()
-            
-            # Handle multiple image uploads
-            images = request.FILES.getlist('images')
-            for img in images:
-                ProductImage.objects.create(product=product, image=img)
-                
             messages.success(request, f'Product "{product.name}" updated successfully!')
+
+            # Gallery images are processed in the background
+            if _stage_gallery_images(request, product):
+                return redirect('edit_product', product_id=product.id)
             return redirect('vendor_products')
         else:
             messages.error(request, 'Please correct the errors below.')
@@ -224,21 +257,43 @@ def edit_product(request, product_id):
     context = {
         'form': form,
         'product': product,
+        'gallery_uploads': upload_status(product),
         'title': f'Edit {product.name}'
     }
     return render(request, 'products/edit_product.html', context)
 
 
+def _stage_gallery_images(request, product):
+    """Queue the posted gallery images for processing and report rejected files."""
+    uploads, rejected = stage_uploads(product, request.FILES.getlist('images'))
+    for name, reason in rejected:
+        messages.warning(request, f'Gallery image "{name}" was not added: {reason}.')
+    if uploads:
+        messages.info(request, f'{len(uploads)} gallery image(s) are being processed and will appear shortly.')
+    return uploads
+
+
+@vendor_required
+def gallery_upload_status(request, product_id):
+    """Processing state of gallery uploads, polled by the edit page"""
+    product = get_object_or_404(Product.objects.only('id'), id=product_id, vendor=request.user)
+    ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.isdigit()]
+    return JsonResponse({'uploads': upload_status(product, ids)})
+
+
+@cache_anonymous_page
 def privacy_policy(request):
     """Privacy Policy page view"""
     return render(request, 'products/privacy_policy.html', {'title': 'Privacy Policy - Soko Hub'})
 
 
+@cache_anonymous_page
 def terms_of_service(request):
     """Terms of Service page view"""
     return render(request, 'products/terms_of_service.html', {'title': 'Terms of Service - Soko Hub'})
 
 
+@cache_anonymous_page
 def help_center(request):
     """Help Center page view"""
     return render(request, 'products/help_center.html', {'title': 'Help Center - Soko Hub'})
@@ -0,0 +1,128 @@
+"""
+Static and media delivery.
+
+Static files go through WhiteNoise in every environment. collectstatic
+writes hashed copies plus gzip (and brotli, when the Brotli package is
+installed) variants, and WhiteNoise serves the hashed names with
+`Cache-Control: immutable`.
+
+Media is served by `serve_media`, which answers conditional requests
+(ETag / If-None-Match, If-Modified-Since) and single byte ranges. Files
+under cas/ and their renditions never change content (products.storage),
+so they are cached for a year; other media gets MEDIA_MAX_AGE.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+MEDIA_MAX_AGE = getattr(settings, 'MEDIA_MAX_AGE', 60 * 60)
+
+IMMUTABLE_MEDIA = ('cas/', 'renditions/cas/')
+# Worker-only files that are never linked from a page
+PRIVATE_MEDIA = ('staging/',)
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    # Templates fall back to the plain name for files collectstatic has not
+    # seen yet, instead of failing the page
+    manifest_strict = False
+
+
+def _byte_range(header, size):
+    """
+    Parse a Range header into (start, end) inclusive. Returns None to serve
+    the whole file (no header, several ranges, other units) and raises
+    ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-500: the last 500 bytes
+        length = int(last)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    if path.startswith(PRIVATE_MEDIA):
+        raise Http404
+    fullpath = safe_join(settings.MEDIA_ROOT, path)
+    try:
+        stat = os.stat(fullpath)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        # 304 Not Modified or 412 Precondition Failed
+        return response
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (not if_range or if_range == etag):
+        try:
+            byte_range = _byte_range(request.headers['Range'], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+    start, end = byte_range or (0, size - 1)
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type, status=206 if byte_range else 200)
+    elif byte_range:
+        response = StreamingHttpResponse(
+            _read(open(fullpath, 'rb'), start, end - start + 1), status=206, content_type=content_type
+        )
+    else:
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if path.startswith(IMMUTABLE_MEDIA) else f'public, max-age={MEDIA_MAX_AGE}'
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
@@ -1,17 +1,25 @@
+from django.utils.functional import SimpleLazyObject
 from notifications.models import Notification
 from cart.models import Cart
+from cart.session import SessionCart
 
 def vendor_notifications(request):
     """
     Context processor to provide unread notifications 
     and recent notifications to all templates.
+
+    Both values are lazy: nothing is queried unless the template uses them,
+    and the unread count comes from the denormalized counter on the user.
     """
     if request.user.is_authenticated:
-        unread_notifications_count = Notification.objects.filter(user=request.user, is_read=False).count()
-        recent_notifications = Notification.objects.filter(user=request.user).order_by('-created_at')[:5]
+        if not hasattr(request, '_recent_notifications'):
+            user = request.user
+            request._recent_notifications = SimpleLazyObject(
+                lambda: list(Notification.objects.filter(user=user).order_by('-created_at')[:5])
+            )
         return {
-            'unread_notifications_count': unread_notifications_count,
-            'recent_notifications': recent_notifications
+            'unread_notifications_count': SimpleLazyObject(lambda: request.user.unread_notifications_count),
+            'recent_notifications': request._recent_notifications
         }
     return {
         'unread_notifications_count': 0,
@@ -21,11 +29,15 @@ def vendor_notifications(request):
 def cart_count(request):
     """
     Context processor to provide the cart item count to all templates.
+    The count is read lazily from the denormalized Cart.items_count, or
+    from the session cart for anonymous visitors.
     """
     if request.user.is_authenticated:
-        try:
-            cart = Cart.objects.get(customer=request.user)
-            return {'cart_count': cart.get_items_count()}
-        except Cart.DoesNotExist:
-            return {'cart_count': 0}
-    return {'cart_count': 0}
+        if not hasattr(request, '_cart_count'):
+            user = request.user
+            request._cart_count = SimpleLazyObject(
+                lambda: Cart.objects.filter(customer=user).values_list('items_count', flat=True).first() or 0
+            )
+        return {'cart_count': request._cart_count}
+    # Guests keep their cart in the session
+    return {'cart_count': SimpleLazyObject(lambda: len(SessionCart(request)))}
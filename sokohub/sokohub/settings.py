@@ -44,6 +44,8 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # Lets runserver leave static files to WhiteNoise, as in production
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
     'django.contrib.sites',
     # third party apps
@@ -106,6 +108,8 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap5'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Static files (see sokohub.assets)
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware', # ✅ Added for language switching
     'django.middleware.common.CommonMiddleware',
@@ -114,12 +118,10 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    # Last, so a cache hit skips only the view (see products.middleware)
+    'products.middleware.AnonymousPageCacheMiddleware',
 ]
 
-# Add WhiteNoise for static files in production
-if os.getenv('RENDER'):
-    MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
-
 ROOT_URLCONF = 'sokohub.urls'
 
 TEMPLATES = [
@@ -208,19 +210,20 @@ STATICFILES_DIRS = [
     ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
-# WhiteNoise storage to compress and cache static files
+# WhiteNoise storage: collectstatic writes hashed, gzip/brotli compressed
+# copies that are served with far-future cache headers in every environment
 STORAGES = {
     "default": {
         "BACKEND": "django.core.files.storage.FileSystemStorage",
     },
     "staticfiles": {
-        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        "BACKEND": "sokohub.assets.StaticFilesStorage",
     },
 }
-
-# WhiteNoise storage to compress and cache static files in production
-if os.getenv('RENDER'):
-    STORAGES["staticfiles"]["BACKEND"] = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# Without DEBUG, run collectstatic first; with it, files are picked up from
+# the app and project static directories as they change
+WHITENOISE_USE_FINDERS = DEBUG
+WHITENOISE_AUTOREFRESH = DEBUG
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -236,7 +239,11 @@ LOGIN_URL = 'login'  # Login page URL
 
 #media file configuration
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Point at a persistent disk in production; the media workers write here too (start.sh)
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+# Browser cache lifetime for media that may change; content-addressed files
+# under media/cas/ are cached for a year (see sokohub.assets)
+MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', 60 * 60))
 
 # ─── Email Configuration ───────────────────────────────────────────────────────
 # ✅ REAL SMTP MODE: Sending emails via Gmail.
@@ -255,6 +262,88 @@ DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
 # OTP settings
 OTP_EXPIRY_MINUTES = 3
+# 'db' keeps hashed codes in EmailOTP (purge with `manage.py purge_expired_otps`),
+# 'cache' keeps them in the Django cache where they expire on their own.
+OTP_STORE = os.getenv('OTP_STORE', 'db')
+OTP_MAX_ATTEMPTS = int(os.getenv('OTP_MAX_ATTEMPTS', 5))
+
+# ─── Login Throttling ──────────────────────────────────────────────────────────
+# Attempts allowed per sliding window on login, send_otp and verify_otp,
+# counted per client IP and per username/email.
+LOGIN_THROTTLE_WINDOW = int(os.getenv('LOGIN_THROTTLE_WINDOW', 300))
+LOGIN_THROTTLE_IP_LIMIT = int(os.getenv('LOGIN_THROTTLE_IP_LIMIT', 30))
+LOGIN_THROTTLE_IDENTIFIER_LIMIT = int(os.getenv('LOGIN_THROTTLE_IDENTIFIER_LIMIT', 10))
+# Render's load balancer appends the client address to X-Forwarded-For
+LOGIN_THROTTLE_PROXY_COUNT = 1 if os.getenv('RENDER') else 0
+
+# ─── Mail Queue ────────────────────────────────────────────────────────────────
+# Emails are queued by the request and sent by `manage.py send_queued_mail`.
+# Failed sends are retried after MAIL_QUEUE_RETRY_DELAY * 2**attempts seconds.
+MAIL_QUEUE_BATCH_SIZE = int(os.getenv('MAIL_QUEUE_BATCH_SIZE', 50))
+MAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv('MAIL_QUEUE_MAX_ATTEMPTS', 5))
+MAIL_QUEUE_RETRY_DELAY = int(os.getenv('MAIL_QUEUE_RETRY_DELAY', 30))
+
+# ─── Catalog Caching ───────────────────────────────────────────────────────────
+# Seconds the home page featured/trending/category blocks and the public
+# pages served to anonymous visitors stay cached. Product, ProductImage and
+# Category writes invalidate them immediately regardless.
+HOME_CACHE_TIMEOUT = int(os.getenv('HOME_CACHE_TIMEOUT', 60 * 15))
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 60 * 5))
+
+# Shared by every web and worker process when REDIS_URL is set (production);
+# otherwise each process keeps its own in-memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# ─── Image Renditions ──────────────────────────────────────────────────────────
+# `manage.py generate_thumbnails` resizes uploaded images to these widths
+# (WebP and JPEG); templates pick one through srcset.
+THUMBNAIL_WIDTHS = tuple(int(w) for w in os.getenv('THUMBNAIL_WIDTHS', '200,400,800').split(','))
+THUMBNAIL_BATCH_SIZE = int(os.getenv('THUMBNAIL_BATCH_SIZE', 20))
+THUMBNAIL_MAX_ATTEMPTS = int(os.getenv('THUMBNAIL_MAX_ATTEMPTS', 3))
+
+# ─── Gallery Uploads ───────────────────────────────────────────────────────────
+# Gallery images are staged by the request and re-encoded by
+# `manage.py process_gallery_uploads` using GALLERY_PROCESSES processes.
+GALLERY_MAX_UPLOAD_SIZE = int(os.getenv('GALLERY_MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+GALLERY_MAX_DIMENSION = int(os.getenv('GALLERY_MAX_DIMENSION', 2400))
+GALLERY_PROCESSES = int(os.getenv('GALLERY_PROCESSES', 2))
+
+# ─── Remote Product Images ─────────────────────────────────────────────────────
+# `manage.py ingest_remote_images` keeps local copies of product image URLs
+# and revalidates them every REMOTE_IMAGE_REFRESH seconds.
+REMOTE_IMAGE_REFRESH = int(os.getenv('REMOTE_IMAGE_REFRESH', 60 * 60 * 24))
+REMOTE_IMAGE_TIMEOUT = int(os.getenv('REMOTE_IMAGE_TIMEOUT', 10))
+REMOTE_IMAGE_MAX_SIZE = int(os.getenv('REMOTE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+
+# ─── Media Storage ─────────────────────────────────────────────────────────────
+# Product images are stored once per distinct content under media/cas/.
+# `manage.py collect_media_garbage` deletes files nothing has referred to for
+# MEDIA_GC_GRACE_HOURS.
+MEDIA_GC_GRACE_HOURS = int(os.getenv('MEDIA_GC_GRACE_HOURS', 24))
+
+# ─── Stock Reservations ────────────────────────────────────────────────────────
+# On promotion days stock is held for this many minutes once checkout starts.
+STOCK_RESERVATION_MINUTES = int(os.getenv('STOCK_RESERVATION_MINUTES', 10))
+
+# ─── Sales Rollups ─────────────────────────────────────────────────────────────
+# `manage.py update_sales_rollups` folds changed orders into daily rollups.
+# Orders saved up to SALES_ROLLUP_OVERLAP_SECONDS before the last high-water
+# mark are re-read in case their transaction committed late.
+SALES_ROLLUP_BATCH_SIZE = int(os.getenv('SALES_ROLLUP_BATCH_SIZE', 500))
+SALES_ROLLUP_OVERLAP_SECONDS = int(os.getenv('SALES_ROLLUP_OVERLAP_SECONDS', 300))
 
 # ─── Logging Configuration ─────────────────────────────────────────────────────
 # This allows us to see full tracebacks in Render logs when DEBUG=False
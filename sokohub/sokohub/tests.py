@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+from django.test import SimpleTestCase, override_settings
+
+CONTENT = bytes(range(256)) * 4
+
+
+class MediaDeliveryTests(SimpleTestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for name, content in (('cas/ab/abc.png', CONTENT), ('staging/upload', b'x'), ('logo.jpg', b'y' * 10)):
+            path = os.path.join(media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(content)
+
+    def test_full_response_and_cache_headers(self):
+        response = self.client.get('/media/cas/ab/abc.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        self.assertEqual(self.client.head('/media/logo.jpg')['Cache-Control'], 'public, max-age=3600')
+        self.assertEqual(self.client.post('/media/logo.jpg').status_code, 405)
+        self.assertEqual(self.client.get('/media/staging/upload').status_code, 404)
+        self.assertEqual(self.client.get('/media/cas').status_code, 404)
+
+    def test_conditional_requests(self):
+        response = self.client.get('/media/cas/ab/abc.png')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(self.client.get('/media/cas/ab/abc.png', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/media/cas/ab/abc.png', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get('/media/cas/ab/abc.png', HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_byte_ranges(self):
+        response = self.client.get('/media/cas/ab/abc.png', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[10:20])
+
+        response = self.client.get('/media/cas/ab/abc.png', HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content), CONTENT[-4:])
+
+        response = self.client.get('/media/cas/ab/abc.png', HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(CONTENT)}')
+
+        # A stale If-Range gets the whole, current file
+        response = self.client.get('/media/cas/ab/abc.png', HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/media/cas/ab/abc.png', HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
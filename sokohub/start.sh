@@ -0,0 +1,20 @@
+#!/usr/bin/env bash
+# Start the web server together with the workers that read and write
+# MEDIA_ROOT. Services do not share a filesystem, so these workers have to
+# run next to the web server that receives the uploads and serves the files.
+
+run_forever() {
+    # Restart a worker that exits, e.g. after losing its database connection
+    while true; do
+        python manage.py "$@"
+        sleep 5
+    done
+}
+
+run_forever generate_thumbnails --loop &
+run_forever process_gallery_uploads --loop &
+run_forever ingest_remote_images --loop &
+# Hourly: deletes files under MEDIA_ROOT that nothing refers to any more
+run_forever collect_media_garbage --loop &
+
+exec gunicorn sokohub.wsgi --bind 0.0.0.0:${PORT:-8000}